@@ -1,20 +1,117 @@
 from django.contrib import admin
-from bib.models import ZotItem
+from django.db.models import Max, Min
+from bib.models import FacetCount, SyncJob, SyncState, ZotItem
+from bib.search import search_zotitems
+from bib.zot_utils import delete_zotitems
+
+
+class DecadeListFilter(admin.SimpleListFilter):
+
+    """ filters by the indexed year, ranges like '?year__gte=1850&year__lte=1870' work as well """
+
+    title = 'decade'
+    parameter_name = 'decade'
+
+    def lookups(self, request, model_admin):
+        years = ZotItem.objects.aggregate(first=Min('year'), last=Max('year'))
+        if years['first'] is None:
+            return []
+        first = years['first'] // 10 * 10
+        return [("{}".format(x), "{}s".format(x)) for x in range(first, years['last'] + 1, 10)]
+
+    def queryset(self, request, queryset):
+        if self.value() and self.value().isdigit():
+            decade = int(self.value())
+            return queryset.filter(year__gte=decade, year__lt=decade + 10)
+        return queryset
 
 
 class ZotItemAdmin(admin.ModelAdmin):
     search_fields = [
         'zot_key',
-        'zot_creator',
+        'citation_key',
+        'author_display',
         'zot_date',
         'zot_version'
     ]
     list_display = [
         'zot_key',
-        'zot_creator',
-        'zot_date',
+        'author_display',
+        'date',
         'zot_version'
     ]
+    list_filter = [DecadeListFilter]
+
+    @admin.display(ordering='date_sort', description='date')
+    def date(self, obj):
+        return obj.zot_date
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).for_list()
+
+    def delete_queryset(self, request, queryset):
+        # counts the items out of the facets, a plain queryset delete would not
+        delete_zotitems(list(queryset.values_list('zot_key', flat=True)))
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term:
+            return queryset, False
+        results = search_zotitems(queryset, search_term)
+        if results.exists():
+            return results, False
+        return super().get_search_results(request, queryset, search_term)
 
 
 admin.site.register(ZotItem, ZotItemAdmin)
+
+
+class SyncStateAdmin(admin.ModelAdmin):
+    list_display = [
+        'library_id',
+        'library_type',
+        'library_version',
+        'ended',
+        'duration',
+        'items_saved',
+        'items_deleted',
+        'crawl_version',
+        'crawl_offset',
+        'error'
+    ]
+
+
+admin.site.register(SyncState, SyncStateAdmin)
+
+
+class SyncJobAdmin(admin.ModelAdmin):
+    list_display = [
+        'id',
+        'library_id',
+        'library_type',
+        'status',
+        'created',
+        'started',
+        'ended',
+        'pages',
+        'items',
+        'items_total',
+        'items_deleted',
+        'error'
+    ]
+    list_filter = ['status']
+
+
+admin.site.register(SyncJob, SyncJobAdmin)
+
+
+class FacetCountAdmin(admin.ModelAdmin):
+    list_display = [
+        'facet',
+        'value',
+        'count'
+    ]
+    list_filter = ['facet']
+    search_fields = ['value']
+
+
+admin.site.register(FacetCount, FacetCountAdmin)
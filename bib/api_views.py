@@ -1,8 +1,246 @@
-from rest_framework import viewsets
-from bib.serializers import ZotItemSerializer
-from bib.models import ZotItem
+import json
+
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+from rest_framework import renderers, viewsets
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+from bib.caching import cached, get_generation_datetime, make_etag
+from bib.export import FORMATS, export_items, gzip_chunks
+from bib.facets import FACETS, get_facets
+from bib.serializers import ZotItemListSerializer, ZotItemSerializer, sparse_fields
+from bib.models import SyncState, ZotItem
+from bib.pagination import ZotItemCursorPagination
+from bib.resolver import resolve
+
+try:
+    RESOLVE_MAX_KEYS = settings.Z_RESOLVE_MAX_KEYS
+except AttributeError:
+    RESOLVE_MAX_KEYS = 1000
+try:
+    FACET_LIMIT = settings.Z_FACET_LIMIT
+except AttributeError:
+    FACET_LIMIT = 100
+
+
+def int_param(params, name):
+    """ returns the query parameter 'name' as int or None, raises a 400 if it isn't one """
+    value = params.get(name)
+    if value in (None, ''):
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        raise ValidationError({name: "A valid integer is required."})
+
+
+def list_param(params, name):
+    """ returns the values of a comma separated or repeated query parameter """
+    return [x.strip() for value in params.getlist(name) for x in value.split(',') if x.strip()]
+
+
+class PassthroughRenderer(renderers.BaseRenderer):
+
+    """ lets the export stream through, errors are rendered as JSON """
+
+    media_type = '*/*'
+    format = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, (bytes, str)):
+            return data
+        return json.dumps(data).encode('utf-8')
 
 
 class ZotItemViewSet(viewsets.ModelViewSet):
+
+    """
+    Lists are paginated by cursor in ascending 'zot_version' order, or chronologically with
+    '?ordering=date' or '-date', and can be filtered by 'item_type', 'year', 'year_from',
+    'year_to', 'key' (comma separated lists allowed) and 'since_version', which returns
+    only items changed after the passed in library version;
+    'resolve' looks up many zotero or citation keys at once, 'facets' returns the item counts
+    per item type, year and publication title, 'export/{bibtex,csl-json,ris}' streams the
+    items in these formats;
+    '?fields=' limits the returned fields, e.g. '?fields=zot_key,zot_version'.
+    List and detail responses carry an ETag and Last-Modified header, conditional requests
+    are answered with '304 Not Modified' and serialized responses are cached until the next
+    write to the stored items, see bib.caching
+    """
+
     queryset = ZotItem.objects.all()
     serializer_class = ZotItemSerializer
+    pagination_class = ZotItemCursorPagination
+
+    def list(self, request, *args, **kwargs):
+        state = SyncState.objects.filter(
+            library_id=settings.Z_ID, library_type=settings.Z_LIBRARY_TYPE
+        ).values_list('library_version', 'ended').first()
+        version, ended = state or (None, None)
+        etag = make_etag(
+            'list', version, request.get_full_path(), request.accepted_renderer.format
+        )
+        return self.conditional_response(
+            request, etag, [ended],
+            lambda: super(ZotItemViewSet, self).list(request, *args, **kwargs).data
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        lookup = self.lookup_url_kwarg or self.lookup_field
+        item = ZotItem.objects.filter(pk=kwargs[lookup]).values_list(
+            'zot_version', 'date_modified'
+        ).first()
+        if item is None:
+            # raises the 404
+            return super(ZotItemViewSet, self).retrieve(request, *args, **kwargs)
+        version, date_modified = item
+        etag = make_etag(
+            'detail', kwargs[lookup], version, request.get_full_path(),
+            request.accepted_renderer.format
+        )
+        return self.conditional_response(
+            request, etag, [date_modified],
+            lambda: super(ZotItemViewSet, self).retrieve(request, *args, **kwargs).data
+        )
+
+    @action(detail=False, methods=['get', 'post'])
+    def resolve(self, request):
+        """
+        resolves the zotero keys and bibtex citation keys passed as '?key=' (comma separated
+        lists allowed) or as list 'keys' of a JSON body with one query; returns an object
+        mapping every key to its item or null
+        """
+        if request.method == 'POST':
+            keys = request.data.get('keys') if hasattr(request.data, 'get') else None
+            if not isinstance(keys, list) or not all(isinstance(x, str) for x in keys):
+                raise ValidationError({'keys': "A list of strings is required."})
+        else:
+            keys = list_param(request.query_params, 'key')
+        if len(keys) > RESOLVE_MAX_KEYS:
+            raise ValidationError(
+                {'keys': "At most {} keys can be resolved at once.".format(RESOLVE_MAX_KEYS)}
+            )
+        fields = sparse_fields(request)
+        if fields:
+            # raises the 400 for unknown fields
+            self.get_columns(fields)
+        resolved = resolve(keys)
+        items = [x for x in resolved.values() if x is not None]
+        data = dict(zip([x.zot_key for x in items], self.get_serializer(items, many=True).data))
+        return Response({
+            'results': {k: data[v.zot_key] if v else None for k, v in resolved.items()}
+        })
+
+    @action(detail=False)
+    def facets(self, request):
+        """
+        returns the precomputed item counts per value of the facets 'item_type', 'year' and
+        'pub_title', the most frequent values first; '?facet=' picks facets (comma separated
+        lists allowed), '?limit=' the number of values per facet, 0 for all of them
+        """
+        names = list_param(request.query_params, 'facet') or None
+        unknown = [x for x in names or [] if x not in FACETS]
+        if unknown:
+            raise ValidationError({'facet': "Unknown facets: {}".format(", ".join(unknown))})
+        limit = int_param(request.query_params, 'limit')
+        limit = FACET_LIMIT if limit is None else limit
+        etag = make_etag('facets', request.get_full_path(), request.accepted_renderer.format)
+        return self.conditional_response(
+            request, etag, [], lambda: get_facets(names, limit or None)
+        )
+
+    @action(
+        detail=False, url_path='export/(?P<export_format>bibtex|csl-json|ris)',
+        renderer_classes=[PassthroughRenderer]
+    )
+    def export(self, request, export_format=None):
+        """
+        streams all items, or the ones matching the filters of the list, as bibtex, CSL-JSON
+        or RIS file, gzip compressed if the client accepts it; memory use does not depend
+        on the number of items, see bib.export
+        """
+        queryset = self.filter_queryset_by_params(ZotItem.objects.all(), request.query_params)
+        compress = 'gzip' in request.META.get('HTTP_ACCEPT_ENCODING', '')
+        etag = make_etag('export', request.get_full_path(), compress)
+        last_modified = int(get_generation_datetime().timestamp())
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            content_type, extension = FORMATS[export_format][:2]
+            chunks = export_items(queryset, export_format)
+            response = StreamingHttpResponse(
+                gzip_chunks(chunks) if compress else chunks, content_type=content_type
+            )
+            if compress:
+                response['Content-Encoding'] = 'gzip'
+            response['Content-Disposition'] = 'attachment; filename="zotitems.{}"'.format(
+                extension
+            )
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        patch_vary_headers(response, ['Accept-Encoding'])
+        return response
+
+    def conditional_response(self, request, etag, dates, get_data):
+        """
+        answers conditional requests matching 'etag' or the latest of 'dates' and the last
+        write with a '304 Not Modified', otherwise returns the data of 'get_data', cached by 'etag'
+        """
+        last_modified = max([x for x in dates if x] + [get_generation_datetime()])
+        timestamp = int(last_modified.timestamp())
+        response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+        if response is None:
+            response = Response(cached(etag, get_data))
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(timestamp)
+        return response
+
+    def get_queryset(self):
+        queryset = super(ZotItemViewSet, self).get_queryset()
+        fields = sparse_fields(self.request)
+        if fields:
+            queryset = queryset.only(*self.get_columns(fields))
+        elif self.action == 'list':
+            queryset = queryset.for_list()
+        if self.action == 'list':
+            queryset = self.filter_queryset_by_params(queryset, self.request.query_params)
+        return queryset
+
+    def get_columns(self, fields):
+        """ the columns needed to serialize 'fields', raises a 400 for unknown fields """
+        serializer_fields = ZotItemSerializer(context=self.get_serializer_context()).fields
+        unknown = [x for x in fields if x not in serializer_fields]
+        if unknown:
+            raise ValidationError({'fields': "Unknown fields: {}".format(", ".join(unknown))})
+        columns = {f.name for f in ZotItem._meta.concrete_fields}
+        # the primary key is needed by 'url', the version and date sort key by the pagination
+        return ['zot_key', 'zot_version', 'date_sort'] + [x for x in fields if x in columns]
+
+    def filter_queryset_by_params(self, queryset, params):
+        item_types = list_param(params, 'item_type')
+        if item_types:
+            queryset = queryset.filter(zot_item_type__in=item_types)
+        keys = list_param(params, 'key')
+        if keys:
+            queryset = queryset.filter(zot_key__in=keys)
+        year = int_param(params, 'year')
+        if year is not None:
+            queryset = queryset.filter(year=year)
+        year_from = int_param(params, 'year_from')
+        if year_from is not None:
+            queryset = queryset.filter(year__gte=year_from)
+        year_to = int_param(params, 'year_to')
+        if year_to is not None:
+            queryset = queryset.filter(year__lte=year_to)
+        since_version = int_param(params, 'since_version')
+        if since_version is not None:
+            queryset = queryset.filter(zot_version__gt=since_version)
+        return queryset
+
+    def get_serializer_class(self):
+        # sparse fieldsets can pick any field of the full representation
+        if self.action in ('list', 'resolve') and not sparse_fields(self.request):
+            return ZotItemListSerializer
+        return super(ZotItemViewSet, self).get_serializer_class()
@@ -4,3 +4,4 @@ from django.apps import AppConfig
 
 class BibConfig(AppConfig):
     name = 'bib'
+    default_auto_field = 'django.db.models.AutoField'
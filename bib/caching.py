@@ -0,0 +1,55 @@
+import datetime
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+try:
+    API_CACHE = settings.Z_API_CACHE
+except AttributeError:
+    API_CACHE = 'default'
+try:
+    API_CACHE_TIMEOUT = settings.Z_API_CACHE_TIMEOUT
+except AttributeError:
+    API_CACHE_TIMEOUT = 3600
+
+GENERATION_KEY = 'bib:zotitems:generation'
+
+
+def get_cache():
+    return caches[API_CACHE]
+
+
+def get_generation():
+    """
+    returns the timestamp of the last write or deletion of ZotItem objects, or of the first
+    call if the cache does not know of one; part of every ETag and cache key
+    """
+    return get_cache().get_or_set(GENERATION_KEY, time.time, None)
+
+
+def get_generation_datetime():
+    return datetime.datetime.fromtimestamp(get_generation(), tz=datetime.timezone.utc)
+
+
+def invalidate():
+    """ starts a new generation, which makes all cached responses and ETags stale """
+    get_cache().set(GENERATION_KEY, time.time(), None)
+
+
+def make_etag(*parts):
+    """ returns a strong ETag computed from the passed in parts and the current generation """
+    value = ":".join("{!r}".format(x) for x in (get_generation(),) + parts)
+    return '"{}"'.format(hashlib.md5(value.encode('utf-8')).hexdigest())
+
+
+def cached(key, func):
+    """ returns the cached value of 'key', computing and storing it with 'func' on a miss """
+    cache = get_cache()
+    key = 'bib:api:{}'.format(key)
+    value = cache.get(key)
+    if value is None:
+        value = func()
+        cache.set(key, value, API_CACHE_TIMEOUT)
+    return value
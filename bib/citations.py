@@ -0,0 +1,81 @@
+import re
+
+from django.template.loader import get_template
+from django.utils.html import conditional_escape
+from django.utils.safestring import mark_safe
+
+from bib.models import NN
+from bib.resolver import resolve
+
+# all citation markers in one alternation, so a text is scanned once no matter how many
+# kinds are supported: latex \cite commands (natbib and biblatex variants included) with
+# optional pre- and postnotes, and pandoc style [@key] or [see @key1, p. 3; @key2]
+CITATION_RE = re.compile(
+    r'\\(?P<command>[a-zA-Z]*cite[a-zA-Z]*)\*?(?:\[[^\]\n]*\]){0,2}\{(?P<keys>[^}\n]*)\}'
+    r'|\[(?P<pandoc>[^\[\]\n]*@[^\[\]\n]*)\]'
+)
+PANDOC_KEY_RE = re.compile(r'(?<!\w)-?@(\w(?:[\w:.#$%&+?<>~/-]*\w)?)')
+
+
+def marker_keys(match):
+    """ returns the citation keys of a match of CITATION_RE """
+    if match.group('keys') is not None:
+        return [x.strip() for x in match.group('keys').split(',') if x.strip()]
+    return PANDOC_KEY_RE.findall(match.group('pandoc'))
+
+
+def find_citations(text):
+    """ returns the citation keys of all markers in 'text', in order of appearance """
+    keys = []
+    for match in CITATION_RE.finditer(text or ""):
+        keys.extend(marker_keys(match))
+    return keys
+
+
+def short_citation(item):
+    """ returns the 'Author Year' label an inline citation of 'item' is rendered with """
+    names = [
+        x.get('lastName') or x.get('name') or "" for x in item.zot_creator or []
+        if isinstance(x, dict)
+    ]
+    names = [x for x in names if x]
+    if len(names) > 2:
+        author = "{} et al.".format(names[0])
+    else:
+        author = " / ".join(names) or NN
+    return "{} {}".format(author, item.year or "").strip()
+
+
+def replace_citations(text, autoescape=True):
+
+    """
+    replaces the citation markers of 'text' with links to the cited items, rendered with
+    'bib/tags/zotitem.html'; the text is scanned once and all cited keys are resolved with
+    one query. Markers citing unknown keys are kept as they are; with 'autoescape' the
+    rest of the text is escaped
+    """
+
+    text = text or ""
+    escape = conditional_escape if autoescape else (lambda x: x)
+    matches = list(CITATION_RE.finditer(text))
+    resolved = resolve([key for match in matches for key in marker_keys(match)])
+    template = get_template('bib/tags/zotitem.html')
+    rendered = {}
+
+    def render(key):
+        if key not in rendered:
+            item = resolved[key]
+            rendered[key] = template.render({'object': item, 'quote': short_citation(item)}).strip()
+        return rendered[key]
+
+    parts = []
+    end = 0
+    for match in matches:
+        keys = marker_keys(match)
+        if not keys or not all(resolved.get(x) for x in keys):
+            continue
+        parts.append(escape(text[end:match.start()]))
+        parts.append("; ".join(render(x) for x in keys))
+        end = match.end()
+    parts.append(escape(text[end:]))
+    return mark_safe("".join(parts))
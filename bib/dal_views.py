@@ -1,18 +1,63 @@
+import datetime
+import re
+
 from dal import autocomplete
-from django.db.models import Q
 from bib.models import ZotItem
+from bib.search import search_zotitems
+
+# a year or a range of years in the search string, e.g. '1871', '1850-1870' or 'year:1984'
+YEARS_RE = re.compile(r'(?<![\w:])(year:\s*)?(\d{4})(?:\s*[-–]\s*(\d{4}))?(?!\d)', re.IGNORECASE)
+# bare years before this one are searched for as text
+YEAR_MIN = 1000
+
+
+def int_or_none(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def split_years(q):
+
+    """
+    returns the first year range of the search string 'q' and the rest of it; a bare year
+    only counts if it is plausible and other text is left to search for, so a title like
+    '1984' is still found; prefixed with 'year:' it always counts
+    """
+
+    year_max = datetime.date.today().year + 1
+    for match in YEARS_RE.finditer(q or ""):
+        years = [int(match.group(2)), int(match.group(3) or match.group(2))]
+        rest = (q[:match.start()] + q[match.end():]).strip()
+        if match.group(1) or (rest and all(YEAR_MIN <= x <= year_max for x in years)):
+            return min(years), max(years), rest
+    return None, None, q
 
 
 class ZotItemAC(autocomplete.Select2QuerySetView):
+
+    """
+    Years or year ranges in the search string ('danube 1850-1870', 'year:1984', see
+    'split_years') filter by the indexed year column instead of being searched for in the
+    date; so do the forwarded values 'year_from' and 'year_to'. Results are ordered
+    chronologically unless searched by text.
+    """
+
     def get_queryset(self):
-        qs = ZotItem.objects.all()
-
-        if self.q:
-            qs = qs.filter(
-                Q(zot_title__icontains=self.q) |
-                Q(zot_creator__icontains=self.q) |
-                Q(zot_pub_title__icontains=self.q) |
-                Q(zot_date__icontains=self.q)
-            )
+        qs = ZotItem.objects.for_list()
+
+        year_from, year_to, q = split_years(self.q)
+        year_from = int_or_none(self.forwarded.get('year_from')) or year_from
+        year_to = int_or_none(self.forwarded.get('year_to')) or year_to
+        if year_from:
+            qs = qs.filter(year__gte=year_from)
+        if year_to:
+            qs = qs.filter(year__lte=year_to)
+
+        if q:
+            qs = search_zotitems(qs, q)
+        else:
+            qs = qs.order_by('date_sort')
 
         return qs
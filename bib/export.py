@@ -0,0 +1,217 @@
+import json
+import zlib
+
+from django.conf import settings
+
+try:
+    EXPORT_CHUNK_SIZE = settings.Z_EXPORT_CHUNK_SIZE
+except AttributeError:
+    EXPORT_CHUNK_SIZE = 2000
+
+# the columns the export formats need, the other ones are never loaded
+EXPORT_FIELDS = [
+    'zot_key', 'zot_creator', 'zot_date', 'year', 'date_sort', 'zot_item_type', 'zot_title',
+    'zot_pub_title', 'zot_pages', 'zot_html_link', 'zot_bibtex', 'citation_key',
+]
+
+# zotero item types to CSL and RIS types
+CSL_TYPES = {
+    'book': 'book',
+    'bookSection': 'chapter',
+    'journalArticle': 'article-journal',
+    'magazineArticle': 'article-magazine',
+    'newspaperArticle': 'article-newspaper',
+    'thesis': 'thesis',
+    'report': 'report',
+    'conferencePaper': 'paper-conference',
+    'encyclopediaArticle': 'entry-encyclopedia',
+    'dictionaryEntry': 'entry-dictionary',
+    'webpage': 'webpage',
+    'manuscript': 'manuscript',
+    'letter': 'personal_communication',
+    'map': 'map',
+}
+RIS_TYPES = {
+    'book': 'BOOK',
+    'bookSection': 'CHAP',
+    'journalArticle': 'JOUR',
+    'magazineArticle': 'MGZN',
+    'newspaperArticle': 'NEWS',
+    'thesis': 'THES',
+    'report': 'RPRT',
+    'conferencePaper': 'CONF',
+    'encyclopediaArticle': 'ENCYC',
+    'dictionaryEntry': 'DICT',
+    'webpage': 'ELEC',
+    'manuscript': 'MANSCPT',
+    'letter': 'PCOMM',
+    'map': 'MAP',
+}
+
+
+def creators(item, types=('author',)):
+    """ returns the (last name, first name) pairs of the item's creators of 'types' """
+    result = []
+    for x in item.zot_creator or []:
+        if not isinstance(x, dict) or x.get('creatorType', 'author') not in types:
+            continue
+        if x.get('lastName'):
+            result.append((x['lastName'], x.get('firstName', '')))
+        elif x.get('name'):
+            result.append((x['name'], ''))
+    return result
+
+
+def iso_date(item):
+    """ returns the parsed ISO 8601 date of the item, see ZotItem.date_sort """
+    date = (item.date_sort or "").split(" ")[0]
+    return "" if date == "~" else date
+
+
+def bibtex_escape(value):
+    return "{}".format(value).replace("{", "\\{").replace("}", "\\}")
+
+
+def to_bibtex(item):
+    """ the stored bibtex of the item, or a minimal @misc entry built from its fields """
+    if item.zot_bibtex:
+        return item.zot_bibtex.strip() + "\n"
+    fields = [('title', item.zot_title)]
+    names = creators(item)
+    if names:
+        fields.append(('author', " and ".join(
+            "{}, {}".format(last, first) if first else last for last, first in names
+        )))
+    fields += [('year', item.year), ('pages', item.zot_pages), ('url', item.zot_html_link)]
+    lines = ["@misc{{{},".format(item.citation_key or item.zot_key)]
+    lines += ["\t{} = {{{}}},".format(k, bibtex_escape(v)) for k, v in fields if v]
+    return "\n".join(lines) + "\n}\n"
+
+
+def to_csl(item):
+    """ the CSL-JSON object of the item """
+    data = {
+        'id': item.zot_key,
+        'type': CSL_TYPES.get(item.zot_item_type, 'document'),
+        'title': item.zot_title,
+    }
+    for role, types in [('author', ('author',)), ('editor', ('editor', 'seriesEditor'))]:
+        names = creators(item, types)
+        if names:
+            data[role] = [
+                {'family': last, 'given': first} if first else {'literal': last}
+                for last, first in names
+            ]
+    if item.citation_key:
+        data['citation-key'] = item.citation_key
+    if item.zot_pub_title:
+        data['container-title'] = item.zot_pub_title
+    if item.zot_pages:
+        data['page'] = item.zot_pages
+    date = iso_date(item)
+    if date:
+        data['issued'] = {'date-parts': [[int(x) for x in date.split("-")]]}
+    elif item.zot_date:
+        data['issued'] = {'literal': item.zot_date}
+    if item.zot_html_link:
+        data['URL'] = item.zot_html_link
+    return data
+
+
+def to_ris(item):
+    """ the RIS record of the item """
+    lines = [('TY', RIS_TYPES.get(item.zot_item_type, 'GEN')), ('ID', item.zot_key)]
+    lines.append(('TI', item.zot_title))
+    lines += [('AU', "{}, {}".format(last, first) if first else last)
+              for last, first in creators(item)]
+    lines += [('A2', "{}, {}".format(last, first) if first else last)
+              for last, first in creators(item, ('editor', 'seriesEditor'))]
+    if item.zot_pub_title:
+        lines.append(('T2', item.zot_pub_title))
+    if item.year:
+        lines.append(('PY', item.year))
+    date = iso_date(item)
+    if date:
+        lines.append(('DA', "/".join((date.split("-") + ["", ""])[:3]) + "/"))
+    if item.zot_pages:
+        pages = item.zot_pages.replace("–", "-").split("-", 1)
+        lines.append(('SP', pages[0].strip()))
+        if len(pages) > 1:
+            lines.append(('EP', pages[1].strip()))
+    if item.zot_html_link:
+        lines.append(('UR', item.zot_html_link))
+    lines.append(('ER', ''))
+    return "\n".join("{}  - {}".format(k, v) for k, v in lines if v != '' or k == 'ER') + "\n\n"
+
+
+class CslJson(object):
+
+    """ writes the items as one JSON array, each item on a line of its own """
+
+    def begin(self):
+        self.first = True
+        return "[\n"
+
+    def item(self, item):
+        separator = "" if self.first else ",\n"
+        self.first = False
+        return separator + json.dumps(to_csl(item), ensure_ascii=False)
+
+    def end(self):
+        return "\n]\n"
+
+
+class Records(object):
+
+    """ writes the items as records following each other, e.g. bibtex entries """
+
+    def __init__(self, convert):
+        self.convert = convert
+
+    def begin(self):
+        return ""
+
+    def item(self, item):
+        return self.convert(item)
+
+    def end(self):
+        return ""
+
+
+# export format -> (content type, file extension, writer factory)
+FORMATS = {
+    'bibtex': ('application/x-bibtex; charset=utf-8', 'bib', lambda: Records(to_bibtex)),
+    'csl-json': ('application/vnd.citationstyles.csl+json; charset=utf-8', 'json', CslJson),
+    'ris': ('application/x-research-info-systems; charset=utf-8', 'ris', lambda: Records(to_ris)),
+}
+
+
+def export_items(queryset, export_format, chunk_size=None):
+
+    """
+    generator yielding the items of 'queryset' in 'export_format' (see FORMATS) as utf-8
+    encoded chunks of 'chunk_size' items; the items are read with a database cursor in
+    chunks as well, so memory use does not grow with the number of items
+    """
+
+    chunk_size = chunk_size or EXPORT_CHUNK_SIZE
+    writer = FORMATS[export_format][2]()
+    items = queryset.only(*EXPORT_FIELDS).order_by('zot_key').iterator(chunk_size=chunk_size)
+    parts = [writer.begin()]
+    for item in items:
+        parts.append(writer.item(item))
+        if len(parts) >= chunk_size:
+            yield "".join(parts).encode('utf-8')
+            parts = []
+    parts.append(writer.end())
+    yield "".join(parts).encode('utf-8')
+
+
+def gzip_chunks(chunks):
+    """ generator compressing the passed in byte chunks into one gzip stream """
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
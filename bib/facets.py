@@ -0,0 +1,100 @@
+from collections import Counter, defaultdict
+
+from django.db import transaction
+from django.db.models import Count, F
+
+from bib.caching import invalidate
+from bib.models import FacetCount, ZotItem
+
+# the facets and the ZotItem columns they count
+FACETS = {
+    'item_type': 'zot_item_type',
+    'year': 'year',
+    'pub_title': 'zot_pub_title',
+}
+VALUE_LENGTH = 255
+
+
+def facet_value(value):
+    """ returns the FacetCount value of a column value """
+    return ("" if value is None else "{}".format(value))[:VALUE_LENGTH]
+
+
+def count_changes(added=(), removed=()):
+
+    """
+    returns a Counter of the changes to the facet counts caused by adding and removing the
+    passed in ZotItem objects or dicts of their columns, keyed by (facet, value)
+    """
+
+    changes = Counter()
+    for items, sign in [(added, 1), (removed, -1)]:
+        for item in items:
+            for facet, column in FACETS.items():
+                value = item[column] if isinstance(item, dict) else getattr(item, column)
+                changes[(facet, facet_value(value))] += sign
+    return changes
+
+
+def apply_changes(changes):
+
+    """
+    adds the (facet, value) -> delta Counter 'changes' to the stored counts with one
+    UPDATE per facet and delta, so a batch costs a few queries no matter its size;
+    counts dropping to zero are deleted. Call it in the transaction writing the items.
+    """
+
+    changes = {k: v for k, v in changes.items() if v}
+    if not changes:
+        return
+    FacetCount.objects.bulk_create(
+        [FacetCount(facet=f, value=v, count=0) for (f, v), delta in changes.items() if delta > 0],
+        ignore_conflicts=True
+    )
+    groups = defaultdict(list)
+    for (facet, value), delta in changes.items():
+        groups[(facet, delta)].append(value)
+    for (facet, delta), values in groups.items():
+        FacetCount.objects.filter(facet=facet, value__in=values).update(count=F('count') + delta)
+    if any(delta < 0 for delta in changes.values()):
+        FacetCount.objects.filter(count__lte=0).delete()
+
+
+def get_facets(names=None, limit=None):
+
+    """
+    returns a dict mapping the names of the passed in facets (all by default) to lists of
+    {'value': ..., 'count': ...} dicts, the most frequent values first and at most 'limit'
+    of them per facet; reads the precomputed counts only, with one query per facet
+    """
+
+    result = {}
+    for facet in [x for x in FACETS if names is None or x in names]:
+        # one query per facet, backed by the 'bib_facetcount_facet_count' index
+        rows = FacetCount.objects.filter(facet=facet, count__gt=0).order_by('-count', 'value')
+        if limit:
+            rows = rows[:limit]
+        result[facet] = [{'value': v, 'count': n} for v, n in rows.values_list('value', 'count')]
+    return result
+
+
+def rebuild_facets():
+
+    """
+    recomputes all facet counts from the stored items with one GROUP BY per facet, e.g.
+    after items were written without going through the sync; returns the number of counts
+    """
+
+    with transaction.atomic():
+        FacetCount.objects.all().delete()
+        counts = Counter()
+        for facet, column in FACETS.items():
+            rows = ZotItem.objects.order_by().values(column).annotate(n=Count('pk'))
+            for row in rows:
+                counts[(facet, facet_value(row[column]))] += row['n']
+        FacetCount.objects.bulk_create(
+            [FacetCount(facet=f, value=v, count=n) for (f, v), n in counts.items()],
+            batch_size=1000
+        )
+    invalidate()
+    return len(counts)
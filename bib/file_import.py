@@ -0,0 +1,568 @@
+import gzip
+import json
+import re
+import unicodedata
+from xml.etree import ElementTree
+
+from django.conf import settings
+from django.utils import timezone
+
+from bib.export import CSL_TYPES
+from bib.models import SyncState, ZotItem
+from bib.zot_utils import write_pages
+
+# items passed to 'write_pages' per page
+PAGE_SIZE = 100
+# characters read from the file at once
+READ_SIZE = 64 * 1024
+
+# a zotero item key, 8 characters of zotero's key alphabet
+KEY = r'[23456789ABCDEFGHIJKLMNPQRSTUVWXYZ]{8}'
+# a zotero item uri, e.g. 'http://zotero.org/groups/1/items/ABCD2345',
+# 'zotero://select/groups/1/items/ABCD2345' or 'zotero://select/items/1_ABCD2345'
+URI_KEY_RE = re.compile(
+    r'(?:^|\s)(?:https?://(?:www\.)?zotero\.org/(?:users|groups)/(?:local/)?[^/\s]+/items/'
+    r'|zotero://select/(?:(?:library|(?:users|groups)/[^/\s]+)/items/|items/\d+_))'
+    r'(' + KEY + r')/?(?=\s|$)'
+)
+# a key on its own, as in the 'zotero-key' field of bibtex entries
+KEY_RE = re.compile(r'^(' + KEY + r')$')
+# the id of zotero's CSL-JSON export, '<library id>/<key>'
+CSL_ID_RE = re.compile(r'^\d+/(' + KEY + r')$')
+
+CSL_ITEM_TYPES = {v: k for k, v in CSL_TYPES.items()}
+BIBTEX_ITEM_TYPES = {
+    'article': 'journalArticle',
+    'book': 'book',
+    'booklet': 'book',
+    'manual': 'book',
+    'inbook': 'bookSection',
+    'incollection': 'bookSection',
+    'inproceedings': 'conferencePaper',
+    'conference': 'conferencePaper',
+    'phdthesis': 'thesis',
+    'mastersthesis': 'thesis',
+    'thesis': 'thesis',
+    'techreport': 'report',
+    'report': 'report',
+    'online': 'webpage',
+    'unpublished': 'manuscript',
+    'misc': 'document',
+}
+BIBTEX_MONTHS = {
+    'jan': 1, 'feb': 2, 'mar': 3, 'apr': 4, 'may': 5, 'jun': 6,
+    'jul': 7, 'aug': 8, 'sep': 9, 'oct': 10, 'nov': 11, 'dec': 12,
+}
+LATEX_ACCENTS = {
+    '"': '\u0308', "'": '\u0301', '`': '\u0300', '^': '\u0302', '~': '\u0303', '=': '\u0304',
+    '.': '\u0307', 'c': '\u0327', 'v': '\u030c', 'u': '\u0306', 'H': '\u030b',
+}
+LATEX_ACCENT_RE = re.compile(
+    r'\\([\'"`^~=.])\s*\{?([A-Za-z])\}?|\\([cvuH])(?:\s*\{([A-Za-z])\}|\s+([A-Za-z]))'
+)
+LATEX_SYMBOLS = {
+    r'\ss': 'ß', r'\o': 'ø', r'\O': 'Ø', r'\ae': 'æ', r'\AE': 'Æ', r'\oe': 'œ', r'\aa': 'å',
+    r'\&': '&', r'\%': '%', r'\_': '_', r'\$': '$', '--': '-',
+}
+
+NS = {
+    'rdf': 'http://www.w3.org/1999/02/22-rdf-syntax-ns#',
+    'z': 'http://www.zotero.org/namespaces/export#',
+    'dc': 'http://purl.org/dc/elements/1.1/',
+    'dcterms': 'http://purl.org/dc/terms/',
+    'bib': 'http://purl.org/net/biblio#',
+    'foaf': 'http://xmlns.com/foaf/0.1/',
+}
+RDF_ROLES = {
+    'authors': 'author',
+    'editors': 'editor',
+    'seriesEditors': 'seriesEditor',
+    'translators': 'translator',
+    'contributors': 'contributor',
+}
+# the containers whose title is the publicationTitle of an item
+RDF_PUBLICATIONS = ['Journal', 'Periodical', 'Book', 'Document', 'Website']
+
+
+def make_bib(key, library_id, library_type, version=None, **fields):
+    """ returns a dict like the ones created by 'item_to_dict' for an item read from a file """
+    path = "{}s/{}/items/{}".format(library_type, library_id, key)
+    bib = {
+        'key': key,
+        'creators': [],
+        'date': "",
+        'itemType': "",
+        'title': "",
+        'publicationTitle': "",
+        'dateModified': "",
+        'pages': "",
+        'version': "{}".format(version) if version else "",
+        'zot_html_link': "https://www.zotero.org/{}".format(path),
+        'zot_api_link': "https://api.zotero.org/{}".format(path),
+        'zot_bibtex': "",
+    }
+    bib.update(fields)
+    return bib
+
+
+def find_key(*values, pattern=URI_KEY_RE):
+    """
+    returns the first zotero item key found in the passed in values, by default in zotero
+    item uris; other uris ending in something key-like (e.g. 'https://www.jstor.org/stable/
+    40375123') are not taken for zotero keys
+    """
+    for value in values:
+        match = pattern.search("{}".format(value or "").strip())
+        if match:
+            return match.group(1)
+    return None
+
+
+def iter_json_array(f):
+
+    """
+    generator yielding the elements of the JSON array in the text file 'f' one by one,
+    reading READ_SIZE characters at a time, so only one element is held in memory
+    """
+
+    decoder = json.JSONDecoder()
+    buffer = ""
+    started = eof = False
+    while True:
+        buffer = buffer.lstrip()
+        if buffer and not started:
+            if buffer[0] != '[':
+                raise ValueError("the file does not hold a JSON array")
+            buffer, started = buffer[1:], True
+            continue
+        if buffer[:1] == ',':
+            buffer = buffer[1:]
+            continue
+        if buffer[:1] == ']':
+            return
+        if buffer:
+            try:
+                value, end = decoder.raw_decode(buffer)
+            except ValueError:
+                if eof:
+                    raise
+            else:
+                yield value
+                buffer = buffer[end:]
+                continue
+        elif eof:
+            if started:
+                raise ValueError("unexpected end of the JSON array")
+            return
+        data = f.read(READ_SIZE)
+        eof = not data
+        buffer += data
+
+
+def csl_creators(data):
+    creators = []
+    for role in ['author', 'editor', 'translator', 'collection-editor']:
+        for name in data.get(role) or []:
+            creator_type = 'seriesEditor' if role == 'collection-editor' else role
+            if name.get('family'):
+                creators.append({
+                    'creatorType': creator_type, 'firstName': name.get('given', ''),
+                    'lastName': name['family'],
+                })
+            elif name.get('literal'):
+                creators.append({'creatorType': creator_type, 'name': name['literal']})
+    return creators
+
+
+def csl_date(value):
+    """ returns the zotero date of a CSL date variable """
+    if not value:
+        return ""
+    parts = (value.get('date-parts') or [[]])[0]
+    if parts and parts[0]:
+        return "-".join(
+            "{:04d}".format(int(x)) if i == 0 else "{:02d}".format(int(x))
+            for i, x in enumerate(parts)
+        )
+    return "{}".format(value.get('literal') or value.get('raw') or "")
+
+
+def read_csl_json(f, library_id, library_type, version=None, unkeyed=None):
+    """ generator yielding the items of a CSL-JSON file as 'item_to_dict' dicts """
+    for data in iter_json_array(f):
+        key = find_key(data.get('id'), pattern=CSL_ID_RE) or find_key(data.get('id'), data.get('URL'))
+        if key is None:
+            if unkeyed is not None:
+                unkeyed.append("{}".format(data.get('id')))
+            continue
+        yield make_bib(
+            key, library_id, library_type, version,
+            creators=csl_creators(data),
+            date=csl_date(data.get('issued')),
+            itemType=CSL_ITEM_TYPES.get(data.get('type'), 'document'),
+            title="{}".format(data.get('title', '')),
+            publicationTitle="{}".format(data.get('container-title', '')),
+            pages="{}".format(data.get('page', '')),
+        )
+
+
+def iter_bibtex_entries(f):
+
+    """
+    generator yielding the text of the entries of the bibtex file 'f' one by one, read line
+    by line; an entry ends where the brace or parenthesis opened after its type is closed
+    """
+
+    entry = []
+    depth = 0
+    closing = None
+    for line in f:
+        start = 0
+        while start < len(line):
+            if closing is None:
+                at = line.find('@', start)
+                if at < 0:
+                    break
+                match = re.match(r'@\s*\w+\s*([{(])', line[at:])
+                if not match:
+                    start = at + 1
+                    continue
+                closing = '}' if match.group(1) == '{' else ')'
+                depth = 0
+                entry = []
+                start = at
+            escaped = False
+            for i in range(start, len(line)):
+                char = line[i]
+                if escaped:
+                    escaped = False
+                elif char == '\\':
+                    escaped = True
+                elif char in '{(' and (char == '{' or depth == 0):
+                    depth += 1
+                elif char == '}' or (char == ')' and closing == ')' and depth == 1):
+                    depth -= 1
+                    if depth == 0:
+                        entry.append(line[start:i + 1])
+                        yield "".join(entry).strip()
+                        closing = None
+                        start = i + 1
+                        break
+            else:
+                entry.append(line[start:])
+                break
+
+
+def bibtex_value(text, pos):
+    """ returns the raw value of a bibtex field starting at 'pos' and the position after it """
+    pieces = []
+    while True:
+        while pos < len(text) and text[pos].isspace():
+            pos += 1
+        if pos < len(text) and text[pos] == '{':
+            depth, start = 0, pos
+            while pos < len(text):
+                if text[pos] == '\\':
+                    pos += 2
+                    continue
+                depth += {'{': 1, '}': -1}.get(text[pos], 0)
+                pos += 1
+                if depth == 0:
+                    break
+            pieces.append(text[start + 1:pos - 1])
+        elif pos < len(text) and text[pos] == '"':
+            start = pos = pos + 1
+            depth = 0
+            while pos < len(text) and not (text[pos] == '"' and depth == 0):
+                depth += {'{': 1, '}': -1}.get(text[pos], 0)
+                pos += 2 if text[pos] == '\\' else 1
+            pieces.append(text[start:pos])
+            pos += 1
+        else:
+            match = re.compile(r'[^,}#\s]*').match(text, pos)
+            pieces.append(match.group(0))
+            pos = match.end()
+        while pos < len(text) and text[pos].isspace():
+            pos += 1
+        if pos < len(text) and text[pos] == '#':
+            pos += 1
+            continue
+        return "".join(pieces), pos
+
+
+def parse_bibtex_entry(text):
+    """ returns the type, citation key and dict of raw field values of a bibtex entry """
+    match = re.match(r'@\s*(\w+)\s*[{(]\s*([^,\s]*)\s*,?', text)
+    if not match:
+        return None, None, {}
+    fields = {}
+    pos = match.end()
+    name_re = re.compile(r'[\s,]*([\w\-:.+]+)\s*=')
+    while True:
+        name = name_re.match(text, pos)
+        if not name:
+            break
+        value, pos = bibtex_value(text, name.end())
+        fields[name.group(1).lower()] = value
+    return match.group(1).lower(), match.group(2), fields
+
+
+def latex_to_text(value):
+    """ resolves common latex accents and symbols, drops braces and collapses whitespace """
+    value = LATEX_ACCENT_RE.sub(
+        lambda m: unicodedata.normalize(
+            'NFC', (m.group(2) or m.group(4) or m.group(5)) + LATEX_ACCENTS[m.group(1) or m.group(3)]
+        ), value
+    )
+    for latex, text in LATEX_SYMBOLS.items():
+        value = value.replace(latex, text)
+    return " ".join(value.replace('{', '').replace('}', '').split())
+
+
+def split_names(value):
+    """ splits a bibtex name list at the 'and's outside of braces """
+    names, depth, start = [], 0, 0
+    for match in re.finditer(r'[{}]|\sand\s', value):
+        token = match.group(0)
+        if token in '{}':
+            depth += 1 if token == '{' else -1
+        elif depth == 0:
+            names.append(value[start:match.start()])
+            start = match.end()
+    names.append(value[start:])
+    return [x.strip() for x in names if x.strip()]
+
+
+def bibtex_creators(fields):
+    creators = []
+    for field, creator_type in [('author', 'author'), ('editor', 'editor')]:
+        for name in split_names(fields.get(field, "")):
+            if name.startswith('{') and name.endswith('}'):
+                creators.append({'creatorType': creator_type, 'name': latex_to_text(name)})
+            elif ',' in name:
+                last, first = name.split(',', 1)
+                creators.append({
+                    'creatorType': creator_type, 'firstName': latex_to_text(first),
+                    'lastName': latex_to_text(last),
+                })
+            else:
+                parts = latex_to_text(name).rsplit(' ', 1)
+                creators.append({
+                    'creatorType': creator_type, 'firstName': parts[0] if len(parts) > 1 else "",
+                    'lastName': parts[-1],
+                })
+    return creators
+
+
+def bibtex_date(fields):
+    if fields.get('date'):
+        return latex_to_text(fields['date'])
+    year = latex_to_text(fields.get('year', ""))
+    month = BIBTEX_MONTHS.get(latex_to_text(fields.get('month', ""))[:3].lower())
+    if year.isdigit() and month:
+        return "{}-{:02d}".format(year, month)
+    return year
+
+
+def read_bibtex(f, library_id, library_type, version=None, unkeyed=None):
+
+    """
+    generator yielding the entries of a bibtex file as 'item_to_dict' dicts, the entry
+    itself stored as bibtex; the zotero key is looked up in the 'zotero-key' and 'zoterokey'
+    fields and in zotero uris of the 'uri', 'url' and 'note' fields
+    """
+
+    for text in iter_bibtex_entries(f):
+        entry_type, citation_key, fields = parse_bibtex_entry(text)
+        if entry_type in (None, 'comment', 'preamble', 'string'):
+            continue
+        key = (
+            find_key(fields.get('zotero-key'), fields.get('zoterokey'), pattern=KEY_RE)
+            or find_key(*[fields.get(x) for x in ['uri', 'url', 'note']])
+        )
+        if key is None:
+            if unkeyed is not None:
+                unkeyed.append(citation_key)
+            continue
+        yield make_bib(
+            key, library_id, library_type, version,
+            creators=bibtex_creators(fields),
+            date=bibtex_date(fields),
+            itemType=BIBTEX_ITEM_TYPES.get(entry_type, 'document'),
+            title=latex_to_text(fields.get('title', "")),
+            publicationTitle=latex_to_text(
+                fields.get('journal') or fields.get('journaltitle') or fields.get('booktitle', "")
+            ),
+            pages=latex_to_text(fields.get('pages', "")),
+            zot_bibtex=text,
+        )
+
+
+def rdf_text(element, path):
+    found = element.find(path, NS)
+    return (found.text or "").strip() if found is not None else ""
+
+
+def rdf_item(element, library_id, library_type, version):
+    """ returns the 'item_to_dict' dict of a zotero rdf item element or None """
+    item_type = rdf_text(element, 'z:itemType')
+    if not item_type or item_type in ('attachment', 'note'):
+        return None
+    key = find_key(
+        element.get('{{{}}}about'.format(NS['rdf'])), rdf_text(element, 'dc:identifier')
+    )
+    if key is None:
+        return False
+    creators = []
+    for role in element:
+        creator_type = RDF_ROLES.get(role.tag.split('}')[-1])
+        if creator_type is None:
+            continue
+        for person in role.iter('{{{}}}Person'.format(NS['foaf'])):
+            creators.append({
+                'creatorType': creator_type,
+                'firstName': rdf_text(person, 'foaf:givenName'),
+                'lastName': rdf_text(person, 'foaf:surname'),
+            })
+        for organization in role.iter('{{{}}}Organization'.format(NS['foaf'])):
+            creators.append({'creatorType': creator_type, 'name': rdf_text(organization, 'foaf:name')})
+    publication = ""
+    for part in element.findall('dcterms:isPartOf/*', NS):
+        if part.tag.split('}')[-1] in RDF_PUBLICATIONS:
+            publication = rdf_text(part, 'dc:title')
+            break
+    return make_bib(
+        key, library_id, library_type, version,
+        creators=creators,
+        date=rdf_text(element, 'dc:date'),
+        itemType=item_type,
+        title=rdf_text(element, 'dc:title'),
+        publicationTitle=publication,
+        pages=rdf_text(element, 'bib:pages'),
+    )
+
+
+def read_rdf(f, library_id, library_type, version=None, unkeyed=None):
+
+    """
+    generator yielding the items of a zotero rdf file as 'item_to_dict' dicts; the file is
+    parsed incrementally and every top level element dropped once read
+    """
+
+    depth = 0
+    root = None
+    for event, element in ElementTree.iterparse(f, events=('start', 'end')):
+        if event == 'start':
+            if root is None:
+                root = element
+            depth += 1
+            continue
+        depth -= 1
+        if depth != 1:
+            continue
+        bib = rdf_item(element, library_id, library_type, version)
+        if bib is False and unkeyed is not None:
+            unkeyed.append(element.get('{{{}}}about'.format(NS['rdf'])))
+        elif bib:
+            yield bib
+        root.clear()
+
+
+READERS = {
+    'csl-json': read_csl_json,
+    'bibtex': read_bibtex,
+    'rdf': read_rdf,
+}
+EXTENSIONS = {'.json': 'csl-json', '.bib': 'bibtex', '.rdf': 'rdf'}
+
+
+def detect_format(path):
+    """ returns the format of a file by its extension, '.gz' ignored, or None """
+    name = path[:-3] if path.endswith('.gz') else path
+    for extension, file_format in EXTENSIONS.items():
+        if name.lower().endswith(extension):
+            return file_format
+    return None
+
+
+def paginate(bibs, page_size=PAGE_SIZE):
+    page = []
+    for bib in bibs:
+        page.append(bib)
+        if len(page) >= page_size:
+            yield page
+            page = []
+    if page:
+        yield page
+
+
+def skip_existing(pages, result):
+
+    """
+    drops the items of each page whose key is already stored, e.g. synced from the API with
+    their bibtex and item version, and counts them in result['existing']
+    """
+
+    for page in pages:
+        keys = set(
+            ZotItem.objects.filter(zot_key__in=[x['key'] for x in page])
+            .values_list('zot_key', flat=True)
+        )
+        result['existing'] += len(keys)
+        yield [x for x in page if x['key'] not in keys]
+
+
+def import_file(
+    path, file_format=None, library_id=None, library_type=None, library_version=None,
+    callback=None, batch_size=None, progress=None, overwrite=False
+):
+
+    """
+    imports the items of a zotero CSL-JSON, bibtex or rdf export file (gzip compressed if its
+    name ends with '.gz'); the file is read incrementally and written with the bulk batches
+    of 'write_pages', so memory use does not depend on its size. Items are only imported
+    if their zotero key is part of the file, see the readers. 'library_version', the library
+    version the file was exported at, is stored in the library's SyncState, so 'bib_update'
+    only fetches what changed since; the items themselves get no version, an export does
+    not hold them and the library version would be a false one ('bib_update --diff' takes
+    them for changed and fetches them with their real versions). Items
+    already stored are left alone unless 'overwrite' is set, an export file holds less
+    than the API (CSL-JSON and rdf no bibtex, none the item version).
+    Returns the dict of 'write_pages' extended by 'unkeyed', the ids of the items without
+    zotero key, and 'existing', the number of stored items left alone
+    """
+
+    library_id = library_id or settings.Z_ID
+    library_type = library_type or settings.Z_LIBRARY_TYPE
+    file_format = file_format or detect_format(path)
+    if file_format not in READERS:
+        raise ValueError("unknown file format of {}".format(path))
+    unkeyed = []
+    found = {'existing': 0}
+    started = timezone.now()
+    opener = gzip.open if path.endswith('.gz') else open
+    mode = 'rb' if file_format == 'rdf' else 'rt'
+    kwargs = {} if mode == 'rb' else {'encoding': 'utf-8'}
+    with opener(path, mode, **kwargs) as f:
+        bibs = READERS[file_format](f, library_id, library_type, None, unkeyed)
+        pages = paginate(bibs)
+        if not overwrite:
+            pages = skip_existing(pages, found)
+        result = write_pages(pages, callback=callback, batch_size=batch_size, progress=progress)
+    result['unkeyed'] = unkeyed
+    result['existing'] = found['existing']
+    if library_version is not None and not result['error']:
+        state, _ = SyncState.objects.get_or_create(
+            library_id="{}".format(library_id), library_type=library_type
+        )
+        state.library_version = library_version
+        state.started = started
+        state.ended = timezone.now()
+        state.duration = (state.ended - started).total_seconds()
+        state.pages = result['pages']
+        state.items_saved = result['items']
+        state.items_skipped = result['skipped']
+        state.items_deleted = 0
+        state.error = ""
+        state.save()
+    return result
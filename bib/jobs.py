@@ -0,0 +1,148 @@
+import datetime
+import os
+import socket
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from bib import metrics, zot_client
+from bib.models import SyncJob
+from bib.zot_utils import sync_library
+
+try:
+    SYNC_JOB_TIMEOUT = settings.Z_SYNC_JOB_TIMEOUT
+except AttributeError:
+    SYNC_JOB_TIMEOUT = 600
+# seconds between the heartbeats a running job stores while it waits for zotero
+HEARTBEAT_INTERVAL = 10
+
+
+def worker_name():
+    return "{}:{}".format(socket.gethostname(), os.getpid())
+
+
+def enqueue_sync(library_id=None, library_type=None, full=False):
+
+    """
+    returns the queued SyncJob of the library (default: settings.Z_ID and Z_LIBRARY_TYPE),
+    creating it if there is none; a job queued while another one runs picks up the changes
+    made in zotero since that one started, more requests in the meantime share it
+    """
+
+    library_id = "{}".format(library_id or settings.Z_ID)
+    library_type = library_type or settings.Z_LIBRARY_TYPE
+    queued = SyncJob.objects.filter(
+        library_id=library_id, library_type=library_type, status=SyncJob.QUEUED
+    )
+    job = queued.first()
+    if job is None:
+        try:
+            with transaction.atomic():
+                job = SyncJob.objects.create(
+                    library_id=library_id, library_type=library_type, full=full
+                )
+        except IntegrityError:
+            # queued by a concurrent request
+            job = queued.get()
+    if full and not job.full:
+        queued.filter(pk=job.pk).update(full=True)
+        job.full = True
+    return job
+
+
+def fail_stale_jobs():
+
+    """
+    marks running jobs as failed whose worker did not report progress for
+    settings.Z_SYNC_JOB_TIMEOUT seconds, e.g. because it was killed;
+    returns the number of such jobs
+    """
+
+    limit = timezone.now() - datetime.timedelta(seconds=SYNC_JOB_TIMEOUT)
+    return SyncJob.objects.filter(status=SyncJob.RUNNING, heartbeat__lt=limit).update(
+        status=SyncJob.FAILED, ended=timezone.now(), error="worker lost"
+    )
+
+
+def claim_job(worker=None):
+
+    """
+    marks the oldest queued job as running and returns it, None if there is none; jobs of
+    libraries with a running job are left in the queue, the database allows only one
+    running job per library, so concurrent workers never crawl a library twice at once
+    """
+
+    worker = worker or worker_name()
+    for pk in SyncJob.objects.filter(status=SyncJob.QUEUED).order_by('created', 'pk').values_list(
+        'pk', flat=True
+    ):
+        now = timezone.now()
+        try:
+            with transaction.atomic():
+                claimed = SyncJob.objects.filter(pk=pk, status=SyncJob.QUEUED).update(
+                    status=SyncJob.RUNNING, started=now, heartbeat=now, worker=worker
+                )
+        except IntegrityError:
+            continue
+        if claimed:
+            return SyncJob.objects.get(pk=pk)
+    return None
+
+
+def run_job(job, api_key=None):
+
+    """
+    runs the sync of a claimed job, storing its progress on the job while it runs; the
+    heartbeat is refreshed as well while the sync waits for zotero (backoff, rate limits),
+    so the job is not failed as stale. Progress and result are only stored while the job
+    is still running and owned by the job's worker, see 'fail_stale_jobs';
+    returns the finished job
+    """
+
+    jobs = SyncJob.objects.filter(pk=job.pk, status=SyncJob.RUNNING, worker=job.worker)
+    last_beat = timezone.now()
+
+    def progress(counts):
+        nonlocal last_beat
+        last_beat = timezone.now()
+        jobs.update(
+            pages=counts['pages'], items=counts['items'], items_skipped=counts['skipped'],
+            items_total=counts['total'], heartbeat=last_beat
+        )
+
+    def heartbeat():
+        nonlocal last_beat
+        now = timezone.now()
+        if (now - last_beat).total_seconds() >= HEARTBEAT_INTERVAL:
+            last_beat = now
+            jobs.update(heartbeat=now)
+
+    try:
+        with metrics.collect('sync_job'), zot_client.keepalive(heartbeat):
+            result = sync_library(
+                job.library_id, job.library_type, api_key or settings.Z_API_KEY,
+                full=job.full, progress=progress
+            )
+    except Exception as e:
+        result = {
+            'error': "{}".format(e), 'pages': 0, 'items': 0, 'skipped': 0, 'deleted': 0,
+            'not_modified': False
+        }
+    jobs.update(
+        status=SyncJob.FAILED if result['error'] else SyncJob.DONE, ended=timezone.now(),
+        pages=result['pages'], items=result['items'], items_skipped=result['skipped'],
+        items_deleted=result['deleted'], not_modified=result['not_modified'],
+        error=result['error'] or ""
+    )
+    job.refresh_from_db()
+    return job
+
+
+def run_next_job(worker=None, api_key=None):
+    """ fails stale jobs, then claims and runs the next queued job; returns it or None """
+    fail_stale_jobs()
+    job = claim_job(worker)
+    if job is not None:
+        job = run_job(job, api_key)
+    return job
@@ -0,0 +1,56 @@
+import datetime
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from bib import metrics
+from bib.zot_utils import backfill_bibtex
+
+library_id = settings.Z_ID
+library_type = settings.Z_LIBRARY_TYPE
+api_key = settings.Z_API_KEY
+
+
+class Command(BaseCommand):
+
+    """ Fetches the bibtex of all stored items without one """
+
+    help = "Fetches the bibtex of all stored items without one, 50 items per request"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            dest='batch_size',
+            type=int,
+            help="Number of items written to the database per transaction"
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            self.style.SUCCESS("started: {}".format(datetime.datetime.now()))
+        )
+        with metrics.collect('bib_backfill_bibtex') as run:
+            result = backfill_bibtex(
+                library_id, library_type, api_key, batch_size=options['batch_size'],
+                callback=self.items_saved
+            )
+        if result['error']:
+            self.stdout.write(
+                self.style.ERROR("error: {}".format(result['error']))
+            )
+        if result['missing']:
+            self.stdout.write(
+                self.style.WARNING(
+                    "no bibtex returned for: {}".format(", ".join(result['missing']))
+                )
+            )
+        self.stdout.write(
+            self.style.SUCCESS("updated {} items".format(result['items']))
+        )
+        self.stdout.write(self.style.SUCCESS(metrics.format_summary(run.summary())))
+        self.stdout.write(
+            self.style.SUCCESS("ended: {}".format(datetime.datetime.now()))
+        )
+
+    def items_saved(self, count):
+        self.stdout.write(
+            self.style.SUCCESS('updated: {} items'.format(count))
+        )
@@ -0,0 +1,44 @@
+import datetime
+from django.core.management.base import BaseCommand
+from bib import metrics
+from bib.zot_utils import backfill_dates
+
+
+class Command(BaseCommand):
+
+    """ Parses the dates of all stored items again """
+
+    help = "Parses the dates of all stored items again and stores their year and date sort key"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            dest='batch_size',
+            type=int,
+            help="Number of items written to the database per transaction"
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            self.style.SUCCESS("started: {}".format(datetime.datetime.now()))
+        )
+        with metrics.collect('bib_backfill_dates') as run:
+            result = backfill_dates(batch_size=options['batch_size'], callback=self.items_saved)
+        if result['error']:
+            self.stdout.write(
+                self.style.ERROR("error: {}".format(result['error']))
+            )
+        self.stdout.write(
+            self.style.SUCCESS(
+                "checked {} items, updated {} items".format(result['items'], result['updated'])
+            )
+        )
+        self.stdout.write(self.style.SUCCESS(metrics.format_summary(run.summary())))
+        self.stdout.write(
+            self.style.SUCCESS("ended: {}".format(datetime.datetime.now()))
+        )
+
+    def items_saved(self, count):
+        self.stdout.write(
+            self.style.SUCCESS('updated: {} items'.format(count))
+        )
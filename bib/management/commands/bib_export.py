@@ -0,0 +1,63 @@
+import gzip
+from django.core.management.base import BaseCommand, CommandError
+from bib.export import FORMATS, export_items
+from bib.models import ZotItem
+
+
+class Command(BaseCommand):
+
+    """ Exports the stored items as bibtex, CSL-JSON or RIS """
+
+    help = "Exports the stored items as bibtex, CSL-JSON or RIS, written in chunks"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--format',
+            dest='export_format',
+            choices=sorted(FORMATS),
+            default='bibtex',
+            help="Export format, defaults to bibtex"
+        )
+        parser.add_argument(
+            '--output',
+            dest='output',
+            help="File to write to, defaults to stdout; compressed if it ends with '.gz'"
+        )
+        parser.add_argument(
+            '--item-type',
+            dest='item_types',
+            action='append',
+            help="Only export items of this type, can be repeated"
+        )
+        parser.add_argument(
+            '--key',
+            dest='keys',
+            action='append',
+            help="Only export the item with this zotero key, can be repeated"
+        )
+        parser.add_argument('--year-from', dest='year_from', type=int)
+        parser.add_argument('--year-to', dest='year_to', type=int)
+
+    def handle(self, *args, **options):
+        queryset = ZotItem.objects.all()
+        if options['item_types']:
+            queryset = queryset.filter(zot_item_type__in=options['item_types'])
+        if options['keys']:
+            queryset = queryset.filter(zot_key__in=options['keys'])
+        if options['year_from'] is not None:
+            queryset = queryset.filter(year__gte=options['year_from'])
+        if options['year_to'] is not None:
+            queryset = queryset.filter(year__lte=options['year_to'])
+        chunks = export_items(queryset, options['export_format'])
+        output = options['output']
+        if not output:
+            for chunk in chunks:
+                self.stdout.write(chunk.decode('utf-8'), ending='')
+            return
+        try:
+            stream = gzip.open(output, 'wb') if output.endswith('.gz') else open(output, 'wb')
+        except OSError as e:
+            raise CommandError("can't write to {}: {}".format(output, e))
+        with stream:
+            for chunk in chunks:
+                stream.write(chunk)
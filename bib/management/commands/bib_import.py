@@ -1,8 +1,10 @@
 import os
 import datetime
+import json
 from django.conf import settings
 from django.core.management.base import BaseCommand, CommandError
-from bib.zot_utils import items_to_dict, create_zotitem
+from bib import metrics
+from bib.zot_utils import sync_items, sync_library
 
 library_id = settings.Z_ID
 library_type = settings.Z_LIBRARY_TYPE
@@ -26,8 +28,36 @@ class Command(BaseCommand):
             dest='since',
             help="The version (string) from which on items should be imported"
         )
+        parser.add_argument(
+            '--batch-size',
+            dest='batch_size',
+            type=int,
+            help="Number of items written to the database per transaction"
+        )
+        parser.add_argument(
+            '--workers',
+            dest='workers',
+            type=int,
+            default=1,
+            help="Number of pages fetched concurrently from zotero"
+        )
+        parser.add_argument(
+            '--resume',
+            dest='resume',
+            action='store_true',
+            help="Continue an interrupted complete import from its last checkpoint"
+        )
+        parser.add_argument(
+            '--json',
+            dest='json',
+            action='store_true',
+            help="Print the metrics of the run as JSON"
+        )
 
     def handle(self, *args, **options):
+        self.verbosity = options['verbosity']
+        if options['resume'] and (options['limit'] or options['since']):
+            raise CommandError("--resume continues a complete import, it takes no --limit or --since")
         if options['limit']:
             limit = int(options['limit'])
         else:
@@ -43,21 +73,47 @@ class Command(BaseCommand):
         self.stdout.write(
             self.style.SUCCESS("started: {}".format(datetime.datetime.now()))
         )
-        items = items_to_dict(library_id, library_type, api_key, limit=limit, since_version=since)
-        self.stdout.write(
-            self.style.SUCCESS("fetched {} items".format(len(items['items'])))
-        )
-        self.stdout.write(
-            self.style.SUCCESS("{}".format(datetime.datetime.now()))
-        )
-        self.stdout.write(
-            self.style.SUCCESS('starting creating/updating models now')
-        )
-        for x in items['bibs']:
-            temp_item = create_zotitem(x)
+        display = metrics.ProgressDisplay(self.stdout)
+        with metrics.collect('bib_import') as run:
+            if limit or since:
+                result = sync_items(
+                    library_id, library_type, api_key, limit=limit, since_version=since,
+                    callback=self.items_saved, batch_size=options['batch_size'],
+                    workers=options['workers'], progress=display.update
+                )
+            else:
+                # a complete import also stores the library version bib_update continues from
+                result = sync_library(
+                    library_id, library_type, api_key, full=True,
+                    callback=self.items_saved, batch_size=options['batch_size'],
+                    workers=options['workers'], progress=display.update,
+                    resume=options['resume']
+                )
+        display.finish()
+        if result.get('resumed') is not None:
+            self.stdout.write(
+                self.style.SUCCESS("resumed the import at item {}".format(result['resumed']))
+            )
+        if result['error']:
             self.stdout.write(
-                self.style.SUCCESS('created: {}'.format(temp_item))
+                self.style.ERROR("error: {}".format(result['error']))
             )
+        self.stdout.write(
+            self.style.SUCCESS(
+                "fetched {} pages, saved {} items, skipped {} unchanged items".format(
+                    result['pages'], result['items'], result['skipped']
+                )
+            )
+        )
+        if options['json']:
+            self.stdout.write(json.dumps(run.summary()))
+        else:
+            self.stdout.write(self.style.SUCCESS(metrics.format_summary(run.summary())))
         self.stdout.write(
             self.style.SUCCESS("ended: {}".format(datetime.datetime.now()))
         )
+
+    def items_saved(self, saved):
+        if self.verbosity > 1:
+            for temp_item in saved:
+                self.stdout.write('saved: {}'.format(temp_item.zot_key))
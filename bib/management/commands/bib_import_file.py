@@ -0,0 +1,97 @@
+import datetime
+import json
+from django.core.management.base import BaseCommand, CommandError
+from bib import metrics
+from bib.file_import import READERS, import_file
+
+
+class Command(BaseCommand):
+
+    """ Imports items from a zotero export file """
+
+    help = "Imports the items of a zotero CSL-JSON, bibtex or rdf export file"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path',
+            help="The export file, gzip compressed if its name ends with .gz"
+        )
+        parser.add_argument(
+            '--format',
+            dest='format',
+            choices=sorted(READERS),
+            help="The format of the file, by default guessed from its extension (.json, .bib, .rdf)"
+        )
+        parser.add_argument(
+            '--library-version',
+            dest='library_version',
+            type=int,
+            required=True,
+            help=(
+                "The library version the file was exported at, bib_update continues from it; "
+                "the imported items get no item version, so bib_update --diff fetches them again"
+            )
+        )
+        parser.add_argument(
+            '--overwrite',
+            dest='overwrite',
+            action='store_true',
+            help="Replace items already stored, by default they are left alone"
+        )
+        parser.add_argument(
+            '--batch-size',
+            dest='batch_size',
+            type=int,
+            help="Number of items written to the database per transaction"
+        )
+        parser.add_argument(
+            '--json',
+            dest='json',
+            action='store_true',
+            help="Print the metrics of the run as JSON"
+        )
+
+    def handle(self, *args, **options):
+        self.verbosity = options['verbosity']
+        self.stdout.write(
+            self.style.SUCCESS("started: {}".format(datetime.datetime.now()))
+        )
+        display = metrics.ProgressDisplay(self.stdout)
+        try:
+            with metrics.collect('bib_import_file') as run:
+                result = import_file(
+                    options['path'], file_format=options['format'],
+                    library_version=options['library_version'], callback=self.items_saved,
+                    batch_size=options['batch_size'], progress=display.update,
+                    overwrite=options['overwrite']
+                )
+        except (OSError, ValueError) as e:
+            raise CommandError(e)
+        display.finish()
+        if result['error']:
+            self.stdout.write(
+                self.style.ERROR("error: {}".format(result['error']))
+            )
+        self.stdout.write(
+            self.style.SUCCESS(
+                "saved {} items, skipped {} unchanged items, {} items already stored and {} items "
+                "without zotero key".format(
+                    result['items'], result['skipped'], result['existing'], len(result['unkeyed'])
+                )
+            )
+        )
+        if self.verbosity > 1:
+            for key in result['unkeyed']:
+                self.stdout.write('without zotero key: {}'.format(key))
+        if options['json']:
+            self.stdout.write(json.dumps(run.summary()))
+        else:
+            self.stdout.write(self.style.SUCCESS(metrics.format_summary(run.summary())))
+        self.stdout.write(
+            self.style.SUCCESS("ended: {}".format(datetime.datetime.now()))
+        )
+
+    def items_saved(self, saved):
+        if self.verbosity > 1:
+            for temp_item in saved:
+                self.stdout.write('saved: {}'.format(temp_item.zot_key))
@@ -0,0 +1,22 @@
+import datetime
+from django.core.management.base import BaseCommand
+from bib.facets import rebuild_facets
+
+
+class Command(BaseCommand):
+
+    """ Recomputes the facet counts from the stored items """
+
+    help = "Recomputes the facet counts from the stored items, e.g. after editing items by hand"
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            self.style.SUCCESS("started: {}".format(datetime.datetime.now()))
+        )
+        count = rebuild_facets()
+        self.stdout.write(
+            self.style.SUCCESS("stored {} facet counts".format(count))
+        )
+        self.stdout.write(
+            self.style.SUCCESS("ended: {}".format(datetime.datetime.now()))
+        )
@@ -0,0 +1,43 @@
+import time
+from django.core.management.base import BaseCommand
+from bib.jobs import run_next_job, worker_name
+
+
+class Command(BaseCommand):
+
+    """ Runs the queued SyncJobs, e.g. the ones queued by the synczotero view """
+
+    help = "Processes queued sync jobs; runs until interrupted unless --once is passed"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            dest='once',
+            action='store_true',
+            help="Exit as soon as the queue is empty"
+        )
+        parser.add_argument(
+            '--interval',
+            dest='interval',
+            type=float,
+            default=5,
+            help="Seconds to wait before looking for new jobs if the queue is empty"
+        )
+
+    def handle(self, *args, **options):
+        worker = worker_name()
+        self.stdout.write(self.style.SUCCESS("worker {} started".format(worker)))
+        while True:
+            job = run_next_job(worker)
+            if job is not None:
+                style = self.style.ERROR if job.error else self.style.SUCCESS
+                self.stdout.write(style(
+                    "job {}: {}, fetched {} pages, saved {} items, deleted {} items{}".format(
+                        job.pk, job.status, job.pages, job.items, job.items_deleted,
+                        ", error: {}".format(job.error) if job.error else ""
+                    )
+                ))
+                continue
+            if options['once']:
+                break
+            time.sleep(options['interval'])
@@ -1,10 +1,12 @@
 import os
 import datetime
+import json
 from django.conf import settings
 from django.core.exceptions import ObjectDoesNotExist, FieldError
 from django.core.management.base import BaseCommand, CommandError
-from bib.zot_utils import items_to_dict, create_zotitem
-from bib.models import ZotItem
+from bib import metrics
+from bib.zot_utils import sync_library
+from bib.models import SyncState
 
 library_id = settings.Z_ID
 library_type = settings.Z_LIBRARY_TYPE
@@ -13,41 +15,97 @@ api_key = settings.Z_API_KEY
 
 class Command(BaseCommand):
 
-    """ Imports items from zotero-bib """
+    """ Updates the stored items with the changes made in zotero-bib since the last sync """
 
-    help = "Imports all items from zotero-bib"
+    help = "Imports all items changed in zotero-bib since the last sync and removes deleted ones"
 
-    def handle(self, *args, **options):
-        limit = None
-        since = None
-        first_object = ZotItem.objects.all()[:1].get()
-        since = first_object.zot_version
-
-        self.stdout.write(
-            self.style.SUCCESS("{}, {}".format(first_object, since))
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            dest='batch_size',
+            type=int,
+            help="Number of items written to the database per transaction"
+        )
+        parser.add_argument(
+            '--diff',
+            dest='diff',
+            action='store_true',
+            help="Diff the key/version map of the library against the stored items "
+                 "and only fetch new or changed items"
+        )
+        parser.add_argument(
+            '--dry-run',
+            dest='dry_run',
+            action='store_true',
+            help="Only print the planned inserts, updates and deletes of --diff, write nothing"
         )
+        parser.add_argument(
+            '--json',
+            dest='json',
+            action='store_true',
+            help="Print the metrics of the run as JSON"
+        )
+
+    def handle(self, *args, **options):
+        state = SyncState.objects.filter(
+            library_id=library_id, library_type=library_type
+        ).first()
+        since = state.library_version if state else None
 
         self.stdout.write(
-            self.style.SUCCESS("{}, {}".format(limit, since))
+            self.style.SUCCESS("library version: {}".format(since))
         )
         self.stdout.write(
             self.style.SUCCESS("started: {}".format(datetime.datetime.now()))
         )
-        items = items_to_dict(library_id, library_type, api_key, limit=limit, since_version=since)
-        self.stdout.write(
-            self.style.SUCCESS("fetched {} items".format(len(items['items'])))
-        )
+        self.verbosity = options['verbosity']
+        display = metrics.ProgressDisplay(self.stdout)
+        with metrics.collect('bib_update') as run:
+            result = sync_library(
+                library_id, library_type, api_key,
+                callback=self.items_saved, batch_size=options['batch_size'],
+                diff=options['diff'], dry_run=options['dry_run'], progress=display.update
+            )
+        display.finish()
+        if result['not_modified']:
+            self.stdout.write(
+                self.style.SUCCESS("library not modified since version {}".format(since))
+            )
+            return
+        if result['error']:
+            self.stdout.write(
+                self.style.ERROR("error: {}".format(result['error']))
+            )
+        if 'plan' in result:
+            for action in ['insert', 'update', 'delete']:
+                self.stdout.write(
+                    self.style.SUCCESS("{}: {} items".format(action, len(result['plan'][action])))
+                )
+                if options['dry_run']:
+                    for key in result['plan'][action]:
+                        self.stdout.write("    {}".format(key))
+        if options['dry_run']:
+            return
         self.stdout.write(
-            self.style.SUCCESS("{}".format(datetime.datetime.now()))
+            self.style.SUCCESS(
+                "fetched {} pages, saved {} items, skipped {} unchanged items, "
+                "deleted {} items".format(
+                    result['pages'], result['items'], result['skipped'], result['deleted']
+                )
+            )
         )
+        if options['json']:
+            self.stdout.write(json.dumps(run.summary()))
+        else:
+            self.stdout.write(self.style.SUCCESS(metrics.format_summary(run.summary())))
         self.stdout.write(
-            self.style.SUCCESS('starting creating/updating models now')
+            self.style.SUCCESS("library version: {}".format(result['version']))
         )
-        for x in items['bibs']:
-            temp_item = create_zotitem(x)
-            self.stdout.write(
-                self.style.SUCCESS('created: {}'.format(temp_item))
-            )
         self.stdout.write(
             self.style.SUCCESS("ended: {}".format(datetime.datetime.now()))
         )
+
+    def items_saved(self, saved):
+        if self.verbosity > 1:
+            for temp_item in saved:
+                self.stdout.write('saved: {}'.format(temp_item.zot_key))
@@ -0,0 +1,222 @@
+import json
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+try:
+    METRICS_HOOKS = settings.Z_METRICS_HOOKS
+except AttributeError:
+    METRICS_HOOKS = ['bib.metrics.update_registry']
+try:
+    METRICS_LOG_JSON = settings.Z_METRICS_LOG_JSON
+except AttributeError:
+    METRICS_LOG_JSON = False
+
+logger = logging.getLogger(__name__)
+
+# time spent in zotero API requests (summed over concurrent requests), in joining the bibtex
+# to the items, in converting items to ZotItem fields and in database writes
+PHASES = ['http', 'bibtex', 'convert', 'db']
+COUNTERS = [
+    'requests', 'bytes', 'retries', 'pages', 'items',
+    'rows_inserted', 'rows_updated', 'rows_unchanged', 'rows_deleted',
+]
+
+_lock = threading.Lock()
+_collectors = []
+
+
+class SyncMetrics(object):
+
+    """ phase timers and counters of one sync run, filled by all threads taking part in it """
+
+    def __init__(self, name):
+        self.name = name
+        self.lock = threading.Lock()
+        self.phases = {x: 0.0 for x in PHASES}
+        self.counters = {x: 0 for x in COUNTERS}
+        self.started = time.time()
+        self.ended = None
+
+    def add_time(self, phase, seconds):
+        with self.lock:
+            self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+
+    def count(self, name, value=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def summary(self):
+        """ returns a dict of the run's name, duration, items per second, phases and counters """
+        duration = (self.ended or time.time()) - self.started
+        with self.lock:
+            return {
+                'name': self.name,
+                'duration': round(duration, 3),
+                'items_per_second': round(self.counters['items'] / duration, 1) if duration else 0,
+                'phases': {k: round(v, 3) for k, v in self.phases.items()},
+                'counters': dict(self.counters),
+            }
+
+
+@contextmanager
+def collect(name, emit=True):
+
+    """
+    records the metrics of everything run inside the block in a SyncMetrics object, which
+    is yielded; with 'emit' set, its summary is passed to the settings.Z_METRICS_HOOKS
+    and logged at the end of the block. Collectors are process wide, so concurrent fetches
+    are recorded as well; runs overlapping in one process record each other's work.
+    """
+
+    metrics = SyncMetrics(name)
+    with _lock:
+        _collectors.append(metrics)
+    try:
+        yield metrics
+    finally:
+        with _lock:
+            _collectors.remove(metrics)
+        metrics.ended = time.time()
+        if emit:
+            emit_summary(metrics.summary())
+
+
+def count(name, value=1):
+    """ adds 'value' to the counter 'name' of all active collectors """
+    for metrics in _collectors:
+        metrics.count(name, value)
+
+
+@contextmanager
+def timer(phase):
+    """ adds the time spent inside the block to 'phase' of all active collectors """
+    if not _collectors:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - started
+        for metrics in list(_collectors):
+            metrics.add_time(phase, seconds)
+
+
+def emit_summary(summary):
+    """ passes 'summary' to the configured hooks and logs it, as JSON if Z_METRICS_LOG_JSON is set """
+    if METRICS_LOG_JSON:
+        logger.info(json.dumps(summary, sort_keys=True))
+    else:
+        logger.info(format_summary(summary))
+    for path in METRICS_HOOKS:
+        try:
+            import_string(path)(summary)
+        except Exception:
+            logger.exception("metrics hook %s failed", path)
+
+
+def format_summary(summary):
+    """ returns a human readable multi-line version of 'summary' """
+    lines = ["{name}: {duration}s, {items_per_second} items/s".format(**summary)]
+    lines.append("  time: " + ", ".join(
+        "{} {}s".format(k, v) for k, v in summary['phases'].items()
+    ))
+    lines.append("  counts: " + ", ".join(
+        "{} {}".format(k, v) for k, v in summary['counters'].items()
+    ))
+    return "\n".join(lines)
+
+
+class CounterRegistry(object):
+
+    """
+    Process wide, Prometheus style counters summed up over all sync runs,
+    see 'render' for the text exposition format
+    """
+
+    def __init__(self, prefix='bib_sync'):
+        self.prefix = prefix
+        self.lock = threading.Lock()
+        self.values = {}
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + value
+
+    def get(self, name, **labels):
+        return self.values.get((name, tuple(sorted(labels.items()))), 0)
+
+    def render(self):
+        lines = []
+        with self.lock:
+            items = sorted(self.values.items())
+        for (name, labels), value in items:
+            label = ",".join('{}="{}"'.format(k, v) for k, v in labels)
+            lines.append("{}_{}{{{}}} {}".format(self.prefix, name, label, value))
+        return "\n".join(lines) + "\n"
+
+
+registry = CounterRegistry()
+
+
+def update_registry(summary):
+    """ metrics hook adding a summary to the counters of 'registry' """
+    run = summary['name']
+    registry.inc('runs_total', run=run)
+    registry.inc('duration_seconds_total', summary['duration'], run=run)
+    for phase, seconds in summary['phases'].items():
+        registry.inc('phase_seconds_total', seconds, run=run, phase=phase)
+    for counter, value in summary['counters'].items():
+        registry.inc('{}_total'.format(counter), value, run=run)
+
+
+class ProgressDisplay(object):
+
+    """
+    Quiet progress output for management commands: a single line with pages, items, rate and
+    ETA, rewritten in place on terminals and printed at most every 'interval' seconds otherwise;
+    pass 'update' as 'progress' callback of 'sync_library'
+    """
+
+    def __init__(self, stream, interval=5.0):
+        self.stream = stream
+        self.interval = interval
+        self.started = time.time()
+        self.shown = 0.0
+        self.tty = hasattr(stream, 'isatty') and stream.isatty()
+        self.line = ""
+
+    def update(self, progress):
+        now = time.time()
+        if not self.tty and now - self.shown < self.interval:
+            return
+        self.shown = now
+        elapsed = now - self.started
+        done = progress['items'] + progress.get('skipped', 0)
+        rate = done / elapsed if elapsed else 0
+        line = "pages {}, items {}".format(progress['pages'], done)
+        if progress.get('total'):
+            line += "/{}".format(progress['total'])
+            if rate:
+                line += ", eta {:.0f}s".format(max(progress['total'] - done, 0) / rate)
+        if progress.get('skipped'):
+            line += " ({} unchanged)".format(progress['skipped'])
+        line += ", {:.0f} items/s".format(rate)
+        self.line = line
+        if self.tty:
+            # management commands' OutputWrapper appends a line ending by default
+            kwargs = {'ending': ""} if hasattr(self.stream, 'ending') else {}
+            self.stream.write("\r" + line, **kwargs)
+            self.stream.flush()
+        else:
+            self.stream.write(line)
+
+    def finish(self):
+        if self.tty and self.line:
+            self.stream.write("")
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bib', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SyncState',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('library_id', models.CharField(help_text='The Zotero user or group ID', max_length=50, verbose_name='library id')),
+                ('library_type', models.CharField(help_text="'user' or 'group'", max_length=10, verbose_name='library type')),
+                ('library_version', models.IntegerField(blank=True, help_text="The 'Last-Modified-Version' of the library at the last successful sync.", null=True, verbose_name='library version')),
+                ('started', models.DateTimeField(blank=True, help_text='Start of the last sync run.', null=True, verbose_name='started')),
+                ('ended', models.DateTimeField(blank=True, help_text='End of the last sync run.', null=True, verbose_name='ended')),
+                ('duration', models.FloatField(blank=True, help_text='Duration of the last sync run in seconds.', null=True, verbose_name='duration')),
+                ('pages', models.IntegerField(default=0, help_text='Number of pages fetched by the last sync run.', verbose_name='pages')),
+                ('items_saved', models.IntegerField(default=0, help_text='Number of items created/updated by the last sync run.', verbose_name='items saved')),
+                ('items_deleted', models.IntegerField(default=0, help_text='Number of items deleted by the last sync run.', verbose_name='items deleted')),
+                ('error', models.TextField(blank=True, help_text='Error message of the last sync run, if it failed.', verbose_name='error')),
+            ],
+            options={
+                'unique_together': {('library_id', 'library_type')},
+            },
+        ),
+    ]
@@ -0,0 +1,68 @@
+import ast
+import json
+
+from django.db import migrations, models
+
+
+# a frozen copy of bib.models.format_creators, so later changes don't alter this migration
+def format_creators(creators):
+    """ returns the names of the passed in list of zotero creators, joined by ' / ' """
+    authors = []
+    for x in creators or []:
+        try:
+            author = f"{x['firstName']} {x['lastName']}"
+        except KeyError:
+            author = f"{x.get('name', '')}"
+        authors.append(author.strip())
+    return " / ".join(authors)
+
+
+def creators_to_json(apps, schema_editor):
+    """ converts the python repr stored in 'zot_creator' to json and fills 'author_display' """
+    ZotItem = apps.get_model('bib', 'ZotItem')
+    batch = []
+    for item in ZotItem.objects.only('zot_key', 'zot_creator').iterator(chunk_size=1000):
+        try:
+            creators = ast.literal_eval(item.zot_creator or "[]") or []
+        except (ValueError, SyntaxError):
+            creators = []
+        item.zot_creator = json.dumps(creators)
+        item.author_display = format_creators(creators)[:500]
+        batch.append(item)
+        if len(batch) >= 1000:
+            ZotItem.objects.bulk_update(batch, ['zot_creator', 'author_display'])
+            batch = []
+    ZotItem.objects.bulk_update(batch, ['zot_creator', 'author_display'])
+
+
+def creators_to_repr(apps, schema_editor):
+    ZotItem = apps.get_model('bib', 'ZotItem')
+    batch = []
+    for item in ZotItem.objects.only('zot_key', 'zot_creator').iterator(chunk_size=1000):
+        item.zot_creator = "{}".format(json.loads(item.zot_creator or "[]"))
+        batch.append(item)
+        if len(batch) >= 1000:
+            ZotItem.objects.bulk_update(batch, ['zot_creator'])
+            batch = []
+    ZotItem.objects.bulk_update(batch, ['zot_creator'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bib', '0002_syncstate'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='zotitem',
+            name='author_display',
+            field=models.CharField(blank=True, db_index=True, help_text="The names of all creators, computed from 'creators' at sync time.", max_length=500, verbose_name='authors'),
+        ),
+        migrations.RunPython(creators_to_json, creators_to_repr),
+        migrations.AlterField(
+            model_name='zotitem',
+            name='zot_creator',
+            field=models.JSONField(blank=True, default=list, help_text="Stores all information from zoteros 'creators' field.", verbose_name='creators'),
+        ),
+    ]
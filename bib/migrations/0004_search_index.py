@@ -0,0 +1,14 @@
+from django.db import migrations
+
+from bib.migrations._fts import create_search_index, drop_search_index
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bib', '0003_structured_creators'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
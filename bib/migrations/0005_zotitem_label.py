@@ -0,0 +1,51 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:11
+
+from django.conf import settings
+from django.db import migrations, models
+
+from bib.migrations._fts import create_fts, drop_fts
+
+try:
+    NN = settings.Z_NN
+except AttributeError:
+    NN = 'N.N.'
+
+
+# a frozen copy of bib.models.format_label, so later changes don't alter this migration
+def format_label(author, title, pub_title):
+    """ returns the short label of an item, e.g. used by autocompletes """
+    label = "{}: {}".format(author or NN, title)
+    if pub_title:
+        label = "{}; {}".format(label, pub_title)
+    return label[:500]
+
+
+def fill_labels(apps, schema_editor):
+    ZotItem = apps.get_model('bib', 'ZotItem')
+    batch = []
+    fields = ['zot_key', 'author_display', 'zot_title', 'zot_pub_title']
+    for item in ZotItem.objects.only(*fields).iterator(chunk_size=1000):
+        item.zot_label = format_label(item.author_display, item.zot_title, item.zot_pub_title)
+        batch.append(item)
+        if len(batch) >= 1000:
+            ZotItem.objects.bulk_update(batch, ['zot_label'])
+            batch = []
+    ZotItem.objects.bulk_update(batch, ['zot_label'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bib', '0004_search_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_fts, create_fts),
+        migrations.AddField(
+            model_name='zotitem',
+            name='zot_label',
+            field=models.CharField(blank=True, help_text='Short label of the item, computed from authors, title and publicationTitle.', max_length=500, verbose_name='label'),
+        ),
+        migrations.RunPython(create_fts, drop_fts),
+        migrations.RunPython(fill_labels, migrations.RunPython.noop),
+    ]
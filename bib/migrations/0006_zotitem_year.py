@@ -0,0 +1,55 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:14
+
+import re
+
+from django.db import migrations, models
+
+from bib.migrations._fts import create_fts, drop_fts
+
+
+# a frozen copy of bib.models.parse_year, so later changes don't alter this migration
+def parse_year(date):
+    """ returns the first four digit year of a zotero 'date' string or None """
+    match = re.search(r'(?<!\d)(\d{4})(?!\d)', date or "")
+    if match:
+        return int(match.group(1))
+    return None
+
+
+def fill_years(apps, schema_editor):
+    ZotItem = apps.get_model('bib', 'ZotItem')
+    batch = []
+    for item in ZotItem.objects.only('zot_key', 'zot_date').iterator(chunk_size=1000):
+        item.year = parse_year(item.zot_date)
+        batch.append(item)
+        if len(batch) >= 1000:
+            ZotItem.objects.bulk_update(batch, ['year'])
+            batch = []
+    ZotItem.objects.bulk_update(batch, ['year'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bib', '0005_zotitem_label'),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_fts, create_fts),
+        migrations.AddField(
+            model_name='zotitem',
+            name='year',
+            field=models.IntegerField(blank=True, db_index=True, help_text="The year of the item, computed from 'date' at sync time.", null=True, verbose_name='year'),
+        ),
+        migrations.AlterField(
+            model_name='zotitem',
+            name='zot_item_type',
+            field=models.TextField(blank=True, db_index=True, help_text="Stores all information from zoteros 'itemType' field.", verbose_name='itemType'),
+        ),
+        migrations.AddIndex(
+            model_name='zotitem',
+            index=models.Index(fields=['zot_version', 'zot_key'], name='bib_zotitem_version_key'),
+        ),
+        migrations.RunPython(create_fts, drop_fts),
+        migrations.RunPython(fill_years, migrations.RunPython.noop),
+    ]
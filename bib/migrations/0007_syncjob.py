@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bib', '0006_zotitem_year'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SyncJob',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('library_id', models.CharField(help_text='The Zotero user or group ID', max_length=50, verbose_name='library id')),
+                ('library_type', models.CharField(help_text="'user' or 'group'", max_length=10, verbose_name='library type')),
+                ('full', models.BooleanField(default=False, help_text='Fetch the whole library instead of the changes since the last sync.', verbose_name='full')),
+                ('status', models.CharField(choices=[('queued', 'queued'), ('running', 'running'), ('done', 'done'), ('failed', 'failed')], db_index=True, default='queued', max_length=10, verbose_name='status')),
+                ('created', models.DateTimeField(auto_now_add=True, help_text='When the job was queued.', verbose_name='created')),
+                ('started', models.DateTimeField(blank=True, help_text='When a worker picked the job up.', null=True, verbose_name='started')),
+                ('heartbeat', models.DateTimeField(blank=True, help_text='Last progress report of the worker running the job.', null=True, verbose_name='heartbeat')),
+                ('ended', models.DateTimeField(blank=True, help_text='When the job was done or failed.', null=True, verbose_name='ended')),
+                ('worker', models.CharField(blank=True, help_text='Host and process id of the worker running the job.', max_length=255, verbose_name='worker')),
+                ('pages', models.IntegerField(default=0, help_text='Number of pages fetched so far.', verbose_name='pages')),
+                ('items', models.IntegerField(default=0, help_text='Number of items written so far.', verbose_name='items')),
+                ('items_total', models.IntegerField(blank=True, help_text='Number of items to fetch, if known.', null=True, verbose_name='items total')),
+                ('items_deleted', models.IntegerField(default=0, help_text='Number of items deleted.', verbose_name='items deleted')),
+                ('not_modified', models.BooleanField(default=False, help_text='The library was not modified since the last sync.', verbose_name='not modified')),
+                ('error', models.TextField(blank=True, help_text='Error message, if the job failed.', verbose_name='error')),
+            ],
+            options={
+                'ordering': ['-created'],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('status', 'queued')), fields=('library_id', 'library_type'), name='bib_syncjob_one_queued'), models.UniqueConstraint(condition=models.Q(('status', 'running')), fields=('library_id', 'library_type'), name='bib_syncjob_one_running')],
+            },
+        ),
+    ]
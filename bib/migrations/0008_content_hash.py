@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:24
+
+from django.db import migrations, models
+
+from bib.migrations._fts import create_fts, drop_fts
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bib', '0007_syncjob'),
+    ]
+
+    # content hashes are left empty, the next sync writes every item once and fills them in
+    operations = [
+        migrations.AddField(
+            model_name='syncjob',
+            name='items_skipped',
+            field=models.IntegerField(default=0, help_text='Number of fetched items not written as they did not change.', verbose_name='items skipped'),
+        ),
+        migrations.AddField(
+            model_name='syncstate',
+            name='items_skipped',
+            field=models.IntegerField(default=0, help_text='Number of fetched items the last sync run did not write as they did not change.', verbose_name='items skipped'),
+        ),
+        migrations.RunPython(drop_fts, create_fts),
+        migrations.AddField(
+            model_name='zotitem',
+            name='content_hash',
+            field=models.CharField(blank=True, help_text='Hash of the fields filled from zotero, unchanged items are not written on sync.', max_length=40, verbose_name='content hash'),
+        ),
+        migrations.RunPython(create_fts, drop_fts),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:29
+
+import re
+
+from django.db import migrations, models
+
+from bib.migrations._fts import create_fts, drop_fts
+
+
+# a frozen copy of bib.models.parse_citation_key, so later changes don't alter this migration
+def parse_citation_key(bibtex):
+    """ returns the citation key of the first entry of a bibtex string or None """
+    match = re.search(r'@\w+\s*\{\s*([^,\s]+)\s*,', bibtex or "")
+    if match:
+        return match.group(1)
+    return None
+
+
+def fill_citation_keys(apps, schema_editor):
+    ZotItem = apps.get_model('bib', 'ZotItem')
+    batch = []
+    items = ZotItem.objects.exclude(zot_bibtex="").only('zot_key', 'zot_bibtex')
+    for item in items.iterator(chunk_size=1000):
+        item.citation_key = (parse_citation_key(item.zot_bibtex) or "")[:250]
+        batch.append(item)
+        if len(batch) >= 1000:
+            ZotItem.objects.bulk_update(batch, ['citation_key'])
+            batch = []
+    ZotItem.objects.bulk_update(batch, ['citation_key'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bib', '0008_content_hash'),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_fts, create_fts),
+        migrations.AddField(
+            model_name='zotitem',
+            name='citation_key',
+            field=models.CharField(blank=True, db_index=True, help_text="The bibtex citation key of the item, computed from 'bibtex' at sync time.", max_length=250, verbose_name='citation key'),
+        ),
+        migrations.RunPython(create_fts, drop_fts),
+        migrations.RunPython(fill_citation_keys, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,94 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:32
+
+import calendar
+import re
+
+from django.db import migrations, models
+
+from bib.migrations._fts import create_fts, drop_fts
+
+
+# frozen copies of the date parser of bib.models, so later changes don't alter this migration
+MONTHS = {
+    'january': 1, 'february': 2, 'march': 3, 'april': 4, 'may': 5, 'june': 6, 'july': 7,
+    'august': 8, 'september': 9, 'october': 10, 'november': 11, 'december': 12,
+    'januar': 1, 'jänner': 1, 'februar': 2, 'märz': 3, 'mai': 5, 'juni': 6, 'juli': 7,
+    'oktober': 10, 'dezember': 12,
+    'spring': 3, 'summer': 6, 'autumn': 9, 'fall': 9, 'winter': 12,
+    'frühling': 3, 'frühjahr': 3, 'sommer': 6, 'herbst': 9,
+}
+ISO_DATE_RE = re.compile(r'(?<!\d)(\d{4})[-/](\d{1,2})(?:[-/](\d{1,2}))?(?!\d)')
+DAY_FIRST_RE = re.compile(r'(?<!\d)(\d{1,2})\.\s?(\d{1,2})\.\s?(\d{4})(?!\d)')
+MONTH_FIRST_RE = re.compile(r'(?<!\d)(\d{1,2})/(\d{1,2})/(\d{4})(?!\d)')
+YEAR_RE = re.compile(r'(?<!\d)(\d{4})(?!\d)')
+WORD_RE = re.compile(r'[^\W\d_]{3,}')
+DAY_RE = r'(?<!\d)(\d{{1,2}})(?:st|nd|rd|th|\.)?\s+{0}|{0}\.?\s+(\d{{1,2}})(?!\d)'
+
+
+def format_date(year, month=None, day=None):
+    if not month or not 1 <= month <= 12:
+        return "{:04d}".format(year)
+    if not day or not 1 <= day <= calendar.monthrange(year, month)[1]:
+        return "{:04d}-{:02d}".format(year, month)
+    return "{:04d}-{:02d}-{:02d}".format(year, month, day)
+
+
+def parse_date(date):
+    date = date or ""
+    match = ISO_DATE_RE.search(date)
+    if match:
+        year, month, day = (int(x) if x else None for x in match.groups())
+        return year, format_date(year, month, day)
+    match = DAY_FIRST_RE.search(date)
+    if match:
+        day, month, year = (int(x) for x in match.groups())
+        return year, format_date(year, month, day)
+    match = MONTH_FIRST_RE.search(date)
+    if match:
+        month, day, year = (int(x) for x in match.groups())
+        if month > 12:
+            month, day = day, month
+        return year, format_date(year, month, day)
+    match = YEAR_RE.search(date)
+    if not match:
+        return None, ""
+    year = int(match.group(1))
+    for word in WORD_RE.findall(date):
+        month = next((v for k, v in MONTHS.items() if k.startswith(word.lower())), None)
+        if month:
+            day = re.search(DAY_RE.format(re.escape(word)), date)
+            day = day and int(day.group(1) or day.group(2))
+            return year, format_date(year, month, day)
+    return year, format_date(year)
+
+
+def fill_dates(apps, schema_editor):
+    """ fills 'date_sort' and reparses 'year' with the more thorough parser """
+    ZotItem = apps.get_model('bib', 'ZotItem')
+    batch = []
+    for item in ZotItem.objects.only('zot_key', 'zot_date').iterator(chunk_size=1000):
+        item.year, date = parse_date(item.zot_date)
+        item.date_sort = "{} {}".format(date or "~", item.zot_key)
+        batch.append(item)
+        if len(batch) >= 1000:
+            ZotItem.objects.bulk_update(batch, ['year', 'date_sort'])
+            batch = []
+    ZotItem.objects.bulk_update(batch, ['year', 'date_sort'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bib', '0009_zotitem_citation_key'),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_fts, create_fts),
+        migrations.AddField(
+            model_name='zotitem',
+            name='date_sort',
+            field=models.CharField(blank=True, db_index=True, help_text="The ISO 8601 date and the key of the item, computed from 'date' at sync time for chronological ordering.", max_length=40, verbose_name='date sort key'),
+        ),
+        migrations.RunPython(create_fts, drop_fts),
+        migrations.RunPython(fill_dates, migrations.RunPython.noop),
+    ]
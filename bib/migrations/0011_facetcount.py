@@ -0,0 +1,55 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:34
+
+from collections import Counter
+
+from django.db import migrations, models
+from django.db.models import Count
+
+# frozen copies of bib.facets.FACETS and facet_value, so later changes don't alter this migration
+FACETS = {
+    'item_type': 'zot_item_type',
+    'year': 'year',
+    'pub_title': 'zot_pub_title',
+}
+
+
+def facet_value(value):
+    """ returns the FacetCount value of a column value """
+    return ("" if value is None else "{}".format(value))[:255]
+
+
+def fill_facet_counts(apps, schema_editor):
+    ZotItem = apps.get_model('bib', 'ZotItem')
+    FacetCount = apps.get_model('bib', 'FacetCount')
+    counts = Counter()
+    for facet, column in FACETS.items():
+        for row in ZotItem.objects.order_by().values(column).annotate(n=Count('pk')):
+            counts[(facet, facet_value(row[column]))] += row['n']
+    FacetCount.objects.bulk_create(
+        [FacetCount(facet=f, value=v, count=n) for (f, v), n in counts.items()],
+        batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bib', '0010_zotitem_date_sort'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FacetCount',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('facet', models.CharField(help_text="'item_type', 'year' or 'pub_title'", max_length=20, verbose_name='facet')),
+                ('value', models.CharField(blank=True, help_text='The value of the facet, empty for items without one.', max_length=255, verbose_name='value')),
+                ('count', models.IntegerField(default=0, help_text='Number of items with this value.', verbose_name='count')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['facet', '-count'], name='bib_facetcount_facet_count')],
+                'unique_together': {('facet', 'value')},
+            },
+        ),
+        migrations.RunPython(fill_facet_counts, migrations.RunPython.noop),
+    ]
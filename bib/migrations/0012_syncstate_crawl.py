@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bib', '0011_facetcount'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='syncstate',
+            name='crawl_offset',
+            field=models.IntegerField(default=0, help_text='Number of items the unfinished complete import wrote, it resumes from there.', verbose_name='crawl offset'),
+        ),
+        migrations.AddField(
+            model_name='syncstate',
+            name='crawl_version',
+            field=models.IntegerField(blank=True, help_text='The library version at the start of the unfinished complete import, if any.', null=True, verbose_name='crawl version'),
+        ),
+    ]
@@ -0,0 +1,81 @@
+"""
+the full-text index of ZotItem as created by migration 0004, shared by the migrations that
+have to drop and recreate it; frozen like the migrations themselves, a changed index
+needs new functions here and a new migration using them
+"""
+
+FIELDS = ['zot_title', 'author_display', 'zot_pub_title', 'zot_date']
+FTS_TABLE = 'bib_zotitem_fts'
+
+
+def sqlite_has_fts5(schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("PRAGMA compile_options")
+        return 'ENABLE_FTS5' in [x[0] for x in cursor.fetchall()]
+
+
+def create_search_index(apps, schema_editor):
+    """
+    postgres: GIN index on the search vector of the search fields;
+    sqlite: external content FTS5 table kept in sync with bib_zotitem by triggers
+    """
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        from django.contrib.postgres.indexes import GinIndex
+        from django.contrib.postgres.search import SearchVector
+
+        ZotItem = apps.get_model('bib', 'ZotItem')
+        schema_editor.add_index(
+            ZotItem,
+            GinIndex(SearchVector(*FIELDS, config='simple'), name='bib_zotitem_search_idx')
+        )
+    elif vendor == 'sqlite' and sqlite_has_fts5(schema_editor):
+        columns = ", ".join(FIELDS)
+        new_values = ", ".join("new.{}".format(x) for x in FIELDS)
+        old_values = ", ".join("old.{}".format(x) for x in FIELDS)
+        statements = [
+            """CREATE VIRTUAL TABLE {table} USING fts5(
+                zot_key UNINDEXED, {columns}, content='bib_zotitem', content_rowid='rowid',
+                tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+            )""",
+            """CREATE TRIGGER {table}_ai AFTER INSERT ON bib_zotitem BEGIN
+                INSERT INTO {table}(rowid, zot_key, {columns})
+                VALUES (new.rowid, new.zot_key, {new_values});
+            END""",
+            """CREATE TRIGGER {table}_ad AFTER DELETE ON bib_zotitem BEGIN
+                INSERT INTO {table}({table}, rowid, zot_key, {columns})
+                VALUES ('delete', old.rowid, old.zot_key, {old_values});
+            END""",
+            """CREATE TRIGGER {table}_au AFTER UPDATE ON bib_zotitem BEGIN
+                INSERT INTO {table}({table}, rowid, zot_key, {columns})
+                VALUES ('delete', old.rowid, old.zot_key, {old_values});
+                INSERT INTO {table}(rowid, zot_key, {columns})
+                VALUES (new.rowid, new.zot_key, {new_values});
+            END""",
+            "INSERT INTO {table}({table}) VALUES ('rebuild')",
+        ]
+        for statement in statements:
+            schema_editor.execute(statement.format(
+                table=FTS_TABLE, columns=columns, new_values=new_values, old_values=old_values
+            ))
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute("DROP INDEX IF EXISTS bib_zotitem_search_idx")
+    elif vendor == 'sqlite':
+        for trigger in ['ai', 'ad', 'au']:
+            schema_editor.execute("DROP TRIGGER IF EXISTS {}_{}".format(FTS_TABLE, trigger))
+        schema_editor.execute("DROP TABLE IF EXISTS {}".format(FTS_TABLE))
+
+
+def drop_fts(apps, schema_editor):
+    # sqlite rebuilds the table to add or alter a column, which drops the FTS triggers
+    if schema_editor.connection.vendor == 'sqlite':
+        drop_search_index(apps, schema_editor)
+
+
+def create_fts(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        create_search_index(apps, schema_editor)
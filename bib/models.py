@@ -1,31 +1,152 @@
 # -*- coding: utf-8 -*-
-import ast
-from django.db import models
+import calendar
+import hashlib
+import json
+import re
+import warnings
+from django.db import models, transaction
 from django.conf import settings
 
-from pyzotero import zotero
+from bib.caching import invalidate
 
-library_id = settings.Z_ID
-library_type = settings.Z_LIBRARY_TYPE
-api_key = settings.Z_API_KEY
 try:
     NN = settings.Z_NN
 except AttributeError:
     NN = 'N.N.'
 
 
-def fetch_bibtex(zot_key):
-    """ fetches the bibtex dict of the passed in key """
-    result = {}
-    zot = zotero.Zotero(library_id, library_type, api_key)
-    try:
-        result['bibtex'] = zot.item(zot_key, format='bibtex').entries_dict
-        result['error'] = None
-    except Exception as e:
-        result['bibtex'] = None
-        result['error'] = "{}".format(e)
+# ZotItem fields filled from zotero, 'zot_key' excluded; their values make up the content hash
+CONTENT_FIELDS = [
+    'zot_creator',
+    'author_display',
+    'zot_date',
+    'year',
+    'date_sort',
+    'zot_item_type',
+    'zot_title',
+    'zot_pub_title',
+    'date_modified',
+    'zot_pages',
+    'zot_version',
+    'zot_html_link',
+    'zot_api_link',
+    'zot_bibtex',
+    'citation_key',
+    'zot_label',
+]
 
-    return result
+
+def format_creators(creators):
+    """ returns the names of the passed in list of zotero creators, joined by ' / ' """
+    authors = []
+    for x in creators or []:
+        try:
+            author = f"{x['firstName']} {x['lastName']}"
+        except KeyError:
+            author = f"{x.get('name', '')}"
+        authors.append(author.strip())
+    return " / ".join(authors)
+
+
+def format_label(author, title, pub_title):
+    """ returns the short label of an item, e.g. used by autocompletes """
+    label = "{}: {}".format(author or NN, title)
+    if pub_title:
+        label = "{}; {}".format(label, pub_title)
+    return label[:500]
+
+
+# month names and seasons of free text dates, abbreviations of at least three letters match
+MONTHS = {
+    'january': 1, 'february': 2, 'march': 3, 'april': 4, 'may': 5, 'june': 6, 'july': 7,
+    'august': 8, 'september': 9, 'october': 10, 'november': 11, 'december': 12,
+    'januar': 1, 'jänner': 1, 'februar': 2, 'märz': 3, 'mai': 5, 'juni': 6, 'juli': 7,
+    'oktober': 10, 'dezember': 12,
+    'spring': 3, 'summer': 6, 'autumn': 9, 'fall': 9, 'winter': 12,
+    'frühling': 3, 'frühjahr': 3, 'sommer': 6, 'herbst': 9,
+}
+ISO_DATE_RE = re.compile(r'(?<!\d)(\d{4})[-/](\d{1,2})(?:[-/](\d{1,2}))?(?!\d)')
+DAY_FIRST_RE = re.compile(r'(?<!\d)(\d{1,2})\.\s?(\d{1,2})\.\s?(\d{4})(?!\d)')
+MONTH_FIRST_RE = re.compile(r'(?<!\d)(\d{1,2})/(\d{1,2})/(\d{4})(?!\d)')
+YEAR_RE = re.compile(r'(?<!\d)(\d{4})(?!\d)')
+WORD_RE = re.compile(r'[^\W\d_]{3,}')
+DAY_RE = r'(?<!\d)(\d{{1,2}})(?:st|nd|rd|th|\.)?\s+{0}|{0}\.?\s+(\d{{1,2}})(?!\d)'
+
+
+def format_date(year, month=None, day=None):
+    """ returns the ISO 8601 date of the valid parts, e.g. '1998', '1998-03' or '1998-03-15' """
+    if not month or not 1 <= month <= 12:
+        return "{:04d}".format(year)
+    if not day or not 1 <= day <= calendar.monthrange(year, month)[1]:
+        return "{:04d}-{:02d}".format(year, month)
+    return "{:04d}-{:02d}-{:02d}".format(year, month, day)
+
+
+def parse_date(date):
+
+    """
+    parses a free text zotero 'date' like '1998-03-15', '15.3.1998', 'March 15, 1998',
+    'Spring 1998' or 'c. 1850'; returns its year and its most precise ISO 8601 date,
+    e.g. (1998, '1998-03'), or (None, "") if it holds no four digit year
+    """
+
+    date = date or ""
+    match = ISO_DATE_RE.search(date)
+    if match:
+        year, month, day = (int(x) if x else None for x in match.groups())
+        return year, format_date(year, month, day)
+    match = DAY_FIRST_RE.search(date)
+    if match:
+        day, month, year = (int(x) for x in match.groups())
+        return year, format_date(year, month, day)
+    match = MONTH_FIRST_RE.search(date)
+    if match:
+        month, day, year = (int(x) for x in match.groups())
+        if month > 12:
+            month, day = day, month
+        return year, format_date(year, month, day)
+    match = YEAR_RE.search(date)
+    if not match:
+        return None, ""
+    year = int(match.group(1))
+    for word in WORD_RE.findall(date):
+        month = next((v for k, v in MONTHS.items() if k.startswith(word.lower())), None)
+        if month:
+            day = re.search(DAY_RE.format(re.escape(word)), date)
+            day = day and int(day.group(1) or day.group(2))
+            return year, format_date(year, month, day)
+    return year, format_date(year)
+
+
+def parse_year(date):
+    """ returns the year of a zotero 'date' string or None """
+    return parse_date(date)[0]
+
+
+def date_sort_key(date, zot_key):
+    """
+    returns the value of ZotItem.date_sort: the ISO 8601 date and the key, so items sort
+    chronologically and every value is unique; items without a date sort last
+    """
+    return "{} {}".format(date or "~", zot_key)
+
+
+def parse_citation_key(bibtex):
+    """ returns the citation key of the first entry of a bibtex string or None """
+    match = re.search(r'@\w+\s*\{\s*([^,\s]+)\s*,', bibtex or "")
+    if match:
+        return match.group(1)
+    return None
+
+
+class ZotItemQuerySet(models.QuerySet):
+
+    # columns not needed to list items, which can be kilobytes per row
+    LIST_DEFERRED = ['zot_bibtex', 'zot_creator']
+
+    def for_list(self):
+        """ defers the heavy columns; str() and the list serializer only use the other ones """
+        return self.defer(*self.LIST_DEFERRED)
 
 
 class ZotItem(models.Model):
@@ -36,16 +157,29 @@ class ZotItem(models.Model):
         max_length=20, primary_key=True, verbose_name='key',
         help_text="The Zotero Item Key"
     )
-    zot_creator = models.TextField(
-        blank=True, verbose_name="creators",
+    zot_creator = models.JSONField(
+        blank=True, default=list, verbose_name="creators",
         help_text="Stores all information from zoteros 'creators' field."
     )
+    author_display = models.CharField(
+        blank=True, max_length=500, db_index=True, verbose_name="authors",
+        help_text="The names of all creators, computed from 'creators' at sync time."
+    )
     zot_date = models.TextField(
         blank=True, verbose_name="date",
         help_text="Stores all information from zoteros 'date' field."
     )
+    year = models.IntegerField(
+        blank=True, null=True, db_index=True, verbose_name="year",
+        help_text="The year of the item, computed from 'date' at sync time."
+    )
+    date_sort = models.CharField(
+        blank=True, max_length=40, db_index=True, verbose_name="date sort key",
+        help_text="The ISO 8601 date and the key of the item, computed from 'date' at sync time "
+                  "for chronological ordering."
+    )
     zot_item_type = models.TextField(
-        blank=True, verbose_name="itemType",
+        blank=True, db_index=True, verbose_name="itemType",
         help_text="Stores all information from zoteros 'itemType' field."
     )
     zot_title = models.TextField(
@@ -80,40 +214,297 @@ class ZotItem(models.Model):
         blank=True, verbose_name="bibtex",
         help_text="Stores the item's bibtex representation."
     )
+    citation_key = models.CharField(
+        blank=True, max_length=250, db_index=True, verbose_name="citation key",
+        help_text="The bibtex citation key of the item, computed from 'bibtex' at sync time."
+    )
+    zot_label = models.CharField(
+        blank=True, max_length=500, verbose_name="label",
+        help_text="Short label of the item, computed from authors, title and publicationTitle."
+    )
+    content_hash = models.CharField(
+        blank=True, max_length=40, verbose_name="content hash",
+        help_text="Hash of the fields filled from zotero, unchanged items are not written on sync."
+    )
+
+    objects = ZotItemQuerySet.as_manager()
 
     class Meta:
         ordering = ['-zot_version']
+        indexes = [
+            # cursor pagination and 'since_version' filter of the API, see bib.pagination
+            models.Index(fields=['zot_version', 'zot_key'], name='bib_zotitem_version_key'),
+        ]
 
     def __str__(self):
-        if self.zot_bibtex:
-            return "{}".format(self.zot_bibtex)
-        else:
-            return "{}: {}; {}".format(self.zot_creator, self.zot_title, self.zot_pub_title)
-
-    def save(self, get_bibtex=False, *args, **kwargs):
-        if get_bibtex:
-            bibtex = fetch_bibtex(self.zot_key)
-            if bibtex['bibtex']:
-                self.zot_bibtex = "{}".format(bibtex['bibtex'])
-                self.save()
-            else:
-                pass
-            super(ZotItem, self).save(*args, **kwargs)
+        if self.zot_label:
+            return self.zot_label
         else:
+            return format_label(self.author_display, self.zot_title, self.zot_pub_title)
+
+    def save(self, *args, **kwargs):
+        if kwargs.pop('get_bibtex', False):
+            warnings.warn(
+                "ZotItem.save(get_bibtex=True) no longer fetches the bibtex, "
+                "use bib.zot_utils.backfill_bibtex instead",
+                DeprecationWarning, stacklevel=2
+            )
+        self.author_display = format_creators(self.zot_creator)[:500]
+        self.year, date = parse_date(self.zot_date)
+        self.date_sort = date_sort_key(date, self.zot_key)
+        self.citation_key = (parse_citation_key(self.zot_bibtex) or "")[:250]
+        self.zot_label = format_label(self.author_display, self.zot_title, self.zot_pub_title)
+        self.content_hash = self.compute_content_hash()
+        # the facet counts move from the stored to the new values, see bib.facets
+        from bib import facets
+        with transaction.atomic():
+            stored = ZotItem.objects.filter(pk=self.pk).values(*facets.FACETS.values()).first()
             super(ZotItem, self).save(*args, **kwargs)
+            facets.apply_changes(facets.count_changes(added=[self], removed=[stored] if stored else []))
+        invalidate()
+
+    def delete(self, *args, **kwargs):
+        from bib import facets
+        with transaction.atomic():
+            stored = ZotItem.objects.filter(pk=self.pk).values(*facets.FACETS.values()).first()
+            result = super(ZotItem, self).delete(*args, **kwargs)
+            facets.apply_changes(facets.count_changes(removed=[stored] if stored else []))
+        invalidate()
+        return result
+
+    def compute_content_hash(self):
+        """ returns the sha1 of the CONTENT_FIELDS values """
+        values = json.dumps(
+            [getattr(self, x) for x in CONTENT_FIELDS], sort_keys=True, default=str
+        )
+        return hashlib.sha1(values.encode('utf-8')).hexdigest()
 
     @property
     def author(self):
-        authors = []
-        author_list = ast.literal_eval(self.zot_creator)
-        for x in author_list:
-            try:
-                author = f"{x['firstName']} {x['lastName']}"
-            except KeyError:
-                author = f"{x.get('name', '')}"
-            authors.append(author.strip())
-        author_name = " / ".join(authors)
-        if author_name:
-            return author_name
+        if self.author_display:
+            return self.author_display
         else:
             return NN
+
+
+class SyncState(models.Model):
+
+    """ Stores the state of the last synchronisation of a Zotero library """
+
+    library_id = models.CharField(
+        max_length=50, verbose_name="library id",
+        help_text="The Zotero user or group ID"
+    )
+    library_type = models.CharField(
+        max_length=10, verbose_name="library type",
+        help_text="'user' or 'group'"
+    )
+    library_version = models.IntegerField(
+        blank=True, null=True, verbose_name="library version",
+        help_text="The 'Last-Modified-Version' of the library at the last successful sync."
+    )
+    started = models.DateTimeField(
+        blank=True, null=True, verbose_name="started",
+        help_text="Start of the last sync run."
+    )
+    ended = models.DateTimeField(
+        blank=True, null=True, verbose_name="ended",
+        help_text="End of the last sync run."
+    )
+    duration = models.FloatField(
+        blank=True, null=True, verbose_name="duration",
+        help_text="Duration of the last sync run in seconds."
+    )
+    pages = models.IntegerField(
+        default=0, verbose_name="pages",
+        help_text="Number of pages fetched by the last sync run."
+    )
+    items_saved = models.IntegerField(
+        default=0, verbose_name="items saved",
+        help_text="Number of items created/updated by the last sync run."
+    )
+    items_skipped = models.IntegerField(
+        default=0, verbose_name="items skipped",
+        help_text="Number of fetched items the last sync run did not write as they did not change."
+    )
+    items_deleted = models.IntegerField(
+        default=0, verbose_name="items deleted",
+        help_text="Number of items deleted by the last sync run."
+    )
+    error = models.TextField(
+        blank=True, verbose_name="error",
+        help_text="Error message of the last sync run, if it failed."
+    )
+    crawl_version = models.IntegerField(
+        blank=True, null=True, verbose_name="crawl version",
+        help_text="The library version at the start of the unfinished complete import, if any."
+    )
+    crawl_offset = models.IntegerField(
+        default=0, verbose_name="crawl offset",
+        help_text="Number of items the unfinished complete import wrote, it resumes from there."
+    )
+
+    class Meta:
+        unique_together = ('library_id', 'library_type')
+
+    def __str__(self):
+        return "{} {}: version {}".format(self.library_type, self.library_id, self.library_version)
+
+
+class SyncJob(models.Model):
+
+    """
+    A queued or running synchronisation of a Zotero library, processed by the
+    'bib_sync_worker' management command, see bib.jobs
+    """
+
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (QUEUED, 'queued'),
+        (RUNNING, 'running'),
+        (DONE, 'done'),
+        (FAILED, 'failed'),
+    ]
+
+    library_id = models.CharField(
+        max_length=50, verbose_name="library id",
+        help_text="The Zotero user or group ID"
+    )
+    library_type = models.CharField(
+        max_length=10, verbose_name="library type",
+        help_text="'user' or 'group'"
+    )
+    full = models.BooleanField(
+        default=False, verbose_name="full",
+        help_text="Fetch the whole library instead of the changes since the last sync."
+    )
+    status = models.CharField(
+        max_length=10, choices=STATUS_CHOICES, default=QUEUED, db_index=True,
+        verbose_name="status"
+    )
+    created = models.DateTimeField(
+        auto_now_add=True, verbose_name="created",
+        help_text="When the job was queued."
+    )
+    started = models.DateTimeField(
+        blank=True, null=True, verbose_name="started",
+        help_text="When a worker picked the job up."
+    )
+    heartbeat = models.DateTimeField(
+        blank=True, null=True, verbose_name="heartbeat",
+        help_text="Last progress report of the worker running the job."
+    )
+    ended = models.DateTimeField(
+        blank=True, null=True, verbose_name="ended",
+        help_text="When the job was done or failed."
+    )
+    worker = models.CharField(
+        blank=True, max_length=255, verbose_name="worker",
+        help_text="Host and process id of the worker running the job."
+    )
+    pages = models.IntegerField(
+        default=0, verbose_name="pages",
+        help_text="Number of pages fetched so far."
+    )
+    items = models.IntegerField(
+        default=0, verbose_name="items",
+        help_text="Number of items written so far."
+    )
+    items_total = models.IntegerField(
+        blank=True, null=True, verbose_name="items total",
+        help_text="Number of items to fetch, if known."
+    )
+    items_skipped = models.IntegerField(
+        default=0, verbose_name="items skipped",
+        help_text="Number of fetched items not written as they did not change."
+    )
+    items_deleted = models.IntegerField(
+        default=0, verbose_name="items deleted",
+        help_text="Number of items deleted."
+    )
+    not_modified = models.BooleanField(
+        default=False, verbose_name="not modified",
+        help_text="The library was not modified since the last sync."
+    )
+    error = models.TextField(
+        blank=True, verbose_name="error",
+        help_text="Error message, if the job failed."
+    )
+
+    class Meta:
+        ordering = ['-created']
+        constraints = [
+            # at most one waiting and one running job per library, enforced by the database
+            models.UniqueConstraint(
+                fields=['library_id', 'library_type'], condition=models.Q(status='queued'),
+                name='bib_syncjob_one_queued'
+            ),
+            models.UniqueConstraint(
+                fields=['library_id', 'library_type'], condition=models.Q(status='running'),
+                name='bib_syncjob_one_running'
+            ),
+        ]
+
+    def __str__(self):
+        return "{} {}: {}".format(self.library_type, self.library_id, self.status)
+
+    @property
+    def eta(self):
+        """ estimated seconds until all items are written, None if unknown """
+        done = self.items + self.items_skipped
+        if self.status != self.RUNNING or not self.items_total or not done:
+            return None
+        elapsed = ((self.heartbeat or self.started) - self.started).total_seconds()
+        remaining = max(self.items_total - done, 0)
+        return elapsed / done * remaining
+
+    def as_dict(self):
+        return {
+            'id': self.pk,
+            'status': self.status,
+            'full': self.full,
+            'created': self.created,
+            'started': self.started,
+            'ended': self.ended,
+            'pages': self.pages,
+            'items': self.items,
+            'items_total': self.items_total,
+            'items_skipped': self.items_skipped,
+            'items_deleted': self.items_deleted,
+            'not_modified': self.not_modified,
+            'eta': self.eta,
+            'error': self.error,
+        }
+
+
+class FacetCount(models.Model):
+
+    """
+    Number of stored ZotItems per value of a facet, e.g. per item type or year; kept up to
+    date by the sync, see bib.facets
+    """
+
+    facet = models.CharField(
+        max_length=20, verbose_name="facet",
+        help_text="'item_type', 'year' or 'pub_title'"
+    )
+    value = models.CharField(
+        max_length=255, blank=True, verbose_name="value",
+        help_text="The value of the facet, empty for items without one."
+    )
+    count = models.IntegerField(
+        default=0, verbose_name="count",
+        help_text="Number of items with this value."
+    )
+
+    class Meta:
+        unique_together = ('facet', 'value')
+        indexes = [
+            models.Index(fields=['facet', '-count'], name='bib_facetcount_facet_count'),
+        ]
+
+    def __str__(self):
+        return "{} {}: {}".format(self.facet, self.value, self.count)
@@ -0,0 +1,41 @@
+from django.conf import settings
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import CursorPagination
+
+try:
+    API_PAGE_SIZE = settings.Z_API_PAGE_SIZE
+except AttributeError:
+    API_PAGE_SIZE = 100
+
+
+class ZotItemCursorPagination(CursorPagination):
+
+    """
+    Pages through ZotItems in ascending 'zot_version' order, backed by the
+    'bib_zotitem_version_key' index; the last cursor of a complete crawl is a
+    position clients can continue from, as is '?since_version=' with the highest
+    version seen. '?ordering=date' (or '-date') pages through them chronologically
+    by the 'date_sort' index.
+    """
+
+    ordering = ('zot_version', 'zot_key')
+    # '?ordering=' values; 'date_sort' is unique, so chronological pages need no offsets
+    orderings = {
+        'version': ('zot_version', 'zot_key'),
+        '-version': ('-zot_version', '-zot_key'),
+        'date': ('date_sort',),
+        '-date': ('-date_sort',),
+    }
+    page_size = API_PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+
+    def get_ordering(self, request, queryset, view):
+        value = request.query_params.get('ordering')
+        if not value:
+            return self.ordering
+        if value not in self.orderings:
+            raise ValidationError(
+                {'ordering': "Must be one of: {}".format(", ".join(self.orderings))}
+            )
+        return self.orderings[value]
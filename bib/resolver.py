@@ -0,0 +1,117 @@
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+
+from bib.caching import get_generation
+from bib.models import ZotItem
+
+try:
+    RESOLVER_CACHE_SIZE = settings.Z_RESOLVER_CACHE_SIZE
+except AttributeError:
+    RESOLVER_CACHE_SIZE = 2048
+# references looked up per query at most; each is bound twice (zotero and citation key), so
+# 'chunk_size' also keeps them below half of the database's parameter limit (999 on SQLite)
+CHUNK_SIZE = 500
+
+
+class ItemCache(object):
+
+    """
+    Per process LRU cache of resolved references, cleared as soon as the generation of
+    bib.caching changes, i.e. whenever ZotItem objects are written or deleted in any process;
+    unknown references are cached as None
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self.lock = threading.Lock()
+        self.items = OrderedDict()
+        self.generation = None
+
+    def check_generation(self):
+        generation = get_generation()
+        with self.lock:
+            if generation != self.generation:
+                self.items.clear()
+                self.generation = generation
+
+    def get_many(self, refs):
+        """ returns a dict of the cached 'refs' """
+        result = {}
+        with self.lock:
+            for ref in refs:
+                if ref in self.items:
+                    self.items.move_to_end(ref)
+                    result[ref] = self.items[ref]
+        return result
+
+    def set_many(self, values):
+        with self.lock:
+            for ref, item in values.items():
+                self.items[ref] = item
+                self.items.move_to_end(ref)
+            while len(self.items) > self.size:
+                self.items.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.items.clear()
+
+
+item_cache = ItemCache(RESOLVER_CACHE_SIZE)
+
+
+def chunk_size():
+    """ returns the number of references looked up per query """
+    max_params = connection.features.max_query_params
+    return min(CHUNK_SIZE, max_params // 2) if max_params else CHUNK_SIZE
+
+
+def fetch_references(refs):
+
+    """
+    looks up the passed in zotero keys and bibtex citation keys by their indexed columns,
+    'chunk_size' references per query; returns a dict of the found references and their
+    ZotItem objects
+    """
+
+    found = {}
+    size = chunk_size()
+    for i in range(0, len(refs), size):
+        chunk = refs[i:i + size]
+        wanted = set(chunk)
+        items = ZotItem.objects.filter(Q(zot_key__in=chunk) | Q(citation_key__in=chunk))
+        for item in items:
+            if item.zot_key in wanted:
+                found[item.zot_key] = item
+            # zotero keys win over citation keys
+            if item.citation_key in wanted and item.citation_key not in found:
+                found[item.citation_key] = item
+    return found
+
+
+def resolve(refs):
+
+    """
+    takes a list of zotero keys and/or bibtex citation keys and returns a dict mapping each
+    of them to its ZotItem or to None if unknown, in the order passed in; references not
+    in the per process cache are fetched with one query, see 'fetch_references'
+    """
+
+    refs = list(OrderedDict.fromkeys(x for x in refs if x))
+    if RESOLVER_CACHE_SIZE:
+        item_cache.check_generation()
+        result = item_cache.get_many(refs)
+    else:
+        result = {}
+    missing = [x for x in refs if x not in result]
+    if missing:
+        found = fetch_references(missing)
+        fetched = {x: found.get(x) for x in missing}
+        if RESOLVER_CACHE_SIZE:
+            item_cache.set_many(fetched)
+        result.update(fetched)
+    return OrderedDict((x, result[x]) for x in refs)
@@ -0,0 +1,88 @@
+import re
+
+from django.db import connections
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+from bib.models import ZotItem
+
+# the columns ZotItem objects are searched by
+SEARCH_FIELDS = ['zot_title', 'author_display', 'zot_pub_title', 'zot_date']
+# postgres text search configuration, 'simple' as titles come in all languages
+SEARCH_CONFIG = 'simple'
+SEARCH_INDEX = 'bib_zotitem_search_idx'
+FTS_TABLE = 'bib_zotitem_fts'
+
+_fts_tables = set()
+
+
+def tokenize(q):
+    """ returns the words of the search string 'q' """
+    return re.findall(r'\w+', q or "")
+
+
+def fts_available(connection):
+    """ True if the sqlite FTS5 shadow table of ZotItem exists on 'connection' """
+    if connection.alias not in _fts_tables:
+        if FTS_TABLE in connection.introspection.table_names():
+            _fts_tables.add(connection.alias)
+    return connection.alias in _fts_tables
+
+
+def search_fallback(queryset, q):
+    """ unindexed search, used on databases without full-text support """
+    query = Q()
+    for field in SEARCH_FIELDS:
+        query |= Q(**{'{}__icontains'.format(field): q})
+    return queryset.filter(query)
+
+
+def search_postgres(queryset, tokens):
+    from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+
+    # the expression must match the one of SEARCH_INDEX for the index to be used
+    vector = SearchVector(*SEARCH_FIELDS, config=SEARCH_CONFIG)
+    query = SearchQuery(
+        " & ".join("{}:*".format(token) for token in tokens),
+        config=SEARCH_CONFIG, search_type='raw'
+    )
+    return queryset.annotate(
+        search=vector, rank=SearchRank(vector, query)
+    ).filter(search=query).order_by('-rank')
+
+
+def search_sqlite(queryset, tokens):
+    match = " AND ".join('"{}"*'.format(token) for token in tokens)
+    table = ZotItem._meta.db_table
+    return queryset.filter(
+        pk__in=RawSQL(
+            "SELECT zot_key FROM {0} WHERE {0} MATCH %s".format(FTS_TABLE), [match]
+        )
+    ).annotate(
+        rank=RawSQL(
+            "SELECT rank FROM {0} WHERE {0} MATCH %s AND rowid = {1}.rowid".format(
+                FTS_TABLE, table
+            ), [match]
+        )
+    ).order_by('rank')
+
+
+def search_zotitems(queryset, q):
+
+    """
+    filters the passed in ZotItem queryset by the search string 'q' and orders it by relevance;
+    every word of 'q' has to be the prefix of a word in one of the SEARCH_FIELDS.
+    Uses the GIN index on postgres and the FTS5 shadow table on sqlite,
+    both are kept up to date by the database on every write, see migration 0004.
+    Other databases fall back to unindexed 'icontains' lookups.
+    """
+
+    tokens = tokenize(q)
+    if not tokens:
+        return queryset
+    connection = connections[queryset.db]
+    if connection.vendor == 'postgresql':
+        return search_postgres(queryset, tokens)
+    if connection.vendor == 'sqlite' and fts_available(connection):
+        return search_sqlite(queryset, tokens)
+    return search_fallback(queryset, q)
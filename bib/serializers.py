@@ -2,7 +2,54 @@ from rest_framework import serializers
 from bib.models import ZotItem
 
 
-class ZotItemSerializer(serializers.HyperlinkedModelSerializer):
+class SparseFieldsMixin(object):
+
+    """ limits the serialized fields to the comma separated '?fields=' of the request """
+
+    def __init__(self, *args, **kwargs):
+        super(SparseFieldsMixin, self).__init__(*args, **kwargs)
+        requested = sparse_fields(self.context.get('request'))
+        if requested:
+            for name in set(self.fields) - set(requested):
+                self.fields.pop(name)
+
+
+def sparse_fields(request):
+    """ returns the list of field names passed as '?fields=' or None """
+    if request is None:
+        return None
+    value = request.query_params.get('fields', '')
+    return [x.strip() for x in value.split(',') if x.strip()] or None
+
+
+class ZotItemSerializer(SparseFieldsMixin, serializers.HyperlinkedModelSerializer):
     class Meta:
         model = ZotItem
         fields = "__all__"
+
+    def get_default_field_names(self, declared_fields, model_info):
+        # hyperlinked serializers leave out the primary key, the zotero key is worth having
+        return [model_info.pk.name] + super(ZotItemSerializer, self).get_default_field_names(
+            declared_fields, model_info
+        )
+
+
+class ZotItemListSerializer(SparseFieldsMixin, serializers.HyperlinkedModelSerializer):
+
+    """ slim representation used by list responses, without bibtex and creators """
+
+    class Meta:
+        model = ZotItem
+        fields = [
+            'url',
+            'zot_key',
+            'citation_key',
+            'zot_label',
+            'author_display',
+            'zot_title',
+            'zot_pub_title',
+            'zot_date',
+            'year',
+            'zot_item_type',
+            'zot_version',
+        ]
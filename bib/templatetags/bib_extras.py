@@ -1,12 +1,85 @@
 import json
 from django import template
+from django.template.library import InclusionNode
+from bib.citations import replace_citations, short_citation
 from bib.models import ZotItem
+from bib.resolver import resolve
 register = template.Library()
 
+# context variable holding the references prefetched by 'bib_citations'
+CITATIONS = 'bib_citations'
 
-@register.inclusion_tag('bib/tags/zotitem.html')
-def bib_quote(item):
+
+@register.inclusion_tag('bib/tags/zotitem.html', takes_context=True)
+def bib_quote(context, item):
+    """
+    renders a ZotItem, or the ZotItem of a zotero key or bibtex citation key; keys are looked
+    up among the citations prefetched by an enclosing 'bib_citations' block first.
+    Intentionally renders the stored bibtex entry of the item, the full reference, unlike
+    the short 'Author Year' citations of 'bib_cite'; items without bibtex (e.g. imported
+    from CSL-JSON files) are rendered with that short citation, see short_citation
+    """
     values = {}
-    values['quote'] = f"{item.zot_bibtex}"
+    if not isinstance(item, ZotItem) and item:
+        citations = context.get(CITATIONS) or {}
+        key = "{}".format(item)
+        item = citations[key] if key in citations else resolve([key])[key]
+        if item is None:
+            values['quote'] = key
+    if item:
+        values['quote'] = item.zot_bibtex or short_citation(item)
     values['object'] = item
     return values
+
+
+class CitationsNode(template.Node):
+
+    def __init__(self, nodelist, refs):
+        self.nodelist = nodelist
+        self.refs = refs
+
+    def collect(self, context):
+        """ returns the keys passed to the tag and to the enclosed 'bib_quote' tags """
+        keys = []
+        for value in [x.resolve(context) for x in self.refs]:
+            if isinstance(value, str):
+                keys.append(value)
+            elif value:
+                keys.extend("{}".format(x) for x in value if x and not isinstance(x, ZotItem))
+        for node in self.nodelist.get_nodes_by_type(InclusionNode):
+            if node.func is not bib_quote or not node.args:
+                continue
+            value = node.args[0].resolve(context)
+            if value and not isinstance(value, ZotItem):
+                keys.append("{}".format(value))
+        return keys
+
+    def render(self, context):
+        citations = dict(context.get(CITATIONS) or {})
+        citations.update(resolve([x for x in self.collect(context) if x not in citations]))
+        with context.push(**{CITATIONS: citations}):
+            return self.nodelist.render(context)
+
+
+@register.tag
+def bib_citations(parser, token):
+    """
+    resolves the keys of all 'bib_quote' tags of the block with one query before rendering it,
+    keys only known while rendering (e.g. inside loops) can be passed as arguments,
+    either one by one or as lists:
+
+        {% bib_citations more_keys %}...{% bib_quote "doe_roman_1998" %}...{% endbib_citations %}
+    """
+    refs = [parser.compile_filter(x) for x in token.split_contents()[1:]]
+    nodelist = parser.parse(('endbib_citations',))
+    parser.delete_first_token()
+    return CitationsNode(nodelist, refs)
+
+
+@register.filter(needs_autoescape=True)
+def bib_cite(text, autoescape=True):
+    """
+    replaces the \\cite{key} and [@key] markers of a text with links to the cited items,
+    resolving all of them with one query, see bib.citations.replace_citations
+    """
+    return replace_citations(text, autoescape=autoescape)
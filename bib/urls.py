@@ -1,14 +1,18 @@
 # -*- coding: utf-8 -*-
-from django.conf.urls import url
+from django.urls import re_path
 from . import views
 from . import dal_views
 
 app_name = 'bib'
 
 urlpatterns = [
-    url(r'^synczotero/$', views.sync_zotero, name="synczotero"),
-    url(r'^synczotero/update$', views.update_zotitems, name="synczotero_update"),
-    url(
+    re_path(r'^synczotero/$', views.sync_zotero, name="synczotero"),
+    re_path(r'^synczotero/update$', views.update_zotitems, name="synczotero_update"),
+    re_path(
+        r'^synczotero/jobs/(?P<pk>[0-9]+)$', views.sync_job_progress,
+        name="synczotero_progress"
+    ),
+    re_path(
         r'^zotitem-autocomplete/$', dal_views.ZotItemAC.as_view(),
         name='zotitem-autocomplete',
     ),
@@ -1,7 +1,7 @@
-import requests
 from django.core.exceptions import ObjectDoesNotExist
 from django.conf import settings
-from django.shortcuts import render
+from django.http import JsonResponse
+from django.shortcuts import get_object_or_404, render
 from django.views import generic
 from django.views.generic.edit import CreateView, DeleteView, UpdateView
 from django.views.generic.detail import DetailView
@@ -9,8 +9,8 @@ from django.urls import reverse, reverse_lazy
 from django.utils.decorators import method_decorator
 from django.contrib.auth.decorators import login_required
 
-from . models import ZotItem
-from . zot_utils import items_to_dict, create_zotitem
+from . jobs import enqueue_sync
+from . models import SyncJob, ZotItem
 
 
 library_id = settings.Z_ID
@@ -26,17 +26,20 @@ def sync_zotero(request):
 
 @login_required
 def update_zotitems(request):
-    """ fetches all items with higher version number then the highest stored in db """
+    """
+    queues a sync of all items changed since the last sync, which a 'bib_sync_worker' runs,
+    and renders a page following its progress
+    """
     context = {}
-    context["saved"] = []
-    limit = None
-    since = None
+    context["job"] = enqueue_sync(library_id, library_type)
     context["books_before"] = ZotItem.objects.all().count()
-    first_object = ZotItem.objects.all()[:1].get()
-    since = first_object.zot_version
-    items = items_to_dict(library_id, library_type, api_key, limit=limit, since_version=since)
-    for x in items['bibs']:
-        temp_item = create_zotitem(x)
-        context["saved"].append(temp_item)
-    context["books_after"] = ZotItem.objects.all().count()
     return render(request, 'bib/synczotero_action.html', context)
+
+
+@login_required
+def sync_job_progress(request, pk):
+    """ returns the state of a SyncJob as JSON, including its progress and ETA """
+    job = get_object_or_404(SyncJob, pk=pk)
+    data = job.as_dict()
+    data['books'] = ZotItem.objects.all().count()
+    return JsonResponse(data)
@@ -0,0 +1,261 @@
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+import httpx2
+from pyzotero import zotero, zotero_errors
+from django.conf import settings
+
+from bib import metrics
+
+try:
+    ENDPOINT = settings.Z_ENDPOINT
+except AttributeError:
+    ENDPOINT = None
+try:
+    REQUESTS_PER_SECOND = settings.Z_REQUESTS_PER_SECOND
+except AttributeError:
+    REQUESTS_PER_SECOND = None
+try:
+    MAX_RETRIES = settings.Z_MAX_RETRIES
+except AttributeError:
+    MAX_RETRIES = 5
+
+# seconds, doubled with every retry and jittered
+RETRY_BASE = 1.0
+RETRY_CAP = 60.0
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+# seconds between the calls of the keepalive callback while waiting
+KEEPALIVE_INTERVAL = 10.0
+# connection resets, refused connections and timeouts of pyzotero's HTTP client
+TRANSPORT_EXCEPTIONS = (httpx2.TransportError, httpx2.TimeoutException)
+RETRY_EXCEPTIONS = tuple(
+    getattr(zotero_errors, name) for name in [
+        'TooManyRequests', 'TooManyRequestsError', 'TooManyRetries', 'TooManyRetriesError',
+        'HTTPError'
+    ] if hasattr(zotero_errors, name)
+) + TRANSPORT_EXCEPTIONS + (httpx2.HTTPStatusError,)
+
+_lock = threading.Lock()
+_local = threading.local()
+_libraries = {}
+
+
+class LibraryThrottle(object):
+
+    """
+    Request budget, server backoff and counters shared by all clients of one library
+    across the threads of the process
+    """
+
+    def __init__(self, requests_per_second=None):
+        self.interval = 1.0 / requests_per_second if requests_per_second else 0.0
+        self.lock = threading.Lock()
+        self.next_request = 0.0
+        self.backoff_until = 0.0
+        self.counters = {'requests': 0, 'retries': 0, 'waits': 0, 'waited': 0.0}
+
+    def count(self, name, value=1):
+        with self.lock:
+            self.counters[name] += value
+
+    def wait(self):
+        """ blocks until the next request is within the budget and no backoff is active """
+        with self.lock:
+            now = time.time()
+            start = max(now, self.next_request, self.backoff_until)
+            self.next_request = start + self.interval
+            self.counters['requests'] += 1
+        if start > now:
+            self.sleep(start - now)
+
+    def sleep(self, seconds):
+        """ sleeps 'seconds', calling the thread's keepalive callback in between """
+        self.count('waits')
+        self.count('waited', seconds)
+        callback = getattr(_local, 'keepalive', None)
+        if callback is None:
+            time.sleep(seconds)
+            return
+        while seconds > 0:
+            step = min(seconds, KEEPALIVE_INTERVAL)
+            time.sleep(step)
+            seconds -= step
+            callback()
+
+    def backoff(self, seconds):
+        """ pauses all requests of the library for 'seconds' """
+        with self.lock:
+            self.backoff_until = max(self.backoff_until, time.time() + seconds)
+
+
+def get_throttle(library_id, library_type):
+    with _lock:
+        key = ("{}".format(library_id), library_type)
+        if key not in _libraries:
+            _libraries[key] = LibraryThrottle(REQUESTS_PER_SECOND)
+        return _libraries[key]
+
+
+def stats():
+    """ returns the counters of all libraries summed up """
+    result = {'requests': 0, 'retries': 0, 'waits': 0, 'waited': 0.0}
+    with _lock:
+        throttles = list(_libraries.values())
+    for throttle in throttles:
+        with throttle.lock:
+            for name, value in throttle.counters.items():
+                result[name] += value
+    return result
+
+
+def reset():
+    """ drops the shared state, e.g. after the settings changed in tests """
+    with _lock:
+        _libraries.clear()
+    _local.__dict__.clear()
+
+
+@contextmanager
+def keepalive(callback):
+
+    """
+    calls 'callback' before every request of the current thread and every KEEPALIVE_INTERVAL
+    seconds while it waits for the request budget or a backoff, e.g. to tell that a long
+    running sync is still alive
+    """
+
+    previous = getattr(_local, 'keepalive', None)
+    _local.keepalive = callback
+    try:
+        yield
+    finally:
+        _local.keepalive = previous
+
+
+def ping():
+    """ calls the keepalive callback of the current thread, if any """
+    callback = getattr(_local, 'keepalive', None)
+    if callback is not None:
+        callback()
+
+
+def retry_after(headers):
+    """ returns the seconds zotero asks to wait for, taken from 'Backoff' or 'Retry-After' """
+    for header in ['Retry-After', 'Backoff']:
+        value = (headers or {}).get(header)
+        if value:
+            try:
+                return float(value)
+            except ValueError:
+                pass
+    return 0.0
+
+
+class ZoteroClient(object):
+
+    """
+    Wraps a pyzotero.zotero.Zotero instance; every API call waits for the library's request
+    budget and any active server backoff, honours 'Backoff'/'Retry-After' headers and is retried
+    with jittered exponential backoff on rate limiting, server and connection errors.
+    Attributes not defined here are looked up on the wrapped instance.
+    Instances keep the HTTP connections of pyzotero's client alive and must not be shared
+    between threads, use 'get_client' to get the one of the current thread.
+    """
+
+    def __init__(self, library_id, library_type, api_key, max_retries=None):
+        self.zot = zotero.Zotero(library_id, library_type, api_key)
+        if ENDPOINT:
+            self.zot.endpoint = ENDPOINT
+        self.throttle = get_throttle(library_id, library_type)
+        self.max_retries = MAX_RETRIES if max_retries is None else max_retries
+
+    def __getattr__(self, name):
+        attr = getattr(self.zot, name)
+        if not callable(attr):
+            return attr
+
+        def call(*args, **kwargs):
+            return self.call(attr, *args, **kwargs)
+        return call
+
+    def delay(self, attempt, headers=None):
+        """ seconds to wait before retry number 'attempt' """
+        jittered = random.uniform(0, min(RETRY_CAP, RETRY_BASE * 2 ** attempt))
+        return max(retry_after(headers), jittered)
+
+    def call(self, func, *args, **kwargs):
+        """ calls 'func' of the wrapped instance within the budget, retrying as described above """
+        attempt = 0
+        while True:
+            ping()
+            self.throttle.wait()
+            metrics.count('requests')
+            try:
+                with metrics.timer('http'):
+                    result = func(*args, **kwargs)
+            except RETRY_EXCEPTIONS as e:
+                response = getattr(e, 'response', None)
+                if response is None and not isinstance(e, TRANSPORT_EXCEPTIONS):
+                    # pyzotero keeps the response of the failed call
+                    response = getattr(self.zot, 'request', None)
+                status = getattr(response, 'status_code', None)
+                if attempt >= self.max_retries or (status is not None and status not in RETRY_STATUSES):
+                    raise
+                headers = getattr(response, 'headers', None)
+            else:
+                response = result if isinstance(result, httpx2.Response) else self.zot.request
+                content = getattr(response, 'content', None)
+                if isinstance(content, bytes):
+                    metrics.count('bytes', len(content))
+                backoff = retry_after(getattr(response, 'headers', None))
+                if backoff:
+                    self.throttle.backoff(backoff)
+                return result
+            self.throttle.count('retries')
+            metrics.count('retries')
+            self.throttle.sleep(self.delay(attempt, headers))
+            attempt += 1
+
+    def get(self, path, params=None, headers=None):
+        """
+        sends a GET request for 'path' (relative to the library, e.g. '/items/top') with the
+        client's credentials over the keep-alive connections of pyzotero's HTTP client; returns
+        the response, which might be a '304 Not Modified'; error statuses are raised as
+        httpx2.HTTPStatusError, after the retries for rate limiting and server errors
+        """
+        url = "{}/{}/{}{}".format(
+            self.zot.endpoint, self.zot.library_type, self.zot.library_id, path
+        )
+        request_headers = {'Zotero-API-Version': '3'}
+        if self.zot.api_key:
+            request_headers['Zotero-API-Key'] = self.zot.api_key
+        request_headers.update(headers or {})
+
+        def send():
+            response = self.zot.client.get(url, params=params, headers=request_headers, timeout=30)
+            if response.status_code >= 400:
+                # httpx2 raises for '304 Not Modified' as well
+                response.raise_for_status()
+            return response
+
+        return self.call(send)
+
+
+def get_client(library_id=None, library_type=None, api_key=None):
+
+    """
+    returns the ZoteroClient of the current thread for the passed in library,
+    defaulting to settings.Z_ID, Z_LIBRARY_TYPE and Z_API_KEY; clients are created once
+    per thread and library, budget, backoff and counters are shared by all threads
+    """
+
+    library_id = library_id or settings.Z_ID
+    library_type = library_type or settings.Z_LIBRARY_TYPE
+    api_key = api_key or settings.Z_API_KEY
+    clients = _local.__dict__.setdefault('clients', {})
+    key = ("{}".format(library_id), library_type, api_key)
+    if key not in clients:
+        clients[key] = ZoteroClient(library_id, library_type, api_key)
+    return clients[key]
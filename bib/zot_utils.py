@@ -1,106 +1,758 @@
-from pyzotero import zotero
+import threading
+import time
+from collections import Counter, defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+
 from django.conf import settings
-from bib.models import ZotItem
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from bib import facets, metrics
+from bib.caching import invalidate
+from bib.models import (
+    CONTENT_FIELDS, SyncState, ZotItem, date_sort_key, format_creators, format_label,
+    parse_citation_key, parse_date
+)
+from bib.zot_client import get_client
 
+# the maximum number of items the zotero API returns per request
+PAGE_SIZE = 100
+# the maximum number of keys the zotero API accepts per 'itemKey' request
+KEY_BATCH_SIZE = 50
 
-def items_to_dict(library_id, library_type, api_key, limit=15, since_version=None):
+try:
+    BATCH_SIZE = settings.Z_BATCH_SIZE
+except AttributeError:
+    BATCH_SIZE = 500
+
+# ZotItem fields written on every sync, 'zot_key' excluded
+SYNC_FIELDS = CONTENT_FIELDS + ['content_hash']
+
+
+def get_zotero(library_id, library_type, api_key):
 
     """
-    returns a dict with keys 'error' containing possible error-msgs,
-    'items' a list of fetched zotero items and
-    'bibs' a list of dicts ready for creating ZotItem objects
+    returns the shared zotero client of the current thread, see 'bib.zot_client.get_client';
+    it talks to settings.Z_ENDPOINT if set (e.g. a local test server)
     """
 
-    zot = zotero.Zotero(library_id, library_type, api_key)
-    result = {}
-    error = None
-    itmes = None
-    bibs = []
+    return get_client(library_id, library_type, api_key)
+
+
+def fetch_page(zot, start, limit, since_version=None):
+
+    """
+    fetches the top level items from offset 'start' on, including their data and bibtex;
+    returns a tuple of the list of items and the 'Total-Results' reported by zotero.
+    Items are sorted by the date they were added, so editing items does not move them to
+    other offsets while the library is crawled
+    """
+
+    params = {
+        'start': start, 'limit': limit, 'include': 'data,bibtex', 'sort': 'dateAdded',
+        'direction': 'asc'
+    }
     if since_version:
+        params['since'] = since_version
+    items = zot.top(**params)
+    total = zot.request.headers.get('Total-Results')
+    if total is not None:
+        total = int(total)
+    return items, total
+
+
+def fetch_pages(zot, limit=None, since_version=None, page_size=PAGE_SIZE, start=0):
+
+    """
+    generator yielding one list of top level zotero items per page; each page is fetched
+    with a single request including the items' data and bibtex representation;
+    the next page is only requested once the consumer asks for it
+    """
+
+    while True:
+        if limit:
+            page_size = min(page_size, limit - start)
+        items, total = fetch_page(zot, start, page_size, since_version)
+        if not items:
+            break
+        yield items
+        start += len(items)
+        if limit and start >= limit:
+            break
+        if total is not None and start >= total:
+            break
+
+
+def fetch_pages_concurrently(
+    get_zot, limit=None, since_version=None, page_size=PAGE_SIZE, workers=4, start=0
+):
+
+    """
+    generator yielding the same pages as 'fetch_pages' but fetching up to 'workers' pages
+    at once; the offsets of all pages are known from the 'Total-Results' of the first page.
+    Pages are yielded in library order and at most 2 * 'workers' pages are held in memory.
+    'get_zot' returns the zotero client of the calling thread and is called once per thread,
+    as a client must not be shared between threads
+    """
+
+    zot = get_zot()
+    size = min(page_size, limit - start) if limit else page_size
+    items, total = fetch_page(zot, start, size, since_version)
+    if not items:
+        return
+    yield items
+    start += len(items)
+    if total is None:
+        # no way to know the offsets in advance, go on one page after another
+        yield from fetch_pages(
+            zot, limit=limit, since_version=since_version, page_size=page_size, start=start
+        )
+        return
+    if limit:
+        total = min(total, limit)
+    local = threading.local()
+
+    def fetch(offset):
+        if not hasattr(local, 'zot'):
+            local.zot = get_zot()
+        return fetch_page(local.zot, offset, min(page_size, total - offset), since_version)[0]
+
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
         try:
-            items = zot.everything(zot.top(since=since_version))
-            bibtexs = zot.everything(zot.top(format='bibtex', since=since_version))
-        except Exception as e:
-            error = "{}".format(e)
-            items = None
-            bibtexs = None
-    elif limit:
-        try:
-            items = zot.top(limit=limit)
-            bibtexs = zot.everything(zot.top(format='bibtex', limit=limit))
-        except Exception as e:
-            error = "{}".format(e)
-            items = None
-            bibtexs = None
+            for offset in range(start, total, page_size):
+                pending.append(executor.submit(fetch, offset))
+                if len(pending) >= 2 * workers:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+        finally:
+            for future in pending:
+                future.cancel()
+
+
+def fetch_library_version(zot, since_version=None):
+
+    """
+    returns the current version of the library or None if it was not modified since
+    'since_version'; the request is sent with 'If-Modified-Since-Version', so in the latter case
+    zotero only answers '304 Not Modified' without a body
+    """
+
+    headers = {}
+    if since_version is not None:
+        headers['If-Modified-Since-Version'] = "{}".format(since_version)
+    response = zot.get('/items/top', params={'limit': 1, 'format': 'versions'}, headers=headers)
+    if response.status_code == 304:
+        return None
+    return int(response.headers.get('Last-Modified-Version', 0))
+
+
+def fetch_versions(zot):
+
+    """
+    returns a tuple of a dict mapping the keys of all top level items to their versions
+    and the library version the dict reflects
+    """
+
+    versions = zot.top(format='versions', limit=None)
+    return versions, int(zot.request.headers.get('Last-Modified-Version', 0))
+
+
+def fetch_pages_by_key(zot, keys, key_batch_size=KEY_BATCH_SIZE, include='data,bibtex'):
+
+    """
+    generator yielding one list of zotero items, including their data and bibtex by default,
+    per request for up to 'key_batch_size' of the passed in item keys
+    """
+
+    for i in range(0, len(keys), key_batch_size):
+        batch = keys[i:i + key_batch_size]
+        yield zot.items(itemKey=",".join(batch), include=include, limit=len(batch))
+
+
+def fetch_bibtexs(zot, keys, key_batch_size=KEY_BATCH_SIZE):
+
+    """
+    generator yielding one dict mapping item keys to their bibtex per request for up to
+    'key_batch_size' of the passed in item keys
+    """
+
+    for items in fetch_pages_by_key(zot, keys, key_batch_size=key_batch_size, include='bibtex'):
+        yield {x['key']: (x.get('bibtex') or "").strip() for x in items}
+
+
+def item_to_dict(item, bibtex=""):
+
+    """ takes a zotero item and returns a dict ready for creating a ZotItem object """
+
+    x = item
+    bib = {}
+    bib['key'] = "{}".format(x['data'].get('key', ''))
+    bib['creators'] = x['data'].get('creators') or []
+    bib['date'] = "{}".format(x['data'].get('date', ''))
+    bib['itemType'] = "{}".format(x['data'].get('itemType', ''))
+    bib['title'] = "{}".format(x['data'].get('title', ''))
+    bib['publicationTitle'] = "{}".format(x['data'].get('publicationTitle', ''))
+    bib['dateModified'] = "{}".format(x['data'].get('dateModified', ''))
+    bib['pages'] = "{}".format(x['data'].get('pages', ''))
+    bib['version'] = "{}".format(x['data'].get('version', ''))
+    bib['zot_html_link'] = "{}".format(x['links']['alternate']['href'])
+    bib['zot_api_link'] = "{}".format(x['links']['self']['href'])
+    bib['zot_bibtex'] = bibtex
+    return bib
+
+
+def page_to_dicts(items):
+
+    """
+    converts one fetched page into a list of dicts ready for creating ZotItem objects,
+    the bibtex of each item is looked up by the item's key
+    """
+
+    with metrics.timer('bibtex'):
+        bibtexs = {x['key']: (x.get('bibtex') or "").strip() for x in items}
+    with metrics.timer('convert'):
+        return [item_to_dict(x, bibtexs[x['key']]) for x in items]
+
+
+def iter_bibs(
+    library_id, library_type, api_key, limit=None, since_version=None, workers=None, start=0
+):
+
+    """
+    generator yielding one list of dicts ready for creating ZotItem objects
+    per page fetched from the zotero API, beginning at offset 'start';
+    with 'workers' > 1 pages are fetched concurrently
+    """
+
+    if workers and workers > 1:
+        pages = fetch_pages_concurrently(
+            lambda: get_zotero(library_id, library_type, api_key),
+            limit=limit, since_version=since_version, workers=workers, start=start
+        )
     else:
+        zot = get_zotero(library_id, library_type, api_key)
+        pages = fetch_pages(zot, limit=limit, since_version=since_version, start=start)
+    for items in pages:
+        yield page_to_dicts(items)
+
+
+def bib_to_fields(bib_item):
+
+    """ maps a dict created by 'item_to_dict' to the matching ZotItem field values """
+
+    x = bib_item
+    year, date = parse_date(x['date'])
+    fields = {
+        'zot_creator': x['creators'],
+        'author_display': format_creators(x['creators'])[:500],
+        'zot_date': x['date'],
+        'year': year,
+        'date_sort': date_sort_key(date, x['key']),
+        'zot_item_type': x['itemType'],
+        'zot_title': x['title'],
+        'zot_pub_title': x['publicationTitle'],
+        'date_modified': parse_datetime(x['dateModified']),
+        'zot_pages': x['pages'],
+        'zot_version': int(x['version']) if x['version'] else None,
+        'zot_html_link': x['zot_html_link'],
+        'zot_api_link': x['zot_api_link'],
+    }
+    fields['zot_label'] = format_label(fields['author_display'], x['title'], x['publicationTitle'])
+    if 'zot_bibtex' in x:
+        fields['zot_bibtex'] = x['zot_bibtex']
+        fields['citation_key'] = (parse_citation_key(x['zot_bibtex']) or "")[:250]
+    return fields
+
+
+def update_zotitems(objects):
+
+    """
+    writes the passed in changed ZotItem objects, comparing them with the stored rows and
+    updating only the columns that differ, with one bulk update per set of changed columns;
+    moves the facet counts from the stored to the new values
+    """
+
+    stored = ZotItem.objects.filter(zot_key__in=[x.zot_key for x in objects]).only(*CONTENT_FIELDS)
+    stored = {x.zot_key: x for x in stored}
+    groups = defaultdict(list)
+    for obj in objects:
+        old = stored.get(obj.zot_key)
+        fields = tuple(
+            x for x in CONTENT_FIELDS if old is None or getattr(old, x) != getattr(obj, x)
+        ) + ('content_hash',)
+        groups[fields].append(obj)
+    for fields, batch in groups.items():
+        ZotItem.objects.bulk_update(batch, list(fields))
+    facets.apply_changes(facets.count_changes(added=objects, removed=stored.values()))
+
+
+def upsert_zotitems(bibs, batch_size=None):
+
+    """
+    takes a list of dicts created by 'item_to_dict' and creates/updates the matching
+    ZotItem objects in batches of 'batch_size' items. The version and content hash of the
+    stored items of a batch are loaded first: unchanged items are skipped, changed ones only
+    get their changed columns updated and new ones are inserted (with INSERT ... ON CONFLICT
+    where the database supports it, in case a concurrent sync inserted them meanwhile).
+    Every batch is written in one transaction; returns the written ZotItem objects
+    """
+
+    batch_size = batch_size or BATCH_SIZE
+    objects = {}
+    with metrics.timer('convert'):
+        for x in bibs:
+            obj = ZotItem(zot_key=x['key'], **bib_to_fields(x))
+            obj.content_hash = obj.compute_content_hash()
+            objects[x['key']] = obj
+    objects = list(objects.values())
+    written = []
+    for i in range(0, len(objects), batch_size):
+        batch = objects[i:i + batch_size]
+        with metrics.timer('db'):
+            stored = {
+                key: (version, content_hash) for key, version, content_hash in
+                ZotItem.objects.filter(
+                    zot_key__in=[x.zot_key for x in batch]
+                ).values_list('zot_key', 'zot_version', 'content_hash')
+            }
+            new = [x for x in batch if x.zot_key not in stored]
+            changed = [
+                x for x in batch if x.zot_key in stored and
+                stored[x.zot_key] != (x.zot_version, x.content_hash)
+            ]
+            if new or changed:
+                with transaction.atomic():
+                    if new and connection.features.supports_update_conflicts_with_target:
+                        ZotItem.objects.bulk_create(
+                            new, update_conflicts=True,
+                            unique_fields=['zot_key'], update_fields=SYNC_FIELDS
+                        )
+                    elif new:
+                        ZotItem.objects.bulk_create(new)
+                    facets.apply_changes(facets.count_changes(added=new))
+                    if changed:
+                        update_zotitems(changed)
+        metrics.count('items', len(batch))
+        metrics.count('rows_inserted', len(new))
+        metrics.count('rows_updated', len(changed))
+        metrics.count('rows_unchanged', len(batch) - len(new) - len(changed))
+        if new or changed:
+            written.extend(new + changed)
+            invalidate()
+    return written
+
+
+def write_pages(pages, callback=None, batch_size=None, progress=None, checkpoint=None):
+
+    """
+    consumes an iterable of lists of dicts created by 'item_to_dict' and creates/updates the
+    ZotItem objects in batches of 'batch_size' items as soon as enough pages arrived, so memory
+    use does not grow with the number of pages; 'callback' is called with the list of saved
+    ZotItem objects after every batch, 'progress' with the result dict after every page and
+    batch and 'checkpoint' with the number of items of the consumed pages written so far
+    (unchanged ones included) once a batch is committed; returns a dict with keys 'error'
+    containing possible error-msgs, 'pages' the number of consumed pages, 'items' the number
+    of saved items and 'skipped' the number of items left alone as they did not change
+    """
+
+    batch_size = batch_size or BATCH_SIZE
+    result = {'error': None, 'pages': 0, 'items': 0, 'skipped': 0}
+    pending = []
+    done = 0
+
+    def flush(bibs):
+        nonlocal done
+        saved = upsert_zotitems(bibs, batch_size=batch_size)
+        result['items'] += len(saved)
+        result['skipped'] += len({x['key'] for x in bibs}) - len(saved)
+        done += len(bibs)
+        if checkpoint is not None:
+            checkpoint(done)
+        if callback is not None:
+            callback(saved)
+        if progress is not None:
+            progress(result)
+
+    try:
+        for bibs in pages:
+            result['pages'] += 1
+            metrics.count('pages')
+            if progress is not None:
+                progress(result)
+            pending.extend(bibs)
+            while len(pending) >= batch_size:
+                flush(pending[:batch_size])
+                pending = pending[batch_size:]
+        if pending:
+            flush(pending)
+    except Exception as e:
+        result['error'] = "{}".format(e)
+    return result
+
+
+def sync_items(
+    library_id, library_type, api_key, limit=None, since_version=None,
+    callback=None, batch_size=None, workers=None, progress=None, start=0, checkpoint=None
+):
+
+    """
+    fetches the library page by page from offset 'start' on and creates/updates the ZotItem
+    objects with 'write_pages' while the next pages are fetched; 'workers' is the number of
+    pages fetched concurrently; returns the result dict of 'write_pages'
+    """
+
+    return write_pages(
+        iter_bibs(
+            library_id, library_type, api_key, limit=limit, since_version=since_version,
+            workers=workers, start=start
+        ),
+        callback=callback, batch_size=batch_size, progress=progress, checkpoint=checkpoint
+    )
+
+
+def count_items(zot, since_version=None):
+
+    """ returns the number of top level items modified since 'since_version' (or of all) """
+
+    return fetch_page(zot, 0, 1, since_version)[1]
+
+
+def plan_sync(remote_versions, local_versions):
+
+    """
+    diffs the key->version map of the zotero library against the one of the stored items;
+    returns a dict with the lists of keys to 'insert', 'update' and 'delete'
+    """
+
+    plan = {'insert': [], 'update': [], 'delete': []}
+    for key, version in remote_versions.items():
+        if key not in local_versions:
+            plan['insert'].append(key)
+        elif local_versions[key] != version:
+            plan['update'].append(key)
+    plan['delete'] = [key for key in local_versions if key not in remote_versions]
+    return plan
+
+
+def fetch_deleted_keys(zot, since_version):
+
+    """ returns the keys of all items deleted from the library since 'since_version' """
+
+    return zot.deleted(since=since_version).get('items', [])
+
+
+def delete_zotitems(keys, batch_size=None):
+
+    """
+    deletes the ZotItem objects with the passed in keys in batches and updates the facet
+    counts; returns the number of deleted objects
+    """
+
+    batch_size = batch_size or BATCH_SIZE
+    deleted = 0
+    for i in range(0, len(keys), batch_size):
+        with metrics.timer('db'), transaction.atomic():
+            items = ZotItem.objects.filter(zot_key__in=keys[i:i + batch_size])
+            removed = list(items.values(*facets.FACETS.values()))
+            count, _ = items.delete()
+            facets.apply_changes(facets.count_changes(removed=removed))
+        deleted += count
+    metrics.count('rows_deleted', deleted)
+    if deleted:
+        invalidate()
+    return deleted
+
+
+def sync_library(
+    library_id, library_type, api_key, callback=None, batch_size=None, workers=None,
+    full=False, diff=False, dry_run=False, progress=None, resume=False
+):
+
+    """
+    brings the stored items up to date with the zotero library: fetches all items modified
+    since the library version stored in the library's SyncState (everything if there is none or
+    'full' is set), deletes the items removed from zotero since then and, if nothing failed,
+    stores the library version the sync started from along with timing and counts of the run.
+    With 'diff' set, the key->version map of the library is diffed against the stored items
+    instead and only new or changed items are fetched, see 'plan_sync'; 'dry_run' only
+    computes that plan without writing anything.
+    Unless 'full' is set, the sync returns right away without touching the database if zotero
+    reports the library as not modified since the stored version ('not_modified').
+    Crawls of the whole library store a checkpoint in the SyncState after every written batch,
+    the library version they started from and the number of items written. With 'resume' set,
+    an interrupted crawl continues from its checkpoint instead of starting over and then
+    fetches the items changed or deleted since its start ('resumed' holds the offset).
+    'progress' is called with a dict of the 'pages', saved 'items' and unchanged 'skipped'
+    items done so far and the 'total' number of items to fetch (None if unknown) while the
+    sync runs; getting the total costs one more request in the default mode.
+    Returns the dict of 'write_pages' extended by the keys 'deleted', 'version', 'not_modified'
+    and, in diff mode, 'plan'
+    """
+
+    state = SyncState.objects.filter(
+        library_id="{}".format(library_id), library_type=library_type
+    ).first() or SyncState(library_id="{}".format(library_id), library_type=library_type)
+    since = None if full else state.library_version
+    state.started = timezone.now()
+    started = time.time()
+    zot = get_zotero(library_id, library_type, api_key)
+    result = {
+        'error': None, 'pages': 0, 'items': 0, 'skipped': 0, 'deleted': 0, 'version': since,
+        'not_modified': False, 'resumed': None
+    }
+    total = None
+
+    def report(counts):
+        if progress is not None:
+            progress({
+                'pages': counts['pages'], 'items': counts['items'], 'skipped': counts['skipped'],
+                'total': total
+            })
+    try:
+        # items changed during the crawl are newer than this and picked up by the next sync
+        version = fetch_library_version(zot, since_version=since)
+    except Exception as e:
+        result['error'] = "{}".format(e)
+    else:
+        if version is None:
+            result['not_modified'] = True
+            return result
+    if result['error']:
+        pass
+    elif diff or dry_run:
         try:
-            items = zot.everything(zot.top())
-            bibtexs = zot.everything(zot.top(format='bibtex'))
+            remote_versions, version = fetch_versions(zot)
         except Exception as e:
-            error = "{}".format(e)
-            items = None
-            bibtexs = None
+            result['error'] = "{}".format(e)
+        else:
+            local_versions = dict(ZotItem.objects.values_list('zot_key', 'zot_version'))
+            plan = plan_sync(remote_versions, local_versions)
+            result['plan'] = plan
+            if dry_run:
+                return result
+            total = len(plan['insert']) + len(plan['update'])
+            result.update(write_pages(
+                (page_to_dicts(items) for items in fetch_pages_by_key(
+                    zot, plan['insert'] + plan['update']
+                )),
+                callback=callback, batch_size=batch_size, progress=report
+            ))
+            if not result['error']:
+                result['deleted'] = delete_zotitems(plan['delete'], batch_size=batch_size)
+    else:
+        start = 0
+        catch_up = None
 
-    result['items'] = items
-    result['error'] = error
-    result['bibtexs'] = bibtexs
-
-    if items:
-        bibs = []
-        c = 0
-        for x in items:
-            bib = {}
-            bib['key'] = "{}".format(x['data'].get('key'))
-            bib['creators'] = "{}".format(x['data'].get('creators'))
-            bib['date'] = "{}".format(x['data'].get('date'))
-            bib['itemType'] = "{}".format(x['data'].get('itemType'))
-            bib['title'] = "{}".format(x['data'].get('title'))
-            bib['publicationTitle'] = "{}".format(x['data'].get('publicationTitle'))
-            bib['dateModified'] = "{}".format(x['data'].get('dateModified'))
-            bib['pages'] = "{}".format(x['data'].get('pages'))
-            bib['version'] = "{}".format(x['data'].get('version'))
-            bib['version'] = "{}".format(x['data'].get('version'))
-            bib['zot_html_link'] = "{}".format(x['links']['alternate']['href'])
-            bib['zot_api_link'] = "{}".format(x['links']['self']['href'])
-            if len(bibtexs.entries) == len(items):
+        def checkpoint(done):
+            state.crawl_offset = start + done
+            state.save(update_fields=['crawl_offset'])
+        if since is None:
+            if resume and state.crawl_version is not None:
+                catch_up = state.crawl_version
                 try:
-                    bib['zot_bibtex'] = "{}".format(bibtexs.entries[c])
-                except IndexError:
-                    bib['zot_bibtex'] = ""
+                    deleted = fetch_deleted_keys(zot, catch_up)
+                except Exception as e:
+                    result['error'] = "{}".format(e)
+                else:
+                    # deleted items moved the ones after them to lower offsets
+                    start = max(0, state.crawl_offset - len(deleted))
+                    result['resumed'] = start
+            else:
+                state.crawl_version = version
+            if not result['error']:
+                state.crawl_offset = start
+                state.save()
+        if progress is not None and not result['error']:
+            try:
+                total = count_items(zot, since_version=since)
+            except Exception:
+                # the sync itself reports errors, the total is nice to have
+                pass
+            if total is not None:
+                total = max(0, total - start)
+        if not result['error']:
+            result.update(sync_items(
+                library_id, library_type, api_key, since_version=since,
+                callback=callback, batch_size=batch_size, workers=workers, progress=report,
+                start=start, checkpoint=checkpoint if since is None else None
+            ))
+        if catch_up is not None and not result['error']:
+            # the changes made since the interrupted crawl started
+            try:
+                result['deleted'] = delete_zotitems(deleted, batch_size=batch_size)
+            except Exception as e:
+                result['error'] = "{}".format(e)
             else:
-                bib['zot_bibtex'] = ""
-            bibs.append(bib)
-            c += 1
+                done = dict(result)
+                total = None
+                changed = sync_items(
+                    library_id, library_type, api_key, since_version=catch_up,
+                    callback=callback, batch_size=batch_size, workers=workers,
+                    progress=lambda counts: report({
+                        x: done[x] + counts[x] for x in ['pages', 'items', 'skipped']
+                    })
+                )
+                for x in ['pages', 'items', 'skipped']:
+                    result[x] += changed[x]
+                result['error'] = changed['error']
+        if since is None and not result['error']:
+            state.crawl_version = None
+            state.crawl_offset = 0
+        if since is not None and not result['error']:
+            try:
+                result['deleted'] = delete_zotitems(
+                    fetch_deleted_keys(zot, since), batch_size=batch_size
+                )
+            except Exception as e:
+                result['error'] = "{}".format(e)
+    if not result['error']:
+        result['version'] = version
+        state.library_version = version
+    state.ended = timezone.now()
+    state.duration = time.time() - started
+    state.pages = result['pages']
+    state.items_saved = result['items']
+    state.items_skipped = result['skipped']
+    state.items_deleted = result['deleted']
+    state.error = result['error'] or ""
+    state.save()
+    return result
+
+
+def items_to_dict(library_id, library_type, api_key, limit=15, since_version=None):
+
+    """
+    returns a dict with keys 'error' containing possible error-msgs,
+    'items' a list of fetched zotero items and
+    'bibs' a list of dicts ready for creating ZotItem objects;
+    holds the whole result in memory, use 'sync_items' or 'iter_bibs' for large libraries
+    """
 
+    zot = get_zotero(library_id, library_type, api_key)
+    result = {}
+    error = None
+    items = []
+    bibs = []
+    try:
+        for page in fetch_pages(zot, limit=limit, since_version=since_version):
+            items.extend(page)
+            bibs.extend(page_to_dicts(page))
+    except Exception as e:
+        error = "{}".format(e)
+
+    result['items'] = items
+    result['error'] = error
     result['bibs'] = bibs
     return result
 
 
+def backfill_bibtex(library_id, library_type, api_key, keys=None, batch_size=None, callback=None):
+
+    """
+    fetches the bibtex of all ZotItem objects without one (or of the ones with the passed in
+    'keys') with one request per 50 items and stores it with one bulk update per 'batch_size'
+    items; 'callback' is called with the number of updated items after every batch;
+    returns a dict with keys 'error' containing possible error-msgs,
+    'items' the number of updated items and 'missing' the keys zotero returned no bibtex for
+    """
+
+    batch_size = batch_size or BATCH_SIZE
+    if keys is None:
+        keys = list(ZotItem.objects.filter(zot_bibtex="").values_list('zot_key', flat=True))
+    result = {'error': None, 'items': 0, 'missing': []}
+    zot = get_zotero(library_id, library_type, api_key)
+
+    def flush(objects):
+        with metrics.timer('db'), transaction.atomic():
+            ZotItem.objects.bulk_update(
+                objects, ['zot_bibtex', 'citation_key'], batch_size=batch_size
+            )
+        metrics.count('rows_updated', len(objects))
+        invalidate()
+        result['items'] += len(objects)
+        if callback is not None:
+            callback(len(objects))
+
+    try:
+        for i in range(0, len(keys), batch_size):
+            batch = keys[i:i + batch_size]
+            bibtexs = {}
+            for fetched in fetch_bibtexs(zot, batch):
+                bibtexs.update(fetched)
+            result['missing'].extend(key for key in batch if not bibtexs.get(key))
+            flush([
+                ZotItem(zot_key=k, zot_bibtex=v, citation_key=(parse_citation_key(v) or "")[:250])
+                for k, v in bibtexs.items() if v
+            ])
+    except Exception as e:
+        result['error'] = "{}".format(e)
+    return result
+
+
+def backfill_dates(batch_size=None, callback=None):
+
+    """
+    parses the dates of all stored ZotItem objects again and stores the changed 'year' and
+    'date_sort' values with one bulk update per 'batch_size' checked items; 'callback' is
+    called with the number of updated items after every batch; returns a dict with keys
+    'error' containing possible error-msgs, 'items' the number of checked items and
+    'updated' the number of updated ones
+    """
+
+    batch_size = batch_size or BATCH_SIZE
+    result = {'error': None, 'items': 0, 'updated': 0}
+
+    def flush(objects, changes):
+        with metrics.timer('db'), transaction.atomic():
+            ZotItem.objects.bulk_update(objects, ['year', 'date_sort'])
+            facets.apply_changes(changes)
+        metrics.count('rows_updated', len(objects))
+        invalidate()
+        result['updated'] += len(objects)
+        if callback is not None:
+            callback(len(objects))
+
+    items = ZotItem.objects.order_by('zot_key').only('zot_key', 'zot_date', 'year', 'date_sort')
+    last_key = ""
+    try:
+        # pages by key instead of iterating over one cursor, the table is written meanwhile
+        while True:
+            batch = list(items.filter(zot_key__gt=last_key)[:batch_size])
+            if not batch:
+                break
+            last_key = batch[-1].zot_key
+            result['items'] += len(batch)
+            changed = []
+            changes = Counter()
+            for item in batch:
+                year, date = parse_date(item.zot_date)
+                date_sort = date_sort_key(date, item.zot_key)
+                if (year, date_sort) != (item.year, item.date_sort):
+                    changes[('year', facets.facet_value(item.year))] -= 1
+                    changes[('year', facets.facet_value(year))] += 1
+                    item.year, item.date_sort = year, date_sort
+                    changed.append(item)
+            if changed:
+                flush(changed, changes)
+    except Exception as e:
+        result['error'] = "{}".format(e)
+    metrics.count('items', result['items'])
+    return result
+
+
 def create_zotitem(bib_item, get_bibtex=False):
     """
     takes a dict with bib info created by 'items_to_dict'
-    and creates/updates a ZotItem object
+    and creates/updates a ZotItem object with 'upsert_zotitems', facet counts included;
+    pass more than a few items to 'upsert_zotitems' directly
     """
-    x = bib_item
-    temp_item, _ = ZotItem.objects.get_or_create(
-        zot_key=x['key']
-    )
-    temp_item.zot_creator = x['creators']
-    temp_item.zot_date = x['date']
-    temp_item.zot_item_type = x['itemType']
-    temp_item.zot_title = x['title']
-    temp_item.zot_pub_title = x['publicationTitle']
-    temp_item.date_modified = x['dateModified']
-    temp_item.zot_pages = x['pages']
-    temp_item.zot_version = x['version']
-    temp_item.zot_html_link = x['zot_html_link']
-    temp_item.zot_api_link = x['zot_api_link']
-    try:
-        temp_item.zot_bibtex = x['zot_bibtex']
-    except KeyError:
-        pass
+    upsert_zotitems([bib_item])
+    temp_item = ZotItem.objects.get(zot_key=bib_item['key'])
     if get_bibtex:
-        temp_item.save(get_bibtex=True)
-    else:
-        temp_item.save()
+        backfill_bibtex(
+            settings.Z_ID, settings.Z_LIBRARY_TYPE, settings.Z_API_KEY, keys=[temp_item.zot_key]
+        )
+        temp_item.refresh_from_db(fields=['zot_bibtex'])
     return temp_item
@@ -57,7 +57,7 @@ setup(
     ],
     include_package_data=True,
     install_requires=[
-        'pyzotero',
+        'pyzotero>=1.16',
         'djangorestframework',
         'django-autocomplete-light'
     ],
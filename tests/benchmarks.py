@@ -0,0 +1,159 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+benchmarks
+------------
+
+Runs `bib_import`, `bib_update` and the REST API list view against libraries of the fake
+zotero server and reports throughput, query counts, requests and peak memory:
+
+    make benchmark
+    BIB_BENCHMARK_SIZES=1000,10000,100000 python runtests.py tests.benchmarks
+
+Environment variables:
+
+    BIB_BENCHMARK_SIZES      library sizes, defaults to 1000,10000
+    BIB_BENCHMARK_LATENCY    seconds added to every zotero request, defaults to 0
+    BIB_BENCHMARK_OUTPUT     path the results are written to as JSON
+    BIB_BENCHMARK_BASELINE   JSON results of an earlier run; a scenario fails if its throughput
+                             dropped or its query count grew by more than the tolerance
+    BIB_BENCHMARK_TOLERANCE  defaults to 0.25
+
+Peak memory is traced with tracemalloc, which slows python down; compare throughput only
+between runs on the same machine.
+"""
+
+import json
+import os
+import sys
+import time
+import tracemalloc
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+
+from bib.models import SyncState, ZotItem
+from bib.zot_client import stats
+
+from .fake_zotero import FakeZoteroMixin
+
+SIZES = [int(x) for x in os.environ.get('BIB_BENCHMARK_SIZES', '1000,10000').split(',')]
+LATENCY = float(os.environ.get('BIB_BENCHMARK_LATENCY', 0))
+OUTPUT = os.environ.get('BIB_BENCHMARK_OUTPUT')
+BASELINE = os.environ.get('BIB_BENCHMARK_BASELINE')
+TOLERANCE = float(os.environ.get('BIB_BENCHMARK_TOLERANCE', 0.25))
+
+RESULTS = []
+
+
+class Measurement(object):
+
+    """ context manager measuring time, database queries, zotero requests and peak memory """
+
+    def __init__(self, scenario, size, items):
+        self.result = {'scenario': scenario, 'size': size, 'items': items}
+
+    def count_query(self, execute, sql, params, many, context):
+        self.queries += 1
+        return execute(sql, params, many, context)
+
+    def __enter__(self):
+        self.queries = 0
+        self.wrapper = connection.execute_wrapper(self.count_query)
+        self.wrapper.__enter__()
+        self.requests = stats()['requests']
+        tracemalloc.start()
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        seconds = time.perf_counter() - self.started
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        self.wrapper.__exit__(*args)
+        self.result.update({
+            'seconds': round(seconds, 3),
+            'items_per_second': round(self.result['items'] / seconds, 1) if seconds else None,
+            'queries': self.queries,
+            'requests': stats()['requests'] - self.requests,
+            'peak_mb': round(peak / 1024 / 1024, 1),
+        })
+        RESULTS.append(self.result)
+
+
+def load_baseline():
+    if not BASELINE:
+        return {}
+    with open(BASELINE) as f:
+        return {(x['scenario'], x['size']): x for x in json.load(f)}
+
+
+def report():
+    columns = ['scenario', 'size', 'items', 'seconds', 'items_per_second', 'queries', 'requests',
+               'peak_mb']
+    lines = [" ".join("{:>18}".format(x) for x in columns)]
+    for result in RESULTS:
+        lines.append(" ".join("{:>18}".format("{}".format(result[x])) for x in columns))
+    sys.stderr.write("\n" + "\n".join(lines) + "\n")
+    if OUTPUT:
+        with open(OUTPUT, 'w') as f:
+            json.dump(RESULTS, f, indent=2)
+
+
+def tearDownModule():
+    report()
+
+
+class SyncBenchmark(FakeZoteroMixin, TestCase):
+
+    library_size = None
+    server_options = {'latency': LATENCY}
+
+    def check_baseline(self, size):
+        baseline = load_baseline()
+        for result in [x for x in RESULTS if x['size'] == size]:
+            expected = baseline.get((result['scenario'], result['size']))
+            if expected is None:
+                continue
+            if expected['items_per_second'] and result['items_per_second']:
+                self.assertGreaterEqual(
+                    result['items_per_second'], expected['items_per_second'] * (1 - TOLERANCE),
+                    "{scenario} of {size} items got slower".format(**result)
+                )
+            self.assertLessEqual(
+                result['queries'], expected['queries'] * (1 + TOLERANCE) + 1,
+                "{scenario} of {size} items runs more queries".format(**result)
+            )
+
+    def run_size(self, size):
+        ZotItem.objects.all().delete()
+        SyncState.objects.all().delete()
+        cache.clear()
+        self.serve_library(size)
+        with Measurement('bib_import', size, size):
+            call_command('bib_import', stdout=StringIO())
+
+        changed = [self.library.key(i) for i in range(0, size, 10)]
+        deleted = [self.library.key(i) for i in range(5, size, 100)]
+        self.library.update(changed)
+        self.library.delete(deleted)
+        with Measurement('bib_update', size, len(changed) + len(deleted)):
+            call_command('bib_update', stdout=StringIO())
+        with Measurement('bib_update unmodified', size, 0):
+            call_command('bib_update', stdout=StringIO())
+
+        for scenario in ['api list', 'api list cached']:
+            with Measurement(scenario, size, size - len(deleted)):
+                url = '/api/zotitems/?page_size=100'
+                while url:
+                    url = self.client.get(url).json()['next']
+        self.check_baseline(size)
+
+    def test_sizes(self):
+        for size in SIZES:
+            with self.subTest(size=size):
+                self.run_size(size)
@@ -0,0 +1,325 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+fake_zotero
+------------
+
+A local stand-in for the parts of the Zotero Web API v3 the bib app uses, serving a
+synthetic library over HTTP; point settings.Z_ENDPOINT at it.
+
+    python -m tests.fake_zotero --items 10000 --port 8085 --latency 0.05 --rate-limit-every 50
+"""
+
+import argparse
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlencode, urlparse
+
+ITEM_TYPES = ['book', 'journalArticle', 'bookSection', 'thesis', 'report']
+FIRST_NAMES = ['Jane', 'John', 'Maria', 'Ludwig', 'Eva', 'Karl', 'Anna', 'Theodor']
+LAST_NAMES = ['Doe', 'Huber', 'Gruber', 'Wagner', 'Mayr', 'Novak', 'Schmid', 'Berger']
+WORDS = [
+    'roman', 'noricum', 'settlement', 'archaeology', 'danube', 'limes', 'coins', 'burial',
+    'inscriptions', 'villa', 'pottery', 'survey', 'medieval', 'castle', 'monastery', 'charter',
+]
+# items sharing a version, as written by one zotero write request
+ITEMS_PER_VERSION = 10
+
+
+class FakeLibrary(object):
+
+    """
+    A synthetic zotero library of 'size' top level items; items are generated from their
+    index on request, so even large libraries take little memory. 'update' and 'delete'
+    change the library like zotero clients would, bumping the library version.
+    """
+
+    def __init__(self, size, library_id='1', library_type='groups'):
+        self.size = size
+        self.library_id = library_id
+        self.library_type = library_type
+        self.lock = threading.Lock()
+        self.changed = {}
+        self.deleted = {}
+        self.version = self.base_version(size - 1) if size else 0
+        self._since = {}
+
+    def key(self, index):
+        return "K{:07d}".format(index)
+
+    def index(self, key):
+        match = re.match(r'^K(\d{7})$', key)
+        if match and int(match.group(1)) < self.size:
+            return int(match.group(1))
+        return None
+
+    def base_version(self, index):
+        return 1 + index // ITEMS_PER_VERSION
+
+    def item_version(self, index):
+        return self.changed.get(index, self.base_version(index))
+
+    def update(self, keys):
+        """ marks the items with 'keys' as modified by a new library version """
+        with self.lock:
+            self.version += 1
+            for key in keys:
+                self.changed[self.index(key)] = self.version
+            self._since = {}
+        return self.version
+
+    def delete(self, keys):
+        with self.lock:
+            self.version += 1
+            for key in keys:
+                self.deleted[key] = self.version
+            self._since = {}
+        return self.version
+
+    def top(self, since=None):
+        """ returns the indices of the items modified after version 'since', cached """
+        with self.lock:
+            if since not in self._since:
+                self._since[since] = [
+                    i for i in range(self.size)
+                    if self.key(i) not in self.deleted and (
+                        since is None or self.item_version(i) > since
+                    )
+                ]
+            return self._since[since]
+
+    def item(self, index, include=('data',)):
+        key = self.key(index)
+        version = self.item_version(index)
+        words = [WORDS[(index * 7 + n) % len(WORDS)] for n in range(3 + index % 5)]
+        creators = [
+            {
+                'creatorType': 'author',
+                'firstName': FIRST_NAMES[(index + n) % len(FIRST_NAMES)],
+                'lastName': LAST_NAMES[(index * 3 + n) % len(LAST_NAMES)],
+            } for n in range(1 + index % 3)
+        ]
+        year = 1800 + index % 220
+        base = "/{}/{}/items/{}".format(self.library_type, self.library_id, key)
+        result = {
+            'key': key,
+            'version': version,
+            'library': {'type': self.library_type[:-1], 'id': int(self.library_id)},
+            'links': {
+                'self': {'href': 'https://api.zotero.org{}'.format(base)},
+                'alternate': {'href': 'https://www.zotero.org{}'.format(base)},
+            },
+            'meta': {'numChildren': 0},
+        }
+        if 'data' in include:
+            result['data'] = {
+                'key': key,
+                'version': version,
+                'itemType': ITEM_TYPES[index % len(ITEM_TYPES)],
+                'title': " ".join(words).capitalize(),
+                'creators': creators,
+                'date': "{}".format(year),
+                'publicationTitle': 'Journal of {}'.format(WORDS[index % len(WORDS)].capitalize()),
+                'pages': "{}-{}".format(index % 300, index % 300 + 20),
+                'dateModified': '2018-07-05T09:25:{:02d}Z'.format(index % 60),
+                'tags': [],
+                'collections': [],
+                'relations': {},
+            }
+        if 'bibtex' in include:
+            result['bibtex'] = self.bibtex(index, creators, words, year)
+        return result
+
+    def bibtex(self, index, creators, words, year):
+        authors = " and ".join(
+            "{}, {}".format(x['lastName'], x['firstName']) for x in creators
+        )
+        return (
+            "\n@article{{{}_{}_{},\n"
+            "\ttitle = {{{}}},\n"
+            "\tauthor = {{{}}},\n"
+            "\tjournal = {{Journal of {}}},\n"
+            "\tyear = {{{}}},\n"
+            "\tpages = {{{}--{}}},\n"
+            "}}\n"
+        ).format(
+            creators[0]['lastName'].lower(), words[0], year, " ".join(words).capitalize(),
+            authors, WORDS[index % len(WORDS)].capitalize(), year, index % 300, index % 300 + 20
+        )
+
+
+class FakeZoteroHandler(BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        server = self.server
+        library = server.library
+        number = server.count()
+        if server.latency:
+            time.sleep(server.latency)
+        if server.rate_limit_every and number % server.rate_limit_every == 0:
+            return self.send(429, {'message': 'Too many requests'}, {
+                'Retry-After': "{}".format(server.retry_after)
+            })
+        url = urlparse(self.path)
+        params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        prefix = "/{}/{}".format(library.library_type, library.library_id)
+        if not url.path.startswith(prefix):
+            return self.send(404, {'message': 'Not found'})
+        path = url.path[len(prefix):]
+        since = params.get('since')
+        since = int(since) if since else None
+        condition = self.headers.get('If-Modified-Since-Version')
+        if condition and int(condition) >= library.version:
+            return self.send(304, None)
+        include = params.get('include', 'data').split(',')
+        if path == '/items/top':
+            return self.send_items(library.top(since), params, include)
+        if path == '/items':
+            keys = params.get('itemKey', '').split(',')
+            indices = [library.index(x) for x in keys]
+            return self.send_items([x for x in indices if x is not None], params, include)
+        if path == '/deleted':
+            keys = [k for k, v in library.deleted.items() if since is None or v > since]
+            return self.send(200, {
+                'items': keys, 'collections': [], 'searches': [], 'tags': [], 'settings': []
+            })
+        match = re.match(r'^/items/([A-Z0-9]+)$', path)
+        if match and library.index(match.group(1)) is not None:
+            return self.send(200, library.item(library.index(match.group(1)), include))
+        return self.send(404, {'message': 'Not found'})
+
+    def send_items(self, indices, params, include):
+        library = self.server.library
+        if params.get('format') in ('versions', 'keys'):
+            if params.get('limit'):
+                indices = indices[:int(params['limit'])]
+            if params['format'] == 'keys':
+                body = "\n".join(library.key(i) for i in indices)
+                return self.send(200, body, {'Total-Results': str(len(indices))}, 'text/plain')
+            return self.send(200, {library.key(i): library.item_version(i) for i in indices})
+        start = int(params.get('start', 0))
+        limit = min(int(params.get('limit') or 25), 100)
+        page = indices[start:start + limit]
+        headers = {'Total-Results': str(len(indices))}
+        if start + limit < len(indices):
+            query = dict(params, start=start + limit, limit=limit)
+            headers['Link'] = '<{}{}?{}>; rel="next"'.format(
+                self.server.url, urlparse(self.path).path, urlencode(query)
+            )
+        return self.send(200, [library.item(i, include) for i in page], headers)
+
+    def send(self, status, body, headers=None, content_type='application/json'):
+        data = b'' if body is None else (
+            body if isinstance(body, str) else json.dumps(body)
+        ).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Last-Modified-Version', str(self.server.library.version))
+        if body is not None:
+            self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class FakeZoteroServer(ThreadingHTTPServer):
+
+    """
+    Serves a FakeLibrary on 127.0.0.1; 'latency' seconds are added to every request and every
+    'rate_limit_every'th request is answered with a '429 Too Many Requests' asking to retry after
+    'retry_after' seconds. Use as context manager or call 'start' and 'stop'.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, library, port=0, latency=0, rate_limit_every=0, retry_after=0.01):
+        super(FakeZoteroServer, self).__init__(('127.0.0.1', port), FakeZoteroHandler)
+        self.library = library
+        self.latency = latency
+        self.rate_limit_every = rate_limit_every
+        self.retry_after = retry_after
+        self.requests = 0
+        self.lock = threading.Lock()
+        self.url = "http://127.0.0.1:{}".format(self.server_address[1])
+
+    def count(self):
+        """ counts a request, returns its number """
+        with self.lock:
+            self.requests += 1
+            return self.requests
+
+    def start(self):
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+
+class FakeZoteroMixin(object):
+
+    """
+    TestCase mixin serving a FakeLibrary of 'library_size' items as the library of
+    settings.Z_ID to the zotero clients of the bib app during each test;
+    'self.library' and 'self.server' are fresh for every test
+    """
+
+    library_size = 100
+    server_options = {}
+
+    def setUp(self):
+        super(FakeZoteroMixin, self).setUp()
+        if self.library_size is not None:
+            self.serve_library(self.library_size)
+
+    def serve_library(self, size):
+        from unittest import mock
+        from django.conf import settings
+        from bib import zot_client
+
+        self.library = FakeLibrary(size, library_id=settings.Z_ID)
+        self.server = FakeZoteroServer(self.library, **self.server_options).start()
+        patcher = mock.patch.object(zot_client, 'ENDPOINT', self.server.url)
+        patcher.start()
+        zot_client.reset()
+        self.addCleanup(zot_client.reset)
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self.server.stop)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serves a synthetic zotero library")
+    parser.add_argument('--items', type=int, default=1000)
+    parser.add_argument('--port', type=int, default=8085)
+    parser.add_argument('--library-id', default='1')
+    parser.add_argument('--latency', type=float, default=0)
+    parser.add_argument('--rate-limit-every', type=int, default=0)
+    args = parser.parse_args()
+    server = FakeZoteroServer(
+        FakeLibrary(args.items, args.library_id), port=args.port, latency=args.latency,
+        rate_limit_every=args.rate_limit_every
+    )
+    print("serving {} items of groups/{} on {}".format(args.items, args.library_id, server.url))
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
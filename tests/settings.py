@@ -22,12 +22,26 @@ INSTALLED_APPS = [
     "django.contrib.auth",
     "django.contrib.contenttypes",
     "django.contrib.sites",
+    "dal",
+    "dal_select2",
+    "rest_framework",
     "bib",
 ]
 
 SITE_ID = 1
 
+TEMPLATES = [
+    {
+        "BACKEND": "django.template.backends.django.DjangoTemplates",
+        "APP_DIRS": True,
+    },
+]
+
 if django.VERSION >= (1, 10):
     MIDDLEWARE = ()
 else:
     MIDDLEWARE_CLASSES = ()
+
+Z_ID = "12345"
+Z_LIBRARY_TYPE = "group"
+Z_API_KEY = "test"
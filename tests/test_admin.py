@@ -0,0 +1,37 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_acdh-django-zotero
+------------
+
+Tests for `acdh-django-zotero` admin module.
+"""
+
+from django.core import checks
+from django.test import SimpleTestCase, override_settings
+
+from .settings import INSTALLED_APPS, TEMPLATES
+
+
+@override_settings(
+    INSTALLED_APPS=INSTALLED_APPS + [
+        'django.contrib.admin', 'django.contrib.messages', 'django.contrib.sessions'
+    ],
+    TEMPLATES=[dict(TEMPLATES[0], OPTIONS={'context_processors': [
+        'django.template.context_processors.request',
+        'django.contrib.auth.context_processors.auth',
+        'django.contrib.messages.context_processors.messages',
+    ]})],
+    MIDDLEWARE=[
+        'django.contrib.sessions.middleware.SessionMiddleware',
+        'django.contrib.auth.middleware.AuthenticationMiddleware',
+        'django.contrib.messages.middleware.MessageMiddleware',
+    ],
+)
+class TestAdmin(SimpleTestCase):
+
+    def test_system_checks(self):
+        # admin.site needs the admin app, so the model admins are registered in here
+        import bib.admin  # noqa: F401
+        self.assertEqual(checks.run_checks(tags=[checks.Tags.admin]), [])
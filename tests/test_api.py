@@ -0,0 +1,155 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_acdh-django-zotero
+------------
+
+Tests for `acdh-django-zotero` api_views module.
+"""
+
+from django.core.cache import cache
+from django.test import TestCase
+
+from bib.models import SyncState, ZotItem
+from bib.zot_utils import upsert_zotitems
+
+
+class TestZotItemViewSet(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        for i in range(3):
+            ZotItem.objects.create(
+                zot_key='K{}'.format(i), zot_title='Title {}'.format(i), zot_version=i,
+                zot_creator=[{'firstName': 'Jane', 'lastName': 'Doe'}],
+                zot_bibtex='@book{{k{},\n title = {{Title}}\n}}'.format(i) * 50
+            )
+
+    def keys(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return [x['zot_key'] for x in response.json()['results']]
+
+    def test_list_is_slim(self):
+        # the sync state for the ETag and the items
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/zotitems/')
+        self.assertEqual(response.status_code, 200)
+        item = response.json()['results'][0]
+        self.assertNotIn('zot_bibtex', item)
+        self.assertNotIn('zot_creator', item)
+        self.assertEqual(item['zot_label'], 'Jane Doe: Title 0')
+
+    def test_cursor_pagination_by_version(self):
+        response = self.client.get('/api/zotitems/?page_size=2').json()
+        self.assertEqual([x['zot_key'] for x in response['results']], ['K0', 'K1'])
+        self.assertEqual(self.keys(response['next']), ['K2'])
+
+    def test_filters(self):
+        ZotItem.objects.filter(zot_key='K1').update(zot_item_type='journalArticle', year=1999)
+        self.assertEqual(self.keys('/api/zotitems/?since_version=0'), ['K1', 'K2'])
+        self.assertEqual(self.keys('/api/zotitems/?key=K0,K2'), ['K0', 'K2'])
+        self.assertEqual(self.keys('/api/zotitems/?item_type=journalArticle'), ['K1'])
+        self.assertEqual(self.keys('/api/zotitems/?year=1999'), ['K1'])
+        response = self.client.get('/api/zotitems/?year=late')
+        self.assertEqual(response.status_code, 400)
+
+    def test_resolve(self):
+        ZotItem.objects.filter(zot_key='K2').update(citation_key='doe_1998')
+        response = self.client.get('/api/zotitems/resolve/?key=K0,doe_1998,nope')
+        self.assertEqual(response.status_code, 200)
+        results = response.json()['results']
+        self.assertEqual(results['K0']['zot_key'], 'K0')
+        self.assertEqual(results['doe_1998']['zot_key'], 'K2')
+        self.assertIsNone(results['nope'])
+        response = self.client.post(
+            '/api/zotitems/resolve/?fields=zot_key', {'keys': ['K1']},
+            content_type='application/json'
+        )
+        self.assertEqual(response.json()['results'], {'K1': {'zot_key': 'K1'}})
+        response = self.client.post(
+            '/api/zotitems/resolve/', {'keys': 'K1'}, content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_year_range_and_chronological_order(self):
+        for key, year in [('K0', 1871), ('K1', 1850), ('K2', 1999)]:
+            item = ZotItem.objects.get(zot_key=key)
+            item.zot_date = "{}".format(year)
+            item.save()
+        self.assertEqual(self.keys('/api/zotitems/?year_from=1851'), ['K0', 'K2'])
+        self.assertEqual(self.keys('/api/zotitems/?year_from=1850&year_to=1871'), ['K0', 'K1'])
+        self.assertEqual(self.keys('/api/zotitems/?ordering=date'), ['K1', 'K0', 'K2'])
+        response = self.client.get('/api/zotitems/?ordering=-date&page_size=2').json()
+        self.assertEqual([x['zot_key'] for x in response['results']], ['K2', 'K0'])
+        self.assertEqual(self.keys(response['next']), ['K1'])
+        response = self.client.get('/api/zotitems/?ordering=title')
+        self.assertEqual(response.status_code, 400)
+
+    def test_sparse_fields(self):
+        response = self.client.get('/api/zotitems/?fields=zot_key,zot_bibtex')
+        item = response.json()['results'][0]
+        self.assertEqual(sorted(item), ['zot_bibtex', 'zot_key'])
+        response = self.client.get('/api/zotitems/K1/?fields=zot_title')
+        self.assertEqual(response.json(), {'zot_title': 'Title 1'})
+        response = self.client.get('/api/zotitems/?fields=nope')
+        self.assertEqual(response.status_code, 400)
+
+    def test_detail_is_complete(self):
+        response = self.client.get('/api/zotitems/K1/')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json()['zot_bibtex'].startswith('@book{k1'))
+
+    def test_conditional_list(self):
+        response = self.client.get('/api/zotitems/')
+        etag = response['ETag']
+        self.assertTrue(response.has_header('Last-Modified'))
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/zotitems/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        response = self.client.get(
+            '/api/zotitems/', HTTP_IF_MODIFIED_SINCE=response['Last-Modified']
+        )
+        self.assertEqual(response.status_code, 304)
+        # a sync changes the library version
+        SyncState.objects.create(library_id='12345', library_type='group', library_version=7)
+        response = self.client.get('/api/zotitems/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_conditional_detail(self):
+        etag = self.client.get('/api/zotitems/K1/')['ETag']
+        response = self.client.get('/api/zotitems/K1/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        response = self.client.get('/api/zotitems/K1/?fields=zot_key', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get('/api/zotitems/K9/')
+        self.assertEqual(response.status_code, 404)
+
+    def test_responses_are_cached_until_the_next_write(self):
+        self.client.get('/api/zotitems/')
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/zotitems/')
+        self.assertEqual(len(response.json()['results']), 3)
+        upsert_zotitems([{
+            'key': 'K3', 'creators': [], 'date': '', 'itemType': 'book', 'title': 'New',
+            'publicationTitle': '', 'dateModified': '', 'pages': '', 'version': 9,
+            'zot_html_link': '', 'zot_api_link': '',
+        }])
+        response = self.client.get('/api/zotitems/')
+        self.assertEqual(len(response.json()['results']), 4)
+
+
+class TestZotItemLabel(TestCase):
+
+    def test_str_uses_label_without_loading_bibtex(self):
+        ZotItem.objects.create(
+            zot_key='K0', zot_title='Title', zot_pub_title='Journal', zot_bibtex='@book{k0}'
+        )
+        with self.assertNumQueries(1):
+            labels = [str(x) for x in ZotItem.objects.for_list()]
+        self.assertEqual(labels, ['N.N.: Title; Journal'])
+
+    def test_year_is_parsed_from_date(self):
+        item = ZotItem.objects.create(zot_key='K0', zot_date='Spring 1871')
+        self.assertEqual(item.year, 1871)
@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_acdh-django-zotero
+------------
+
+Tests for `acdh-django-zotero` citations module.
+"""
+
+from django.core.cache import cache
+from django.template import Context, Template
+from django.test import TestCase
+
+from bib import resolver
+from bib.citations import find_citations, replace_citations
+from bib.models import ZotItem
+
+
+class TestCitations(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        resolver.item_cache.clear()
+        for i, name in enumerate(['Doe', 'Huber']):
+            ZotItem.objects.create(
+                zot_key='K{}'.format(i), zot_date='1998',
+                zot_creator=[{'firstName': 'Jane', 'lastName': name}],
+                zot_html_link='https://www.zotero.org/groups/1/items/K{}'.format(i),
+                zot_bibtex='\n@book{{{}_1998,\n title = {{Title}}\n}}\n'.format(name.lower())
+            )
+
+    def test_citation_key_is_extracted(self):
+        self.assertEqual(ZotItem.objects.get(zot_key='K0').citation_key, 'doe_1998')
+
+    def test_find_citations(self):
+        text = (
+            r"As \cite{doe_1998} and \citep[see][p. 3]{huber_1998, K0} show, "
+            "[see @doe_1998, p. 4; -@huber_1998] mail me at [a@b]."
+        )
+        self.assertEqual(
+            find_citations(text),
+            ['doe_1998', 'huber_1998', 'K0', 'doe_1998', 'huber_1998']
+        )
+
+    def test_replace_citations_with_one_query(self):
+        text = r"<b>x</b> \cite{doe_1998} \parencite{huber_1998,K0} \cite{unknown}" * 50
+        with self.assertNumQueries(1):
+            html = replace_citations(text)
+        self.assertEqual(html.count('<a href="https://www.zotero.org/groups/1/items/K0">'), 100)
+        self.assertIn('>Huber 1998</a>; <a href', html)
+        self.assertIn(r"\cite{unknown}", html)
+        self.assertIn("&lt;b&gt;x&lt;/b&gt;", html)
+
+    def test_bib_cite_filter(self):
+        template = Template("{% load bib_extras %}{{ text|bib_cite }}")
+        html = template.render(Context({'text': "see [@huber_1998]"}))
+        self.assertEqual(
+            html, 'see <a href="https://www.zotero.org/groups/1/items/K1">Huber 1998</a>'
+        )
@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_acdh-django-zotero
+------------
+
+Tests for `acdh-django-zotero` export module.
+"""
+
+import gzip
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase
+
+from bib import zot_utils
+from bib.export import export_items
+from bib.models import ZotItem
+
+from .test_zot_utils import make_item
+
+
+class TestExport(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        items = [make_item('K{}'.format(i)) for i in range(5)]
+        items[1]['data'].update({'itemType': 'journalArticle', 'date': '1871-03-02'})
+        del items[2]['bibtex']
+        zot_utils.upsert_zotitems(zot_utils.page_to_dicts(items))
+
+    def export(self, export_format, queryset=None, chunk_size=2):
+        queryset = ZotItem.objects.all() if queryset is None else queryset
+        return b"".join(export_items(queryset, export_format, chunk_size=chunk_size)).decode()
+
+    def test_bibtex(self):
+        bibtex = self.export('bibtex')
+        self.assertIn('@book{doe_K0,', bibtex)
+        self.assertIn('@misc{K2,\n\ttitle = {Title K2},\n\tauthor = {Doe, Jane},', bibtex)
+        self.assertEqual(bibtex.count('\n@'), 4)
+
+    def test_csl_json(self):
+        items = json.loads(self.export('csl-json'))
+        self.assertEqual([x['id'] for x in items], ['K0', 'K1', 'K2', 'K3', 'K4'])
+        self.assertEqual(items[1]['type'], 'article-journal')
+        self.assertEqual(items[1]['issued'], {'date-parts': [[1871, 3, 2]]})
+        self.assertEqual(items[0]['author'], [{'family': 'Doe', 'given': 'Jane'}])
+        self.assertEqual(json.loads(self.export('csl-json', ZotItem.objects.none())), [])
+
+    def test_ris(self):
+        ris = self.export('ris')
+        self.assertEqual(ris.count('ER  - '), 5)
+        self.assertIn('TY  - JOUR\nID  - K1\nTI  - Title K1\nAU  - Doe, Jane\nPY  - 1871\n'
+                      'DA  - 1871/03/02/\n', ris)
+
+    def test_streaming_endpoint(self):
+        response = self.client.get('/api/zotitems/export/ris/?year=1871')
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'application/x-research-info-systems; charset=utf-8')
+        ris = b"".join(response.streaming_content).decode()
+        self.assertEqual(ris.count('ER  - '), 1)
+        response = self.client.get('/api/zotitems/export/csl-json/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        items = json.loads(gzip.decompress(b"".join(response.streaming_content)))
+        self.assertEqual(len(items), 5)
+        response = self.client.get(
+            '/api/zotitems/export/csl-json/', HTTP_ACCEPT_ENCODING='gzip',
+            HTTP_IF_NONE_MATCH=response['ETag']
+        )
+        self.assertEqual(response.status_code, 304)
+        response = self.client.get('/api/zotitems/export/ris/?year=late')
+        self.assertEqual(response.status_code, 400)
+
+    def test_command(self):
+        out = StringIO()
+        call_command('bib_export', '--format', 'bibtex', '--key', 'K0', stdout=out)
+        self.assertTrue(out.getvalue().startswith('@book{doe_K0,'))
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'library.json.gz')
+            call_command('bib_export', '--format', 'csl-json', '--output', path)
+            with gzip.open(path) as f:
+                self.assertEqual(len(json.load(f)), 5)
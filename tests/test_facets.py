@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_acdh-django-zotero
+------------
+
+Tests for `acdh-django-zotero` facets module.
+"""
+
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase
+
+from bib import zot_utils
+from bib.facets import get_facets, rebuild_facets
+from bib.models import FacetCount, ZotItem
+
+from .test_zot_utils import make_item
+
+
+def make_bibs(count, version=1, **changes):
+    bibs = zot_utils.page_to_dicts(
+        [make_item('K{}'.format(i), version=version) for i in range(count)]
+    )
+    for bib in bibs:
+        bib.update(changes)
+    return bibs
+
+
+class TestFacets(TestCase):
+
+    def stored(self):
+        return sorted(FacetCount.objects.values_list('facet', 'value', 'count'))
+
+    def rebuilt(self):
+        rebuild_facets()
+        return self.stored()
+
+    def test_counts_follow_inserts_updates_and_deletes(self):
+        zot_utils.upsert_zotitems(make_bibs(5), batch_size=2)
+        self.assertIn(('year', '1998', 5), self.stored())
+        bibs = make_bibs(2, version=2, date='1871', itemType='thesis')
+        zot_utils.upsert_zotitems(bibs)
+        zot_utils.delete_zotitems(['K4'])
+        counts = self.stored()
+        self.assertIn(('year', '1998', 2), counts)
+        self.assertIn(('year', '1871', 2), counts)
+        self.assertIn(('item_type', 'thesis', 2), counts)
+        self.assertEqual(counts, self.rebuilt())
+        zot_utils.delete_zotitems(['K0', 'K1'])
+        self.assertNotIn('1871', [v for f, v, n in self.stored()])
+
+    def test_backfill_dates_moves_year_counts(self):
+        zot_utils.upsert_zotitems(make_bibs(2))
+        ZotItem.objects.filter(zot_key='K0').update(zot_date='1871')
+        zot_utils.backfill_dates()
+        self.assertEqual(self.stored(), self.rebuilt())
+
+    def test_counts_follow_saves_and_deletes_of_single_items(self):
+        item = ZotItem.objects.create(zot_key='A', zot_date='1871', zot_item_type='book')
+        zot_utils.create_zotitem(make_bibs(1)[0])
+        self.assertIn(('year', '1871', 1), self.stored())
+        item.zot_date = '1998'
+        item.save()
+        self.assertIn(('year', '1998', 2), self.stored())
+        self.assertNotIn('1871', [v for f, v, n in self.stored()])
+        self.assertEqual(self.stored(), self.rebuilt())
+        item.delete()
+        ZotItem.objects.get(zot_key='K0').delete()
+        self.assertEqual(self.stored(), [])
+
+    def test_get_facets(self):
+        zot_utils.upsert_zotitems(make_bibs(3))
+        zot_utils.upsert_zotitems(make_bibs(1, version=2, date='1871'))
+        with self.assertNumQueries(1):
+            facets = get_facets(['year'], limit=1)
+        self.assertEqual(facets, {'year': [{'value': '1998', 'count': 2}]})
+
+    def test_api(self):
+        cache.clear()
+        zot_utils.upsert_zotitems(make_bibs(3))
+        response = self.client.get('/api/zotitems/facets/?facet=item_type')
+        self.assertEqual(response.json(), {'item_type': [{'value': 'book', 'count': 3}]})
+        etag = response['ETag']
+        response = self.client.get(
+            '/api/zotitems/facets/?facet=item_type', HTTP_IF_NONE_MATCH=etag
+        )
+        self.assertEqual(response.status_code, 304)
+        response = self.client.get('/api/zotitems/facets/?facet=color')
+        self.assertEqual(response.status_code, 400)
+
+    def test_rebuild_command(self):
+        zot_utils.upsert_zotitems(make_bibs(3))
+        FacetCount.objects.all().delete()
+        call_command('bib_rebuild_facets', stdout=StringIO())
+        self.assertIn(('item_type', 'book', 3), self.stored())
@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_acdh-django-zotero
+------------
+
+Syncs against the fake zotero server of `tests.fake_zotero`, through pyzotero and HTTP.
+"""
+
+from django.conf import settings
+from django.test import TestCase
+
+from bib.models import SyncState, ZotItem
+from bib.zot_client import stats
+from bib.zot_utils import sync_library
+
+from .fake_zotero import FakeZoteroMixin
+
+
+class TestSyncAgainstFakeZotero(FakeZoteroMixin, TestCase):
+
+    library_size = 250
+
+    def sync(self, **kwargs):
+        return sync_library(settings.Z_ID, 'group', 'key', **kwargs)
+
+    def test_full_and_incremental_sync(self):
+        result = self.sync()
+        self.assertIsNone(result['error'])
+        self.assertEqual(result['items'], 250)
+        self.assertEqual(result['version'], self.library.version)
+        item = ZotItem.objects.get(zot_key='K0000001')
+        self.assertTrue(item.zot_bibtex.startswith('@article{'))
+        self.assertEqual(item.year, 1801)
+
+        self.library.update(['K0000001', 'K0000002'])
+        self.library.delete(['K0000003'])
+        result = self.sync()
+        self.assertIsNone(result['error'])
+        self.assertEqual(result['items'], 2)
+        self.assertEqual(result['deleted'], 1)
+        self.assertEqual(ZotItem.objects.count(), 249)
+        self.assertEqual(SyncState.objects.get().library_version, self.library.version)
+
+        requests = self.server.requests
+        self.assertTrue(self.sync()['not_modified'])
+        self.assertEqual(self.server.requests, requests + 1)
+
+    def test_diff_sync(self):
+        self.sync()
+        self.library.update(['K0000010'])
+        result = self.sync(diff=True)
+        self.assertIsNone(result['error'])
+        self.assertEqual(result['plan']['update'], ['K0000010'])
+
+
+class TestRateLimitedFakeZotero(FakeZoteroMixin, TestCase):
+
+    library_size = 250
+    server_options = {'rate_limit_every': 2}
+
+    def test_sync_survives_rate_limiting(self):
+        result = sync_library(settings.Z_ID, 'group', 'key', workers=2)
+        self.assertIsNone(result['error'])
+        self.assertEqual(ZotItem.objects.count(), 250)
+        self.assertGreater(self.server.requests, stats()['requests'])
@@ -0,0 +1,248 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_acdh-django-zotero
+------------
+
+Tests for `acdh-django-zotero` file_import module.
+"""
+
+import gzip
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+
+from bib import file_import
+from bib.models import FacetCount, SyncState, ZotItem
+
+CSL_JSON = [
+    {
+        'id': 'http://zotero.org/groups/12345/items/ABCD2345',
+        'type': 'article-journal',
+        'title': 'Über die Donau',
+        'author': [{'family': 'Huber', 'given': 'Anna'}, {'literal': 'ÖAW'}],
+        'container-title': 'Journal',
+        'page': '1-10',
+        'issued': {'date-parts': [[1871, 3, 2]]},
+    },
+    {'id': '12345/EFGH6789', 'type': 'book', 'title': 'Book', 'issued': {'literal': 'Spring 1998'}},
+    {'id': 'local-1', 'type': 'book', 'title': 'No key'},
+]
+BIBTEX = """
+@comment{jabref-meta: databaseType:bibtex;}
+
+@article{huber_donau_1871,
+	title = {{\\"U}ber die {Donau}},
+	author = {Huber, Anna and {Austrian Academy and Sciences} and Max Mustermann},
+	journal = "Journal",
+	pages = {1--10},
+	year = 1871, month = mar,
+	url = {https://www.zotero.org/groups/12345/items/ABCD2345}
+}
+
+@book{doe_book_1998, title = {Book}, year = {1998}, note = {zotero://select/groups/12345/items/EFGH6789}}
+@book{nokey_1999,
+	title = {No key},
+}
+"""
+RDF = """<rdf:RDF
+ xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#"
+ xmlns:z="http://www.zotero.org/namespaces/export#"
+ xmlns:dc="http://purl.org/dc/elements/1.1/"
+ xmlns:dcterms="http://purl.org/dc/terms/"
+ xmlns:bib="http://purl.org/net/biblio#"
+ xmlns:foaf="http://xmlns.com/foaf/0.1/">
+    <bib:Article rdf:about="http://zotero.org/groups/12345/items/ABCD2345">
+        <z:itemType>journalArticle</z:itemType>
+        <dcterms:isPartOf>
+            <bib:Journal><dc:title>Journal</dc:title></bib:Journal>
+        </dcterms:isPartOf>
+        <bib:authors>
+            <rdf:Seq>
+                <rdf:li>
+                    <foaf:Person>
+                        <foaf:surname>Huber</foaf:surname>
+                        <foaf:givenName>Anna</foaf:givenName>
+                    </foaf:Person>
+                </rdf:li>
+            </rdf:Seq>
+        </bib:authors>
+        <dc:title>Über die Donau</dc:title>
+        <dc:date>1871-03-02</dc:date>
+        <bib:pages>1-10</bib:pages>
+    </bib:Article>
+    <z:Attachment rdf:about="#item_2">
+        <z:itemType>attachment</z:itemType>
+    </z:Attachment>
+    <bib:Book rdf:about="#item_3">
+        <z:itemType>book</z:itemType>
+        <dc:title>No key</dc:title>
+    </bib:Book>
+</rdf:RDF>
+"""
+
+
+UNKEYED_BIBTEX = """
+@article{jstor_1990, title = {Stable}, url = {https://www.jstor.org/stable/40375123}}
+@book{citekey_1991, title = {Key}, key = {ABCD2345}}
+@book{other_1992, title = {Other}, url = {https://example.org/groups/1/items/ABCD2345}}
+@book{words_1993, title = {Words}, note = {see zotero.org/groups/1/items/ABCD2345 soon}}
+"""
+UNKEYED_CSL_JSON = [
+    {'id': 'ITEM-1', 'type': 'book'},
+    {'id': 'ABCD2345', 'type': 'book'},
+    {'id': 'x', 'type': 'book', 'URL': 'https://www.jstor.org/stable/ABCD2345'},
+]
+
+
+class TestReaders(TestCase):
+
+    def read(self, reader, f):
+        unkeyed = []
+        return list(reader(f, '12345', 'group', None, unkeyed)), unkeyed
+
+    def test_json_array_is_read_in_pieces(self):
+        file_import.READ_SIZE, read_size = 7, file_import.READ_SIZE
+        try:
+            values = list(file_import.iter_json_array(StringIO(json.dumps(CSL_JSON, indent=1))))
+        finally:
+            file_import.READ_SIZE = read_size
+        self.assertEqual(values, CSL_JSON)
+        self.assertEqual(list(file_import.iter_json_array(StringIO(' [ ] '))), [])
+        with self.assertRaises(ValueError):
+            list(file_import.iter_json_array(StringIO('[{"id": 1},')))
+
+    def test_csl_json(self):
+        bibs, unkeyed = self.read(file_import.read_csl_json, StringIO(json.dumps(CSL_JSON)))
+        self.assertEqual([x['key'] for x in bibs], ['ABCD2345', 'EFGH6789'])
+        self.assertEqual(unkeyed, ['local-1'])
+        self.assertEqual(bibs[0]['itemType'], 'journalArticle')
+        self.assertEqual(bibs[0]['date'], '1871-03-02')
+        self.assertEqual(bibs[0]['creators'][1], {'creatorType': 'author', 'name': 'ÖAW'})
+        self.assertEqual(bibs[0]['zot_html_link'], 'https://www.zotero.org/groups/12345/items/ABCD2345')
+        self.assertEqual(bibs[1]['date'], 'Spring 1998')
+
+    def test_only_zotero_keys_are_taken(self):
+        bibs, unkeyed = self.read(file_import.read_bibtex, StringIO(UNKEYED_BIBTEX))
+        self.assertEqual(bibs, [])
+        self.assertEqual(unkeyed, ['jstor_1990', 'citekey_1991', 'other_1992', 'words_1993'])
+        bibs, unkeyed = self.read(file_import.read_csl_json, StringIO(json.dumps(UNKEYED_CSL_JSON)))
+        self.assertEqual(bibs, [])
+        self.assertEqual(unkeyed, ['ITEM-1', 'ABCD2345', 'x'])
+        self.assertEqual(file_import.find_key('zotero://select/items/1_ABCD2345'), 'ABCD2345')
+        self.assertEqual(file_import.find_key('https://zotero.org/users/1/items/40375123'), None)
+
+    def test_bibtex(self):
+        bibs, unkeyed = self.read(file_import.read_bibtex, StringIO(BIBTEX))
+        self.assertEqual([x['key'] for x in bibs], ['ABCD2345', 'EFGH6789'])
+        self.assertEqual(unkeyed, ['nokey_1999'])
+        self.assertEqual(bibs[0]['title'], 'Über die Donau')
+        self.assertEqual(bibs[0]['creators'], [
+            {'creatorType': 'author', 'firstName': 'Anna', 'lastName': 'Huber'},
+            {'creatorType': 'author', 'name': 'Austrian Academy and Sciences'},
+            {'creatorType': 'author', 'firstName': 'Max', 'lastName': 'Mustermann'},
+        ])
+        self.assertEqual(bibs[0]['publicationTitle'], 'Journal')
+        self.assertEqual(bibs[0]['pages'], '1-10')
+        self.assertEqual(bibs[0]['date'], '1871-03')
+        self.assertTrue(bibs[0]['zot_bibtex'].startswith('@article{huber_donau_1871,'))
+        self.assertTrue(bibs[0]['zot_bibtex'].endswith('}'))
+
+    def test_rdf(self):
+        bibs, unkeyed = self.read(file_import.read_rdf, StringIO(RDF))
+        self.assertEqual([x['key'] for x in bibs], ['ABCD2345'])
+        self.assertEqual(unkeyed, ['#item_3'])
+        self.assertEqual(bibs[0]['creators'], [
+            {'creatorType': 'author', 'firstName': 'Anna', 'lastName': 'Huber'}
+        ])
+        self.assertEqual(bibs[0]['publicationTitle'], 'Journal')
+        self.assertEqual(bibs[0]['date'], '1871-03-02')
+
+
+class TestImportFile(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.tmp = directory.name
+
+    def write(self, name, text):
+        path = os.path.join(self.tmp, name)
+        opener = gzip.open if name.endswith('.gz') else open
+        with opener(path, 'wt', encoding='utf-8') as f:
+            f.write(text)
+        return path
+
+    def test_import_bibtex(self):
+        result = file_import.import_file(self.write('library.bib', BIBTEX), batch_size=1)
+        self.assertEqual(
+            (result['error'], result['items'], result['unkeyed']), (None, 2, ['nokey_1999'])
+        )
+        item = ZotItem.objects.get(zot_key='ABCD2345')
+        self.assertEqual(item.citation_key, 'huber_donau_1871')
+        self.assertEqual(item.year, 1871)
+        self.assertEqual(item.zot_api_link, 'https://api.zotero.org/groups/12345/items/ABCD2345')
+        self.assertEqual(FacetCount.objects.get(facet='year', value='1871').count, 1)
+        self.assertFalse(SyncState.objects.exists())
+        # importing the file again leaves the rows alone
+        result = file_import.import_file(self.write('library.bib', BIBTEX))
+        self.assertEqual((result['items'], result['existing']), (0, 2))
+        result = file_import.import_file(self.write('library.bib', BIBTEX), overwrite=True)
+        self.assertEqual((result['items'], result['skipped'], result['existing']), (0, 2, 0))
+
+    def test_stored_items_are_not_overwritten(self):
+        ZotItem.objects.create(
+            zot_key='ABCD2345', zot_title='Synced', zot_bibtex='@article{synced}', zot_version=50
+        )
+        path = self.write('library.json', json.dumps(CSL_JSON))
+        result = file_import.import_file(path, library_version=42)
+        self.assertEqual((result['items'], result['existing']), (1, 1))
+        item = ZotItem.objects.get(zot_key='ABCD2345')
+        self.assertEqual(
+            (item.zot_title, item.zot_bibtex, item.zot_version), ('Synced', '@article{synced}', 50)
+        )
+        result = file_import.import_file(path, library_version=42, overwrite=True)
+        self.assertEqual((result['items'], result['existing']), (1, 0))
+        item.refresh_from_db()
+        self.assertEqual((item.zot_title, item.zot_bibtex, item.zot_version), ('Über die Donau', '', None))
+
+    def test_library_version(self):
+        path = self.write('library.json.gz', json.dumps(CSL_JSON))
+        result = file_import.import_file(path, library_version=42)
+        self.assertEqual(result['items'], 2)
+        self.assertIsNone(ZotItem.objects.get(zot_key='EFGH6789').zot_version)
+        state = SyncState.objects.get(library_id='12345', library_type='group')
+        self.assertEqual((state.library_version, state.items_saved), (42, 2))
+
+    def test_parse_errors_are_reported(self):
+        result = file_import.import_file(self.write('library.json', '[{"id": "ABCD2345"'))
+        self.assertIn("delimiter", result['error'])
+        self.assertEqual(result['items'], 0)
+
+    def test_unknown_format(self):
+        with self.assertRaises(ValueError):
+            file_import.import_file(self.write('library.txt', ''))
+
+    def test_command(self):
+        out = StringIO()
+        path = self.write('library.rdf', RDF)
+        call_command('bib_import_file', path, '--library-version=42', stdout=out)
+        self.assertIn(
+            'saved 1 items, skipped 0 unchanged items, 0 items already stored and 1 items without '
+            'zotero key', out.getvalue()
+        )
+        self.assertEqual(ZotItem.objects.get(zot_key='ABCD2345').zot_item_type, 'journalArticle')
+        self.assertEqual(SyncState.objects.get(library_id='12345').library_version, 42)
+
+    def test_command_requires_library_version(self):
+        with self.assertRaises(CommandError):
+            call_command('bib_import_file', self.write('library.rdf', RDF), stdout=StringIO())
+        self.assertFalse(ZotItem.objects.exists())
@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_acdh-django-zotero
+------------
+
+Tests for `acdh-django-zotero` jobs module.
+"""
+
+import datetime
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.http import Http404
+from django.test import RequestFactory, TestCase
+from django.utils import timezone
+
+from bib import jobs, views, zot_client, zot_utils
+from bib.models import SyncJob, ZotItem
+
+from .test_zot_utils import FakeZotero, fake_library_version, make_item
+
+
+class TestSyncJobs(TestCase):
+
+    def run_next(self, zot):
+        with mock.patch.object(zot_utils, 'get_zotero', return_value=zot), \
+                mock.patch.object(zot_utils, 'fetch_library_version', fake_library_version):
+            return jobs.run_next_job('test')
+
+    def test_enqueue_shares_the_queued_job(self):
+        job = jobs.enqueue_sync('1', 'group')
+        self.assertEqual(jobs.enqueue_sync('1', 'group').pk, job.pk)
+        self.assertTrue(jobs.enqueue_sync('1', 'group', full=True).full)
+        self.assertNotEqual(jobs.enqueue_sync('2', 'group').pk, job.pk)
+        self.assertEqual(SyncJob.objects.count(), 2)
+
+    def test_no_overlapping_jobs_per_library(self):
+        first = jobs.enqueue_sync('1', 'group')
+        self.assertEqual(jobs.claim_job('a').pk, first.pk)
+        second = jobs.enqueue_sync('1', 'group')
+        self.assertNotEqual(second.pk, first.pk)
+        self.assertIsNone(jobs.claim_job('b'))
+        SyncJob.objects.filter(pk=first.pk).update(status=SyncJob.DONE)
+        self.assertEqual(jobs.claim_job('b').pk, second.pk)
+
+    def test_run_job_reports_progress(self):
+        jobs.enqueue_sync('1', 'group')
+        reports = []
+        zot = FakeZotero([make_item('K{}'.format(i), i + 1) for i in range(150)])
+        original = zot_utils.write_pages
+
+        def write_pages(*args, **kwargs):
+            progress = kwargs['progress']
+
+            def spy(counts):
+                progress(counts)
+                reports.append(SyncJob.objects.values_list('pages', 'items_total').get())
+            kwargs['progress'] = spy
+            return original(*args, **kwargs)
+
+        with mock.patch.object(zot_utils, 'write_pages', write_pages):
+            job = self.run_next(zot)
+        self.assertEqual(job.status, SyncJob.DONE)
+        self.assertEqual(job.items, 150)
+        self.assertEqual(job.pages, 2)
+        self.assertEqual(reports[0], (1, 150))
+        self.assertEqual(ZotItem.objects.count(), 150)
+
+    def test_failed_job(self):
+        jobs.enqueue_sync('1', 'group')
+        zot = FakeZotero([make_item('K0', 1)])
+        zot.top = mock.Mock(side_effect=Exception('boom'))
+        job = self.run_next(zot)
+        self.assertEqual(job.status, SyncJob.FAILED)
+        self.assertEqual(job.error, 'boom')
+
+    def test_stale_jobs_fail(self):
+        job = jobs.enqueue_sync('1', 'group')
+        jobs.claim_job('a')
+        SyncJob.objects.filter(pk=job.pk).update(
+            heartbeat=timezone.now() - datetime.timedelta(seconds=jobs.SYNC_JOB_TIMEOUT + 1)
+        )
+        self.assertEqual(jobs.fail_stale_jobs(), 1)
+        self.assertEqual(SyncJob.objects.get().error, 'worker lost')
+
+    def test_waiting_for_zotero_keeps_the_job_alive(self):
+        job = jobs.enqueue_sync('1', 'group')
+        job = jobs.claim_job('a')
+        stale = timezone.now() - datetime.timedelta(seconds=jobs.SYNC_JOB_TIMEOUT + 1)
+
+        def sync_library(*args, **kwargs):
+            SyncJob.objects.filter(pk=job.pk).update(heartbeat=stale)
+            # a long Retry-After backoff of the zotero client
+            with mock.patch.object(zot_client.time, 'sleep'), \
+                    mock.patch.object(jobs, 'HEARTBEAT_INTERVAL', 0):
+                zot_client.get_throttle('1', 'group').sleep(jobs.SYNC_JOB_TIMEOUT * 2)
+            self.assertEqual(jobs.fail_stale_jobs(), 0)
+            return {'error': None, 'pages': 0, 'items': 0, 'skipped': 0, 'deleted': 0,
+                    'not_modified': True}
+
+        with mock.patch.object(jobs, 'sync_library', sync_library):
+            job = jobs.run_job(job)
+        self.assertEqual(job.status, SyncJob.DONE)
+
+    def test_lost_job_is_not_finished(self):
+        job = jobs.enqueue_sync('1', 'group')
+        job = jobs.claim_job('a')
+
+        def sync_library(*args, **kwargs):
+            SyncJob.objects.filter(pk=job.pk).update(status=SyncJob.FAILED, error='worker lost')
+            return {'error': None, 'pages': 1, 'items': 5, 'skipped': 0, 'deleted': 0,
+                    'not_modified': False}
+
+        with mock.patch.object(jobs, 'sync_library', sync_library):
+            job = jobs.run_job(job)
+        self.assertEqual((job.status, job.error, job.items), (SyncJob.FAILED, 'worker lost', 0))
+
+    def test_eta(self):
+        now = timezone.now()
+        job = SyncJob(
+            status=SyncJob.RUNNING, started=now - datetime.timedelta(seconds=10), heartbeat=now,
+            items=100, items_total=300
+        )
+        self.assertAlmostEqual(job.eta, 20)
+
+    def test_progress_view(self):
+        job = jobs.enqueue_sync('1', 'group')
+        request = RequestFactory().get('/synczotero/jobs/{}'.format(job.pk))
+        request.user = User.objects.create_user('user')
+        response = views.sync_job_progress(request, pk=job.pk)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('"status": "queued"', response.content.decode())
+        with self.assertRaises(Http404):
+            views.sync_job_progress(request, pk=999)
@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_acdh-django-zotero
+------------
+
+Tests for `acdh-django-zotero` metrics module.
+"""
+
+import json
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from bib import metrics
+from bib.zot_utils import sync_library
+
+from .fake_zotero import FakeZoteroMixin
+
+
+class TestMetrics(FakeZoteroMixin, TestCase):
+
+    library_size = 150
+
+    def test_sync_is_instrumented(self):
+        with metrics.collect('test') as run:
+            sync_library(self.library.library_id, 'group', 'key')
+            self.library.update(['K0000001'])
+            sync_library(self.library.library_id, 'group', 'key')
+        summary = run.summary()
+        counters = summary['counters']
+        self.assertEqual(counters['pages'], 3)
+        self.assertEqual(counters['items'], 151)
+        self.assertEqual(counters['rows_inserted'], 150)
+        self.assertEqual(counters['rows_updated'], 1)
+        self.assertEqual(counters['requests'], self.server.requests)
+        self.assertGreater(counters['bytes'], 150 * 300)
+        self.assertGreater(summary['phases']['http'], 0)
+        self.assertGreater(summary['phases']['db'], 0)
+        self.assertEqual(metrics.registry.get('runs_total', run='test'), 1)
+        self.assertIn('bib_sync_items_total{run="test"} 151', metrics.registry.render())
+
+    def test_nothing_is_recorded_outside_of_collect(self):
+        sync_library(self.library.library_id, 'group', 'key')
+        with metrics.collect('idle', emit=False) as run:
+            pass
+        self.assertEqual(run.summary()['counters']['items'], 0)
+
+    def test_commands_print_a_summary_instead_of_the_items(self):
+        out = StringIO()
+        call_command('bib_import', stdout=out)
+        self.assertNotIn('@article', out.getvalue())
+        self.assertIn('items 150', out.getvalue())
+        out = StringIO()
+        self.library.update(['K0000001'])
+        call_command('bib_update', json=True, stdout=out)
+        summary = json.loads([x for x in out.getvalue().splitlines() if x.startswith('{')][0])
+        self.assertEqual(summary['name'], 'bib_update')
+        self.assertEqual(summary['counters']['rows_updated'], 1)
+
+    def test_progress_display(self):
+        out = StringIO()
+        display = metrics.ProgressDisplay(out, interval=0)
+        display.update({'pages': 1, 'items': 100, 'total': 200})
+        self.assertIn('items 100/200', out.getvalue())
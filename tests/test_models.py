@@ -11,6 +11,7 @@ Tests for `acdh-django-zotero` models module.
 from django.test import TestCase
 
 from bib import models
+from bib.models import ZotItem
 
 
 class TestBib(TestCase):
@@ -23,3 +24,54 @@ class TestBib(TestCase):
 
     def tearDown(self):
         pass
+
+
+class TestZotItemAuthor(TestCase):
+
+    def test_author_display_is_computed_on_save(self):
+        item = ZotItem(
+            zot_key='K0',
+            zot_creator=[{'firstName': 'Jane', 'lastName': 'Doe'}, {'name': 'ACDH'}]
+        )
+        item.save()
+        item = ZotItem.objects.get(zot_key='K0')
+        self.assertEqual(item.author_display, 'Jane Doe / ACDH')
+        self.assertEqual(item.author, 'Jane Doe / ACDH')
+        self.assertEqual(ZotItem.objects.filter(author_display__icontains='doe').count(), 1)
+
+    def test_author_placeholder(self):
+        item = ZotItem.objects.create(zot_key='K0')
+        self.assertEqual(item.zot_creator, [])
+        self.assertEqual(item.author, models.NN)
+
+
+class TestParseDate(TestCase):
+
+    def test_free_text_dates(self):
+        cases = {
+            '1998-03-15': (1998, '1998-03-15'),
+            '1998-3': (1998, '1998-03'),
+            '15.3.1998': (1998, '1998-03-15'),
+            '3/15/1998': (1998, '1998-03-15'),
+            'March 15, 1998': (1998, '1998-03-15'),
+            'Dec. 3 1999': (1999, '1999-12-03'),
+            'Spring 1998': (1998, '1998-03'),
+            'Mai 1871': (1871, '1871-05'),
+            'c. 1850': (1850, '1850'),
+            '2001-02-30': (2001, '2001-02'),
+            'Herausgegeben 1998': (1998, '1998'),
+            'n.d.': (None, ''),
+        }
+        for date, expected in cases.items():
+            self.assertEqual(models.parse_date(date), expected, date)
+
+    def test_date_sort_is_computed_on_save(self):
+        ZotItem.objects.create(zot_key='K0', zot_date='1998')
+        ZotItem.objects.create(zot_key='K1', zot_date='March 1871')
+        ZotItem.objects.create(zot_key='K2', zot_date='')
+        ZotItem.objects.create(zot_key='K3', zot_date='1998-01-02')
+        self.assertEqual(
+            list(ZotItem.objects.order_by('date_sort').values_list('zot_key', flat=True)),
+            ['K1', 'K0', 'K3', 'K2']
+        )
+        self.assertEqual(ZotItem.objects.get(zot_key='K1').date_sort, '1871-03 K1')
@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_acdh-django-zotero
+------------
+
+Tests for `acdh-django-zotero` resolver module.
+"""
+
+from django.core.cache import cache
+from django.db import connection
+from django.template import Context, Engine
+from django.test import TestCase
+
+from bib import resolver
+from bib.models import ZotItem
+
+
+def create_item(key):
+    return ZotItem.objects.create(
+        zot_key=key, zot_title='Title {}'.format(key),
+        zot_html_link='https://www.zotero.org/groups/1/items/{}'.format(key),
+        zot_bibtex='\n@book{{doe_{},\n title = {{Title}}\n}}\n'.format(key.lower())
+    )
+
+
+class TestResolve(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        resolver.item_cache.clear()
+        for i in range(3):
+            create_item('K{}'.format(i))
+
+    def test_zotero_and_citation_keys_in_one_query(self):
+        with self.assertNumQueries(1):
+            result = resolver.resolve(['K0', 'doe_k1', 'unknown', 'K0'])
+        self.assertEqual(list(result), ['K0', 'doe_k1', 'unknown'])
+        self.assertEqual(result['K0'].zot_key, 'K0')
+        self.assertEqual(result['doe_k1'].zot_key, 'K1')
+        self.assertIsNone(result['unknown'])
+
+    def test_citation_key_must_match_exactly(self):
+        self.assertIsNone(resolver.resolve(['doe_k'])['doe_k'])
+
+    def test_results_are_cached_until_items_change(self):
+        resolver.resolve(['K0', 'unknown'])
+        with self.assertNumQueries(0):
+            resolver.resolve(['K0', 'unknown'])
+        create_item('unknown')
+        with self.assertNumQueries(1):
+            self.assertIsNotNone(resolver.resolve(['K0', 'unknown'])['unknown'])
+
+    def test_many_references_stay_below_the_parameter_limit(self):
+        ZotItem.objects.bulk_create(
+            ZotItem(zot_key='M{}'.format(i), citation_key='m_{}'.format(i)) for i in range(600)
+        )
+        refs = ['M{}'.format(i) for i in range(600)] + ['m_{}'.format(i) for i in range(600)]
+        size = resolver.chunk_size()
+        self.assertLessEqual(2 * size, connection.features.max_query_params or 2 * size)
+        with self.assertNumQueries(-(-len(refs) // size)):
+            result = resolver.resolve(refs)
+        self.assertEqual(result['M599'].zot_key, 'M599')
+        self.assertEqual(result['m_599'].zot_key, 'M599')
+        self.assertNotIn(None, result.values())
+
+    def test_least_recently_used_are_dropped(self):
+        cache = resolver.ItemCache(2)
+        cache.set_many({'a': 1, 'b': 2})
+        cache.get_many(['a'])
+        cache.set_many({'c': 3})
+        self.assertEqual(cache.get_many(['a', 'b', 'c']), {'a': 1, 'c': 3})
+
+
+class TestTemplateTags(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        resolver.item_cache.clear()
+        for i in range(3):
+            create_item('K{}'.format(i))
+        self.engine = Engine(
+            app_dirs=True, libraries={'bib_extras': 'bib.templatetags.bib_extras'}
+        )
+
+    def render(self, source, **context):
+        return self.engine.from_string("{% load bib_extras %}" + source).render(Context(context))
+
+    def test_bib_quote_item(self):
+        html = self.render('{% bib_quote item %}', item=ZotItem.objects.get(zot_key='K0'))
+        self.assertIn('href="https://www.zotero.org/groups/1/items/K0"', html)
+
+    def test_bib_quote_without_bibtex(self):
+        item = ZotItem.objects.create(
+            zot_key='K9', zot_creator=[{'lastName': 'Huber'}], zot_date='1871', zot_bibtex=''
+        )
+        self.assertIn('>Huber 1871</a>', self.render('{% bib_quote item %}', item=item))
+
+    def test_citations_are_prefetched_with_one_query(self):
+        source = (
+            '{% bib_citations keys %}{% bib_quote "K0" %}{% bib_quote "doe_k1" %}'
+            '{% for key in keys %}{% bib_quote key %}{% endfor %}'
+            '{% bib_quote "missing" %}{% endbib_citations %}'
+        )
+        with self.assertNumQueries(1):
+            html = self.render(source, keys=['K2'])
+        for key in ['K0', 'K1', 'K2']:
+            self.assertIn('items/{}"'.format(key), html)
+        self.assertIn('missing', html)
@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_acdh-django-zotero
+------------
+
+Tests for `acdh-django-zotero` search module.
+"""
+
+from django.db import connection
+from django.test import TestCase
+
+from bib.dal_views import split_years
+from bib.models import ZotItem
+from bib.search import fts_available, search_fallback, search_zotitems
+from bib.zot_utils import page_to_dicts, upsert_zotitems
+
+from .test_zot_utils import make_item
+
+
+class TestSearchZotItems(TestCase):
+
+    def setUp(self):
+        ZotItem.objects.create(
+            zot_key='A', zot_title='Die Römer in Noricum', zot_date='1998',
+            zot_creator=[{'firstName': 'Jane', 'lastName': 'Doe'}]
+        )
+        ZotItem.objects.create(
+            zot_key='B', zot_title='Noricum', zot_pub_title='Journal of Noricum studies',
+            zot_creator=[{'name': 'ACDH'}]
+        )
+        ZotItem.objects.create(zot_key='C', zot_title='Something else')
+
+    def keys(self, q):
+        return [x.zot_key for x in search_zotitems(ZotItem.objects.all(), q)]
+
+    def test_uses_fts_table_on_sqlite(self):
+        self.assertTrue(fts_available(connection))
+
+    def test_prefix_search_across_fields(self):
+        self.assertEqual(sorted(self.keys('nori')), ['A', 'B'])
+        self.assertEqual(self.keys('nori doe'), ['A'])
+        self.assertEqual(self.keys('roemer'), [])
+        self.assertEqual(self.keys('romer'), ['A'])
+        self.assertEqual(self.keys('ACDH'), ['B'])
+
+    def test_results_are_ranked(self):
+        self.assertEqual(self.keys('noricum')[0], 'B')
+
+    def test_index_follows_updates_and_deletes(self):
+        ZotItem.objects.filter(zot_key='C').update(zot_title='Noricum revisited')
+        self.assertIn('C', self.keys('revisited'))
+        ZotItem.objects.filter(zot_key='A').delete()
+        self.assertEqual(sorted(self.keys('noricum')), ['B', 'C'])
+
+    def test_fallback(self):
+        qs = search_fallback(ZotItem.objects.all(), 'else')
+        self.assertEqual([x.zot_key for x in qs], ['C'])
+
+    def test_index_follows_bulk_upserts(self):
+        upsert_zotitems(page_to_dicts([make_item('C')]))
+        self.assertEqual(self.keys('title'), ['C'])
+
+
+class TestAutocompleteYears(TestCase):
+
+    def test_split_years(self):
+        self.assertEqual(split_years('danube 1870-1850'), (1850, 1870, 'danube'))
+        self.assertEqual(split_years('1871 roman'), (1871, 1871, 'roman'))
+        self.assertEqual(split_years('roman'), (None, None, 'roman'))
+        self.assertEqual(split_years('1984'), (None, None, '1984'))
+        self.assertEqual(split_years('year:1984'), (1984, 1984, ''))
+        self.assertEqual(split_years('Year: 1850-1870 roman'), (1850, 1870, 'roman'))
+        self.assertEqual(split_years('station 0815'), (None, None, 'station 0815'))
+        self.assertEqual(split_years('2001 1871 roman'), (2001, 2001, '1871 roman'))
@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_acdh-django-zotero
+------------
+
+Tests for `acdh-django-zotero` zot_client module.
+"""
+
+import socket
+import threading
+from unittest import mock
+
+import httpx2
+from django.test import TestCase
+
+from bib import zot_client
+
+
+def http_error(status, headers=None):
+    request = httpx2.Request('GET', 'https://api.zotero.org/groups/1/items')
+    response = httpx2.Response(status, headers=headers, request=request)
+    return httpx2.HTTPStatusError("error", request=request, response=response)
+
+
+def closed_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+class TestZoteroClient(TestCase):
+
+    def setUp(self):
+        zot_client.reset()
+        self.client = zot_client.get_client('1', 'group', 'key')
+        sleep = mock.patch.object(zot_client.time, 'sleep')
+        self.sleep = sleep.start()
+        self.addCleanup(sleep.stop)
+
+    def tearDown(self):
+        zot_client.reset()
+
+    def test_clients_are_shared_per_thread(self):
+        self.assertIs(zot_client.get_client('1', 'group', 'key'), self.client)
+        other = []
+        thread = threading.Thread(
+            target=lambda: other.append(zot_client.get_client('1', 'group', 'key'))
+        )
+        thread.start()
+        thread.join()
+        self.assertIsNot(other[0], self.client)
+        self.assertIs(other[0].throttle, self.client.throttle)
+
+    def test_retry_honours_retry_after(self):
+        func = mock.Mock(side_effect=[http_error(429, {'Retry-After': '7'}), 'ok'])
+        self.assertEqual(self.client.call(func), 'ok')
+        self.assertEqual(func.call_count, 2)
+        self.sleep.assert_called_once()
+        self.assertGreaterEqual(self.sleep.call_args[0][0], 7)
+        stats = zot_client.stats()
+        self.assertEqual(stats['requests'], 2)
+        self.assertEqual(stats['retries'], 1)
+
+    def test_client_errors_are_not_retried(self):
+        func = mock.Mock(side_effect=http_error(404))
+        with self.assertRaises(httpx2.HTTPStatusError):
+            self.client.call(func)
+        self.assertEqual(func.call_count, 1)
+
+    def test_gives_up_after_max_retries(self):
+        self.client.max_retries = 2
+        func = mock.Mock(side_effect=httpx2.ReadTimeout("timed out"))
+        with self.assertRaises(httpx2.ReadTimeout):
+            self.client.call(func)
+        self.assertEqual(func.call_count, 3)
+
+    def test_refused_connections_are_retried(self):
+        self.client.max_retries = 2
+        self.client.zot.endpoint = 'http://127.0.0.1:{}'.format(closed_port())
+        for call in [lambda: self.client.top(limit=1), lambda: self.client.get('/items/top')]:
+            retries = zot_client.stats()['retries']
+            with self.assertRaises(httpx2.ConnectError):
+                call()
+            self.assertEqual(zot_client.stats()['retries'] - retries, 2)
+
+    def test_backoff_header_pauses_following_requests(self):
+        response = mock.Mock(spec=httpx2.Response, headers={'Backoff': '30'})
+        self.client.call(mock.Mock(return_value=response))
+        self.client.call(mock.Mock(return_value=response))
+        self.assertAlmostEqual(self.sleep.call_args[0][0], 30, delta=1)
+
+    def test_requests_per_second(self):
+        throttle = zot_client.LibraryThrottle(requests_per_second=2)
+        throttle.wait()
+        throttle.wait()
+        self.assertAlmostEqual(self.sleep.call_args[0][0], 0.5, delta=0.1)
@@ -0,0 +1,388 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_acdh-django-zotero
+------------
+
+Tests for `acdh-django-zotero` zot_utils module.
+"""
+
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from bib.models import SyncState, ZotItem
+from bib import zot_utils
+
+
+def make_item(key, version=1):
+    return {
+        'key': key,
+        'version': version,
+        'data': {
+            'key': key,
+            'version': version,
+            'itemType': 'book',
+            'title': 'Title {}'.format(key),
+            'creators': [{'firstName': 'Jane', 'lastName': 'Doe', 'creatorType': 'author'}],
+            'date': '1998',
+            'dateModified': '2018-07-05T09:25:00Z',
+        },
+        'links': {
+            'self': {'href': 'https://api.zotero.org/groups/1/items/{}'.format(key)},
+            'alternate': {'href': 'https://www.zotero.org/groups/1/items/{}'.format(key)},
+        },
+        'bibtex': '\n@book{{doe_{0},\n title = {{Title {0}}}\n}}\n'.format(key),
+    }
+
+
+class FakeResponse(object):
+
+    def __init__(self, headers):
+        self.headers = headers
+
+
+class FakeZotero(object):
+
+    """ serves a list of items the way pyzotero.zotero.Zotero.top does """
+
+    def __init__(self, items, deleted=None):
+        self.library = items
+        self.deleted_keys = deleted or {}
+        self.calls = []
+        self.request = None
+
+    def last_modified_version(self):
+        versions = [x['version'] for x in self.library] + list(self.deleted_keys.values())
+        return max(versions or [0])
+
+    def deleted(self, since):
+        return {'items': [k for k, v in self.deleted_keys.items() if v > since]}
+
+    def items(self, itemKey, include='data', limit=None):
+        self.calls.append({'itemKey': itemKey, 'include': include})
+        keys = itemKey.split(',')
+        items = [x for x in self.library if x['key'] in keys]
+        if 'bibtex' not in include:
+            items = [{k: v for k, v in x.items() if k != 'bibtex'} for x in items]
+        if 'data' not in include:
+            items = [{k: v for k, v in x.items() if k != 'data'} for x in items]
+        return items
+
+    def top(self, start=0, limit=100, include='data', since=None, format='json', **params):
+        if format == 'versions':
+            self.calls.append({'format': format})
+            self.request = FakeResponse(
+                {'Last-Modified-Version': str(self.last_modified_version())}
+            )
+            return {x['key']: x['version'] for x in self.library}
+        self.calls.append({'start': start, 'limit': limit, 'include': include, 'since': since})
+        items = [x for x in self.library if since is None or x['version'] > since]
+        page = items[start:start + limit]
+        self.request = FakeResponse({'Total-Results': str(len(items))})
+        if 'bibtex' not in include:
+            page = [{k: v for k, v in x.items() if k != 'bibtex'} for x in page]
+        return page
+
+
+class TestFetchPages(TestCase):
+
+    def test_pages_are_fetched_lazily(self):
+        zot = FakeZotero([make_item('K{}'.format(i)) for i in range(5)])
+        pages = zot_utils.fetch_pages(zot, page_size=2)
+        items = next(pages)
+        self.assertEqual([x['key'] for x in items], ['K0', 'K1'])
+        self.assertEqual(len(zot.calls), 1)
+        self.assertEqual(len(list(pages)), 2)
+        self.assertEqual(len(zot.calls), 3)
+        self.assertEqual(zot.calls[0]['include'], 'data,bibtex')
+
+    def test_limit(self):
+        zot = FakeZotero([make_item('K{}'.format(i)) for i in range(5)])
+        pages = list(zot_utils.fetch_pages(zot, limit=3, page_size=2))
+        self.assertEqual(sum(len(items) for items in pages), 3)
+
+    def test_concurrent_pages_keep_library_order(self):
+        items = [make_item('K{}'.format(i)) for i in range(23)]
+        clients = []
+
+        def get_zot():
+            clients.append(FakeZotero(items))
+            return clients[-1]
+
+        pages = list(zot_utils.fetch_pages_concurrently(get_zot, page_size=2, workers=3))
+        self.assertEqual(
+            [x['key'] for page in pages for x in page], [x['key'] for x in items]
+        )
+        self.assertEqual(len(pages), 12)
+        self.assertGreater(len(clients), 1)
+
+    def test_concurrent_pages_limit(self):
+        items = [make_item('K{}'.format(i)) for i in range(23)]
+        pages = zot_utils.fetch_pages_concurrently(
+            lambda: FakeZotero(items), limit=7, page_size=2, workers=3
+        )
+        self.assertEqual(sum(len(page) for page in pages), 7)
+
+    def test_bibtex_is_joined_on_key(self):
+        items = [make_item('K0'), make_item('K1')]
+        del items[1]['bibtex']
+        bibs = zot_utils.page_to_dicts(items)
+        self.assertEqual(bibs[0]['zot_bibtex'], '@book{doe_K0,\n title = {Title K0}\n}')
+        self.assertEqual(bibs[1]['zot_bibtex'], '')
+
+    def test_sync_items_saves_each_page(self):
+        zot = FakeZotero([make_item('K{}'.format(i)) for i in range(5)])
+        saved_counts = []
+
+        def callback(saved):
+            saved_counts.append(ZotItem.objects.count())
+
+        def iter_bibs(*args, **kwargs):
+            for items in zot_utils.fetch_pages(zot, page_size=2):
+                yield zot_utils.page_to_dicts(items)
+
+        with mock.patch.object(zot_utils, 'iter_bibs', iter_bibs):
+            result = zot_utils.sync_items(
+                '1', 'group', 'key', callback=callback, batch_size=2
+            )
+        self.assertIsNone(result['error'])
+        self.assertEqual(result['pages'], 3)
+        self.assertEqual(result['items'], 5)
+        self.assertEqual(saved_counts, [2, 4, 5])
+
+
+class TestUpsertZotItems(TestCase):
+
+    def bibs(self, count, version=1):
+        return zot_utils.page_to_dicts(
+            [make_item('K{}'.format(i), version=version) for i in range(count)]
+        )
+
+    def test_insert_and_update(self):
+        zot_utils.upsert_zotitems(self.bibs(3))
+        self.assertEqual(ZotItem.objects.count(), 3)
+        zot_utils.upsert_zotitems(self.bibs(4, version=2))
+        self.assertEqual(ZotItem.objects.count(), 4)
+        self.assertEqual(
+            set(ZotItem.objects.values_list('zot_version', flat=True)), {2}
+        )
+        item = ZotItem.objects.get(zot_key='K0')
+        self.assertEqual(item.zot_title, 'Title K0')
+        self.assertEqual(item.zot_creator[0]['lastName'], 'Doe')
+        self.assertEqual(item.author_display, 'Jane Doe')
+        self.assertIsNotNone(item.date_modified)
+
+    def test_one_statement_per_batch(self):
+        # one INSERT ... ON CONFLICT per batch, the lookup of the existing keys
+        # counted in the metrics, the savepoint of its transaction and the facet
+        # counts: one INSERT of the new values and one UPDATE per facet
+        with self.assertNumQueries(3 * (4 + 4)):
+            zot_utils.upsert_zotitems(self.bibs(5), batch_size=2)
+        self.assertEqual(ZotItem.objects.count(), 5)
+
+    def test_unchanged_items_are_skipped(self):
+        zot_utils.upsert_zotitems(self.bibs(5))
+        # only the lookup of the stored versions and hashes
+        with self.assertNumQueries(1):
+            saved = zot_utils.upsert_zotitems(self.bibs(5))
+        self.assertEqual(saved, [])
+
+    def test_only_changed_columns_are_updated(self):
+        zot_utils.upsert_zotitems(self.bibs(2))
+        bibs = self.bibs(2, version=2)
+        bibs[0]['title'] = 'New title'
+        with CaptureQueriesContext(connection) as queries:
+            saved = zot_utils.upsert_zotitems(bibs)
+        self.assertEqual(len(saved), 2)
+        updates = [x['sql'] for x in queries.captured_queries if x['sql'].startswith('UPDATE')]
+        self.assertEqual(len(updates), 2)
+        self.assertTrue(any('"zot_title"' in x for x in updates))
+        self.assertFalse(any('"zot_bibtex"' in x for x in updates))
+        self.assertEqual(ZotItem.objects.get(zot_key='K0').zot_title, 'New title')
+        self.assertEqual(ZotItem.objects.get(zot_key='K1').zot_version, 2)
+
+    def test_fallback_without_update_conflicts(self):
+        zot_utils.upsert_zotitems(self.bibs(2))
+        with mock.patch.object(
+            connection.features, 'supports_update_conflicts_with_target', False
+        ):
+            zot_utils.upsert_zotitems(self.bibs(3, version=2))
+        self.assertEqual(ZotItem.objects.count(), 3)
+        self.assertEqual(
+            set(ZotItem.objects.values_list('zot_version', flat=True)), {2}
+        )
+
+
+def fake_library_version(zot, since_version=None):
+    version = zot.last_modified_version()
+    return None if version == since_version else version
+
+
+class TestSyncLibrary(TestCase):
+
+    def sync(self, zot, **kwargs):
+        with mock.patch.object(zot_utils, 'get_zotero', return_value=zot), \
+                mock.patch.object(zot_utils, 'fetch_library_version', fake_library_version):
+            return zot_utils.sync_library('1', 'group', 'key', **kwargs)
+
+    def test_first_sync_on_empty_table(self):
+        result = self.sync(FakeZotero([make_item('K0', 3), make_item('K1', 5)]))
+        self.assertIsNone(result['error'])
+        self.assertEqual(result['version'], 5)
+        self.assertEqual(ZotItem.objects.count(), 2)
+        state = SyncState.objects.get(library_id='1', library_type='group')
+        self.assertEqual(state.library_version, 5)
+        self.assertEqual(state.items_saved, 2)
+
+    def test_resync_skips_unchanged_items(self):
+        self.sync(FakeZotero([make_item('K0', 3), make_item('K1', 5)]))
+        SyncState.objects.all().delete()
+        result = self.sync(FakeZotero([make_item('K0', 3), make_item('K1', 6)]))
+        self.assertEqual(result['items'], 1)
+        self.assertEqual(result['skipped'], 1)
+        state = SyncState.objects.get(library_id='1', library_type='group')
+        self.assertEqual(state.items_skipped, 1)
+
+    def test_incremental_sync_fetches_changes_and_deletes(self):
+        self.sync(FakeZotero([make_item('K0', 3), make_item('K1', 5), make_item('K2', 5)]))
+        zot = FakeZotero(
+            [make_item('K0', 7), make_item('K1', 5)], deleted={'K2': 8}
+        )
+        result = self.sync(zot)
+        self.assertEqual(zot.calls[0]['since'], 5)
+        self.assertEqual(result['items'], 1)
+        self.assertEqual(result['deleted'], 1)
+        self.assertEqual(result['version'], 8)
+        self.assertEqual(
+            sorted(ZotItem.objects.values_list('zot_key', 'zot_version')),
+            [('K0', 7), ('K1', 5)]
+        )
+
+    def test_failed_sync_keeps_version(self):
+        self.sync(FakeZotero([make_item('K0', 3)]))
+        zot = FakeZotero([make_item('K0', 4)])
+        zot.deleted = mock.Mock(side_effect=Exception('boom'))
+        result = self.sync(zot)
+        self.assertEqual(result['error'], 'boom')
+        state = SyncState.objects.get()
+        self.assertEqual(state.library_version, 3)
+        self.assertEqual(state.error, 'boom')
+
+    def test_interrupted_crawl_resumes_from_checkpoint(self):
+        library = [make_item('K{}'.format(i), 1) for i in range(250)]
+        zot = FakeZotero(library)
+        top = zot.top
+
+        def failing_top(**params):
+            if params.get('start', 0) >= 200:
+                raise Exception('Too many requests')
+            return top(**params)
+        zot.top = failing_top
+        result = self.sync(zot, full=True, batch_size=100)
+        self.assertEqual(result['error'], 'Too many requests')
+        state = SyncState.objects.get()
+        self.assertEqual((state.library_version, state.crawl_version, state.crawl_offset), (None, 1, 200))
+        self.assertEqual(ZotItem.objects.count(), 200)
+        # changed and deleted while the crawl was interrupted
+        library[5] = make_item('K5', 2)
+        zot = FakeZotero(library[:10] + library[11:], deleted={'K10': 3})
+        result = self.sync(zot, full=True, resume=True, batch_size=100)
+        self.assertIsNone(result['error'])
+        self.assertEqual(result['resumed'], 199)
+        self.assertEqual(zot.calls[0]['start'], 199)
+        self.assertEqual([x['since'] for x in zot.calls if 'since' in x], [None, 1])
+        self.assertEqual((result['deleted'], result['version']), (1, 3))
+        self.assertEqual(ZotItem.objects.count(), 249)
+        self.assertEqual(ZotItem.objects.get(zot_key='K5').zot_version, 2)
+        state = SyncState.objects.get()
+        self.assertEqual((state.library_version, state.crawl_version, state.crawl_offset), (3, None, 0))
+
+    def test_resume_is_only_for_complete_imports(self):
+        for option in [{'limit': '5'}, {'since': '3'}]:
+            with self.assertRaises(CommandError):
+                call_command('bib_import', resume=True, stdout=StringIO(), **option)
+
+    def test_plan_sync(self):
+        plan = zot_utils.plan_sync({'A': 1, 'B': 2, 'C': 3}, {'B': 2, 'C': 1, 'D': 4})
+        self.assertEqual(plan, {'insert': ['A'], 'update': ['C'], 'delete': ['D']})
+
+    def test_diff_sync_fetches_changed_keys_only(self):
+        self.sync(FakeZotero([make_item('K{}'.format(i), 1) for i in range(120)]))
+        library = [make_item('K{}'.format(i), 1) for i in range(1, 120)]
+        library[0] = make_item('K1', 2)
+        library.append(make_item('NEW', 2))
+        zot = FakeZotero(library)
+        result = self.sync(zot, diff=True)
+        self.assertIsNone(result['error'])
+        self.assertEqual(result['plan'], {'insert': ['NEW'], 'update': ['K1'], 'delete': ['K0']})
+        self.assertEqual(len(zot.calls), 2)
+        self.assertEqual(sorted(zot.calls[1]['itemKey'].split(',')), ['K1', 'NEW'])
+        self.assertEqual(result['deleted'], 1)
+        self.assertEqual(ZotItem.objects.count(), 120)
+        self.assertEqual(ZotItem.objects.get(zot_key='K1').zot_version, 2)
+
+    def test_dry_run_writes_nothing(self):
+        result = self.sync(FakeZotero([make_item('K0', 1)]), dry_run=True)
+        self.assertEqual(result['plan']['insert'], ['K0'])
+        self.assertEqual(ZotItem.objects.count(), 0)
+        self.assertEqual(SyncState.objects.count(), 0)
+
+    def test_unmodified_library_short_circuits(self):
+        self.sync(FakeZotero([make_item('K0', 3)]))
+        zot = FakeZotero([make_item('K0', 3)])
+        with self.assertNumQueries(1):
+            result = self.sync(zot)
+        self.assertTrue(result['not_modified'])
+        self.assertEqual(zot.calls, [])
+
+    def test_fetch_library_version_sends_condition(self):
+        zot = mock.Mock()
+        zot.get.return_value = mock.Mock(status_code=304)
+        self.assertIsNone(zot_utils.fetch_library_version(zot, since_version=5))
+        self.assertEqual(zot.get.call_args[1]['headers']['If-Modified-Since-Version'], '5')
+        zot.get.return_value = mock.Mock(status_code=200, headers={'Last-Modified-Version': '7'})
+        self.assertEqual(zot_utils.fetch_library_version(zot, since_version=5), 7)
+
+
+class TestBackfillBibtex(TestCase):
+
+    def test_backfill_in_batches(self):
+        library = [make_item('K{}'.format(i)) for i in range(60)]
+        bibs = zot_utils.page_to_dicts(library)
+        for x in bibs:
+            x['zot_bibtex'] = ""
+        bibs[0]['zot_bibtex'] = "@book{stored}"
+        zot_utils.upsert_zotitems(bibs)
+        del library[1]['bibtex']
+        zot = FakeZotero(library)
+        with mock.patch.object(zot_utils, 'get_zotero', return_value=zot):
+            result = zot_utils.backfill_bibtex('1', 'group', 'key', batch_size=100)
+        self.assertIsNone(result['error'])
+        self.assertEqual(result['items'], 58)
+        self.assertEqual(result['missing'], ['K1'])
+        self.assertEqual(len(zot.calls), 2)
+        self.assertEqual(zot.calls[0]['include'], 'bibtex')
+        self.assertEqual(ZotItem.objects.get(zot_key='K0').zot_bibtex, "@book{stored}")
+        self.assertTrue(ZotItem.objects.get(zot_key='K2').zot_bibtex.startswith('@book{doe_K2'))
+
+    def test_backfill_dates(self):
+        zot_utils.upsert_zotitems(zot_utils.page_to_dicts([make_item('K0'), make_item('K1')]))
+        ZotItem.objects.filter(zot_key='K0').update(zot_date='Spring 1871', date_sort='')
+        result = zot_utils.backfill_dates(batch_size=1)
+        self.assertIsNone(result['error'])
+        self.assertEqual((result['items'], result['updated']), (2, 1))
+        item = ZotItem.objects.get(zot_key='K0')
+        self.assertEqual((item.year, item.date_sort), (1871, '1871-03 K0'))
+
+    def test_save_makes_no_network_call(self):
+        item = ZotItem(zot_key='K0')
+        with self.assertWarns(DeprecationWarning):
+            item.save(get_bibtex=True)
+        self.assertEqual(ZotItem.objects.get().zot_bibtex, "")
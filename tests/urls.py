@@ -1,9 +1,15 @@
 # -*- coding: utf-8 -*-
 from __future__ import unicode_literals, absolute_import
 
-from django.conf.urls import url, include
+from django.urls import include, re_path
+from rest_framework import routers
 
+from bib.api_views import ZotItemViewSet
+
+router = routers.DefaultRouter()
+router.register(r'zotitems', ZotItemViewSet)
 
 urlpatterns = [
-    url(r'^', include('bib.urls', namespace='bib')),
+    re_path(r'^api/', include(router.urls)),
+    re_path(r'^', include('bib.urls', namespace='bib')),
 ]